@@ -0,0 +1,106 @@
+"""
+Crisis detection benchmark for Ykarb Telegram Bot
+Reports accuracy on the labelled corpus and per-message matching cost,
+compared with the original linear keyword scan.
+
+Usage: python benchmarks/bench_crisis.py [--iterations N] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from crisis import CrisisDetector  # noqa: E402
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "crisis_corpus.jsonl")
+
+LEGACY_KEYWORDS = [
+    'suicide', 'kill myself', 'end it all', 'want to die', 'hurt myself',
+    'self harm', 'cutting', 'overdose', 'jump', 'hanging', 'worthless',
+    'hopeless', 'can\'t go on', 'better off dead', 'no point living'
+]
+
+
+def legacy_detect(text: str) -> bool:
+    """The original per-call list rebuild and substring scan"""
+    crisis_keywords = list(LEGACY_KEYWORDS)
+    text_lower = text.lower()
+    return any(keyword in text_lower for keyword in crisis_keywords)
+
+
+def load_corpus(path: str = CORPUS_PATH) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def score(detect, corpus: list) -> dict:
+    tp = fp = fn = tn = 0
+    misses = []
+    for row in corpus:
+        predicted = detect(row['text'])
+        if predicted and row['crisis']:
+            tp += 1
+        elif predicted:
+            fp += 1
+            misses.append(('false_positive', row['text']))
+        elif row['crisis']:
+            fn += 1
+            misses.append(('false_negative', row['text']))
+        else:
+            tn += 1
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        'precision': round(precision, 4), 'recall': round(recall, 4), 'f1': round(f1, 4),
+        'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn, 'misses': misses,
+    }
+
+
+def time_per_message(detect, corpus: list, iterations: int) -> float:
+    texts = [row['text'] for row in corpus]
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for text in texts:
+            detect(text)
+    return (time.perf_counter() - started) / (iterations * len(texts)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    detector = CrisisDetector()
+    results = {}
+    for name, detect in (('legacy', legacy_detect), ('compiled', detector.detect)):
+        results[name] = score(detect, corpus)
+        results[name]['us_per_message'] = round(time_per_message(detect, corpus, args.iterations), 3)
+
+    # Cost on a long message, where a single pass matters most
+    long_text = " ".join(row['text'] for row in corpus if not row['crisis']) * 5
+    for name, detect in (('legacy', legacy_detect), ('compiled', detector.detect)):
+        results[name]['us_long_message'] = round(time_per_message(detect, [{'text': long_text}], args.iterations), 3)
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    print(f"Corpus: {len(corpus)} labelled messages ({sum(r['crisis'] for r in corpus)} crisis)")
+    for name, r in results.items():
+        print(
+            f"{name:>9}: precision={r['precision']:.3f} recall={r['recall']:.3f} f1={r['f1']:.3f} "
+            f"| {r['us_per_message']:.2f} µs/msg, {r['us_long_message']:.1f} µs/long msg"
+        )
+    for kind, text in results['compiled']['misses']:
+        print(f"  compiled {kind}: {text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+FAQ matching benchmark for Ykarb Telegram Bot
+Scores the retriever on a labelled corpus of paraphrased FAQ questions and of
+messages that must go to Gemini, across a range of thresholds.
+
+Usage: python benchmarks/bench_faq.py [--thresholds 0.5,0.55,...] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from faq import FAQ_THRESHOLD, FaqIndex, FaqRetriever, compile_faq  # noqa: E402
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "faq_corpus.jsonl")
+DEFAULT_THRESHOLDS = "0.5,0.55,0.6,0.65,0.7,0.75,0.8"
+
+
+def load_corpus(path: str = CORPUS_PATH) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def score(retriever: FaqRetriever, corpus: list) -> dict:
+    """Correct answers, wrong answers (a different or unwanted entry) and misses"""
+    correct = wrong = missed = declined = 0
+    misses = []
+    for row in corpus:
+        index = retriever.indexes[row['language']]
+        answer = retriever.answer(row['language'], row['text'], row['module'])
+        got = None
+        if answer is not None:
+            got = next(entry['id'] for entry in index.answers if entry['answer'] == answer)
+        if got == row['faq']:
+            if got is None:
+                declined += 1
+            else:
+                correct += 1
+        elif got is None:
+            missed += 1
+            misses.append(('missed', row['text'], row['faq']))
+        else:
+            wrong += 1
+            misses.append(('wrong', row['text'], got))
+    answered = correct + wrong
+    expected = sum(row['faq'] is not None for row in corpus)
+    return {
+        'precision': round(correct / answered, 4) if answered else 0.0,
+        'recall': round(correct / expected, 4) if expected else 0.0,
+        'correct': correct, 'wrong': wrong, 'missed': missed, 'declined': declined, 'misses': misses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    indexes = {language: FaqIndex(matrix, meta) for language, (matrix, meta) in compile_faq().items()}
+    results = {}
+    for threshold in sorted({float(x) for x in args.thresholds.split(",")} | {FAQ_THRESHOLD}):
+        # Every corpus module is enabled so the threshold is measured on its own
+        results[threshold] = score(FaqRetriever(indexes, threshold, {'sakhi', 'educare', 'none'}), corpus)
+
+    if args.json:
+        print(json.dumps({str(k): v for k, v in results.items()}, ensure_ascii=False, indent=2))
+        return
+
+    expected = sum(row['faq'] is not None for row in corpus)
+    print(f"Corpus: {len(corpus)} labelled messages ({expected} with an FAQ answer)")
+    for threshold, r in results.items():
+        marker = " <- FAQ_THRESHOLD" if threshold == FAQ_THRESHOLD else ""
+        print(
+            f"{threshold:.2f}: precision={r['precision']:.3f} recall={r['recall']:.3f} "
+            f"| correct={r['correct']} wrong={r['wrong']} missed={r['missed']}{marker}"
+        )
+    for kind, text, entry in results[FAQ_THRESHOLD]['misses']:
+        print(f"  {kind}: {text!r} ({entry})")
+
+
+if __name__ == "__main__":
+    main()
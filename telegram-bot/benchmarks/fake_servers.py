@@ -0,0 +1,241 @@
+"""
+Local stand-ins for the Telegram Bot API and Gemini used by the load-test harness
+Both run on localhost with aiohttp and never touch the network.
+"""
+
+import asyncio
+import itertools
+import json
+import random
+import time
+
+from aiohttp import web
+
+BOT_USER = {'id': 1000000001, 'is_bot': True, 'first_name': 'Ykarb', 'username': 'ykarb_load_test_bot'}
+
+
+class FakeTelegramServer:
+    """Minimal Bot API: serves getUpdates from an injected queue and records outgoing calls
+
+    Every outgoing call made for a chat is recorded with its arrival time, so
+    the driver can measure time-to-first-response per injected update.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.host = host
+        self.port = port
+        self.updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_updates = asyncio.Condition()
+        self.calls = {}
+        self.first_response = {}  # update_id -> monotonic time of first visible reply
+        self._pending_by_chat = {}  # chat_id -> update_id awaiting its first reply
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_route('*', '/bot{token}/{method}', self._handle)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    # Update construction
+    def _user(self, user_id: int) -> dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}', 'language_code': 'en'}
+
+    def _chat(self, user_id: int) -> dict:
+        return {'id': user_id, 'type': 'private', 'first_name': f'User{user_id}'}
+
+    def make_message_update(self, user_id: int, text: str) -> dict:
+        update_id = next(self._update_ids)
+        message = {
+            'message_id': next(self._message_ids), 'date': int(time.time()),
+            'chat': self._chat(user_id), 'from': self._user(user_id), 'text': text,
+        }
+        if text.startswith('/'):
+            command = text.split()[0]
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        return {'update_id': update_id, 'message': message}
+
+    def make_callback_update(self, user_id: int, data: str, message_id: int = 1) -> dict:
+        update_id = next(self._update_ids)
+        return {
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id), 'from': self._user(user_id), 'chat_instance': str(user_id),
+                'data': data,
+                'message': {
+                    'message_id': message_id, 'date': int(time.time()), 'chat': self._chat(user_id),
+                    'from': BOT_USER, 'text': 'menu',
+                },
+            },
+        }
+
+    def expect_reply(self, update: dict):
+        """Remember that the next outgoing call for this chat answers `update`"""
+        chat_id = (update.get('message') or update['callback_query']['message'])['chat']['id']
+        self._pending_by_chat[chat_id] = update['update_id']
+
+    async def push(self, update: dict):
+        """Queue an update for the bot's next getUpdates call"""
+        self.expect_reply(update)
+        async with self._new_updates:
+            self.updates.append(update)
+            self._new_updates.notify_all()
+
+    # Bot API
+    async def _params(self, request: web.Request) -> dict:
+        if request.content_type == 'application/json':
+            return await request.json()
+        return dict(await request.post())
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params = await self._params(request)
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        if method == 'getUpdates':
+            return self._ok(await self._get_updates(params))
+        if method == 'getMe':
+            return self._ok(BOT_USER)
+        if method in ('deleteWebhook', 'setWebhook', 'answerCallbackQuery', 'sendChatAction', 'close', 'logOut'):
+            if method == 'sendChatAction':
+                self._record_reply(params)
+            return self._ok(True)
+        if method in ('sendMessage', 'editMessageText'):
+            self._record_reply(params)
+            chat_id = int(params.get('chat_id', 0))
+            message_id = int(params['message_id']) if 'message_id' in params else next(self._message_ids)
+            return self._ok({
+                'message_id': message_id, 'date': int(time.time()), 'chat': self._chat(chat_id),
+                'from': BOT_USER, 'text': params.get('text', ''),
+            })
+        return self._ok(True)
+
+    def _record_reply(self, params: dict):
+        chat_id = params.get('chat_id')
+        if chat_id is None:
+            return
+        update_id = self._pending_by_chat.pop(int(chat_id), None)
+        if update_id is not None:
+            self.first_response.setdefault(update_id, time.monotonic())
+
+    async def _get_updates(self, params: dict) -> list:
+        offset = int(params.get('offset') or 0)
+        timeout = float(params.get('timeout') or 0)
+        if offset:
+            self.updates = [u for u in self.updates if u['update_id'] >= offset]
+        if not self.updates and timeout:
+            async with self._new_updates:
+                try:
+                    await asyncio.wait_for(self._new_updates.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+        limit = int(params.get('limit') or 100)
+        return self.updates[:limit]
+
+    @staticmethod
+    def _ok(result) -> web.Response:
+        return web.json_response({'ok': True, 'result': result})
+
+
+class FakeGeminiServer:
+    """generateContent / streamGenerateContent with configurable latency and errors
+
+    Latency is drawn from a log-normal distribution with the given median and
+    shape; a fraction of requests fails with a 429 (with Retry-After) or 503.
+    """
+
+    REPLY = (
+        "I hear you, and it's completely understandable to feel this way. "
+        "Let's take a slow breath together. Would you like to try a short grounding exercise, "
+        "or tell me a little more about what's on your mind? 💚"
+    )
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, median_latency: float = 0.8,
+                 latency_sigma: float = 0.4, error_rate: float = 0.0, rate_limit_share: float = 0.5,
+                 stream_chunks: int = 4, seed: int = None):
+        self.host = host
+        self.port = port
+        self.median_latency = median_latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_share = rate_limit_share
+        self.stream_chunks = max(1, stream_chunks)
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = {}
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_post('/v1beta/models/{target}', self._handle)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def _latency(self) -> float:
+        if self.median_latency <= 0:
+            return 0.0
+        return self.median_latency * self.random.lognormvariate(0, self.latency_sigma)
+
+    def _error(self):
+        if self.random.random() >= self.error_rate:
+            return None
+        status = 429 if self.random.random() < self.rate_limit_share else 503
+        self.errors[status] = self.errors.get(status, 0) + 1
+        headers = {'Retry-After': '1'} if status == 429 else {}
+        return web.json_response({'error': {'code': status}}, status=status, headers=headers)
+
+    @staticmethod
+    def _chunk(text: str) -> dict:
+        return {'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}}]}
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        await request.read()
+        latency = self._latency()
+        error = self._error()
+        if error is not None:
+            await asyncio.sleep(latency / 4)
+            return error
+
+        if not request.match_info['target'].endswith(':streamGenerateContent'):
+            await asyncio.sleep(latency)
+            return web.json_response(self._chunk(self.REPLY))
+
+        # Time to first token is a third of the total; the rest is spread over the chunks
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        words = self.REPLY.split(' ')
+        size = -(-len(words) // self.stream_chunks)
+        await asyncio.sleep(latency / 3)
+        for i in range(0, len(words), size):
+            piece = ' '.join(words[i:i + size]) + (' ' if i + size < len(words) else '')
+            await response.write(f"data: {json.dumps(self._chunk(piece))}\r\n\r\n".encode())
+            await asyncio.sleep(latency * 2 / 3 / self.stream_chunks)
+        await response.write_eof()
+        return response
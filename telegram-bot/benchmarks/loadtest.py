@@ -0,0 +1,297 @@
+"""
+Load test for Ykarb Telegram Bot
+Drives the real application against local fake Telegram and Gemini servers
+and reports throughput, latency percentiles and memory growth as JSON.
+
+Usage: python benchmarks/loadtest.py [--users N] [--duration S] [--mode polling|webhook]
+                                     [--gemini-latency S] [--gemini-error-rate P] [--output FILE]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fake_servers import FakeGeminiServer, FakeTelegramServer  # noqa: E402
+
+LOADTEST_TOKEN = "123456:LOADTEST"
+WEBHOOK_TEST_SECRET = "loadtest-secret"
+
+# One realistic Mitra session: open, check in, do an activity, then talk
+FLOW = (
+    ('start', '/start'),
+    ('callback', 'mitra'),
+    ('callback', 'mood_checkin'),
+    ('callback', 'mood_anxious'),
+    ('callback', 'intensity_anxious_3'),
+    ('callback', 'wellness_menu'),
+    ('callback', 'activity_breathing'),
+    ('callback', 'completed_breathing'),
+    ('message', "I've been feeling really stressed about my exams lately"),
+)
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(samples: list) -> dict:
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 2),
+        'p95_ms': round(percentile(samples, 95) * 1000, 2),
+        'p99_ms': round(percentile(samples, 99) * 1000, 2),
+        'max_ms': round(max(samples) * 1000, 2) if samples else 0.0,
+    }
+
+
+def rss_kb() -> int:
+    """Resident set size from /proc, or 0 where it is unavailable"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class LoadDriver:
+    """Simulated users walking FLOW against a running application"""
+
+    def __init__(self, telegram: FakeTelegramServer, inject, users: int, duration: float,
+                 think_time: float, update_timeout: float = 60.0):
+        self.telegram = telegram
+        self.inject = inject
+        self.users = users
+        self.duration = duration
+        self.think_time = think_time
+        self.update_timeout = update_timeout
+        self.pending = {}  # update_id -> future resolved when the application finished it
+        self.latencies = {'start': [], 'callback': [], 'message': []}
+        self.first_response = []
+        self.timeouts = 0
+        self.rejected = 0
+        self.completed_flows = 0
+
+    def on_processed(self, update_id: int):
+        future = self.pending.pop(update_id, None)
+        if future is not None and not future.done():
+            future.set_result(time.monotonic())
+
+    async def _send(self, kind: str, user_id: int, payload: str):
+        if kind == 'callback':
+            update = self.telegram.make_callback_update(user_id, payload)
+        else:
+            update = self.telegram.make_message_update(user_id, payload)
+        update_id = update['update_id']
+        future = asyncio.get_running_loop().create_future()
+        self.pending[update_id] = future
+        sent = time.monotonic()
+        if not await self.inject(update):
+            self.pending.pop(update_id, None)
+            self.rejected += 1
+            return
+        try:
+            done = await asyncio.wait_for(future, timeout=self.update_timeout)
+        except asyncio.TimeoutError:
+            self.pending.pop(update_id, None)
+            self.timeouts += 1
+            return
+        self.latencies[kind].append(done - sent)
+        first = self.telegram.first_response.pop(update_id, None)
+        if first is not None:
+            self.first_response.append(first - sent)
+
+    async def _user(self, user_id: int, deadline: float, rng: random.Random):
+        # Stagger arrivals so users don't move in lockstep
+        await asyncio.sleep(rng.uniform(0, self.think_time))
+        while time.monotonic() < deadline:
+            for kind, payload in FLOW:
+                if time.monotonic() >= deadline:
+                    return
+                await self._send(kind, user_id, payload)
+                await asyncio.sleep(rng.expovariate(1 / self.think_time) if self.think_time > 0 else 0)
+            self.completed_flows += 1
+
+    async def run(self) -> float:
+        deadline = time.monotonic() + self.duration
+        started = time.monotonic()
+        await asyncio.gather(*(
+            self._user(100000 + i, deadline, random.Random(i)) for i in range(self.users)
+        ))
+        return time.monotonic() - started
+
+
+async def run_load_test(args) -> dict:
+    telegram = FakeTelegramServer()
+    gemini = FakeGeminiServer(median_latency=args.gemini_latency, error_rate=args.gemini_error_rate,
+                              seed=args.seed)
+    await telegram.start()
+    await gemini.start()
+
+    # The bot reads its configuration at import time
+    os.environ.update({
+        'TELEGRAM_TOKEN': LOADTEST_TOKEN,
+        'GEMINI_API_KEY': 'loadtest',
+        'TELEGRAM_API_BASE': telegram.base_url,
+        'GEMINI_API_BASE': gemini.base_url,
+        'STATS_LOG_INTERVAL': '0',
+        'USER_STORE': args.store,
+        'GEMINI_STREAMING': 'true' if args.streaming else 'false',
+        # Fake update ids restart at 1, so never resume from a previous run's journal
+        'UPDATE_JOURNAL_PATH': os.path.join(tempfile.mkdtemp(prefix="ykarb-loadtest-"), "offset.json"),
+    })
+    # The fake servers have no quotas; set these explicitly to measure the limiters themselves
+    for key, value in (('GEMINI_RATE', '1000'), ('GEMINI_BURST', '1000'),
+                       ('GEMINI_USER_RATE', '0'), ('STREAM_EDIT_INTERVAL', '0.2'),
+                       ('TELEGRAM_GLOBAL_RATE', '1000'), ('TELEGRAM_GLOBAL_BURST', '1000')):
+        os.environ.setdefault(key, value)
+    if args.mode == 'webhook':
+        os.environ.update({'WEBHOOK_LISTEN': '127.0.0.1', 'PORT': str(args.webhook_port),
+                           'WEBHOOK_SECRET_TOKEN': WEBHOOK_TEST_SECRET})
+        os.environ.pop('WEBHOOK_URL', None)
+
+    import bot
+    from telegram.ext import TypeHandler
+    from telegram import Update
+
+    tracemalloc.start()
+    rss_before = rss_kb()
+    memory_before = tracemalloc.get_traced_memory()[0]
+
+    app = bot.build_application(args.mode)
+    stop_event = asyncio.Event()
+
+    if args.mode == 'webhook':
+        import aiohttp
+        session = aiohttp.ClientSession()
+        url = f"http://127.0.0.1:{args.webhook_port}{bot.WEBHOOK_PATH}"
+
+        async def inject(update: dict) -> bool:
+            telegram.expect_reply(update)
+            async with session.post(url, json=update,
+                                    headers={'X-Telegram-Bot-Api-Secret-Token': WEBHOOK_TEST_SECRET}) as resp:
+                return resp.status == 200
+    else:
+        session = None
+
+        async def inject(update: dict) -> bool:
+            await telegram.push(update)
+            return True
+
+    driver = LoadDriver(telegram, inject, args.users, args.duration, args.think_time)
+
+    async def mark_processed(update: Update, context):
+        driver.on_processed(update.update_id)
+
+    # Runs after the real handlers in the same update, so it marks completion
+    app.add_handler(TypeHandler(Update, mark_processed), group=99)
+
+    server = asyncio.create_task(bot.serve(app, args.mode, stop_event))
+    while not app.running:
+        if server.done():
+            server.result()
+        await asyncio.sleep(0.05)
+    if args.mode == 'webhook':
+        await asyncio.sleep(0.2)  # Let the webhook listener bind
+
+    elapsed = await driver.run()
+    memory_after, memory_peak = tracemalloc.get_traced_memory()
+    rss_after = rss_kb()
+    users_in_store = len(bot.store)
+    processing = app.update_processor.stats()
+
+    stop_event.set()
+    await server
+    if session is not None:
+        await session.close()
+    await telegram.stop()
+    await gemini.stop()
+    tracemalloc.stop()
+
+    all_latencies = [x for samples in driver.latencies.values() for x in samples]
+    processed = len(all_latencies)
+    return {
+        'config': {
+            'mode': args.mode,
+            'users': args.users,
+            'duration_s': args.duration,
+            'think_time_s': args.think_time,
+            'streaming': args.streaming,
+            'store': args.store,
+            'gemini_median_latency_s': args.gemini_latency,
+            'gemini_error_rate': args.gemini_error_rate,
+        },
+        'throughput': {
+            'elapsed_s': round(elapsed, 3),
+            'updates_processed': processed,
+            'updates_per_s': round(processed / elapsed, 2) if elapsed else 0.0,
+            'flows_completed': driver.completed_flows,
+        },
+        'latency': {
+            'overall': summarize(all_latencies),
+            'first_response': summarize(driver.first_response),
+            **{kind: summarize(samples) for kind, samples in driver.latencies.items()},
+        },
+        'errors': {
+            'timeouts': driver.timeouts,
+            'rejected': driver.rejected,
+            'gemini_injected': {str(k): v for k, v in gemini.errors.items()},
+        },
+        'calls': {
+            'telegram': dict(sorted(telegram.calls.items())),
+            'gemini_requests': gemini.requests,
+        },
+        'processing': processing,
+        'memory': {
+            'traced_growth_kb': round((memory_after - memory_before) / 1024, 1),
+            'traced_peak_kb': round(memory_peak / 1024, 1),
+            'rss_before_kb': rss_before,
+            'rss_after_kb': rss_after,
+            'rss_growth_kb': rss_after - rss_before,
+            'users_in_store': users_in_store,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for Ykarb Telegram Bot")
+    parser.add_argument("--users", type=int, default=50, help="concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to generate load")
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean pause between a user's actions")
+    parser.add_argument("--mode", choices=("polling", "webhook"), default="polling")
+    parser.add_argument("--webhook-port", type=int, default=18443)
+    parser.add_argument("--gemini-latency", type=float, default=0.8, help="median Gemini latency in seconds")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0, help="share of Gemini calls failing with 429/503")
+    parser.add_argument("--no-streaming", dest="streaming", action="store_false")
+    parser.add_argument("--store", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load_test(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,112 @@
 import logging
 import asyncio
 import httpx
+import json
 import os
-from datetime import datetime, timedelta
+import signal
+import time
+from pathlib import Path
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from cache import TTLCache, normalize_prompt
+from crisis import crisis_detector
+from router import CallbackRouter
+from ratelimit import AdmissionController, AdmissionRejected, CircuitBreaker, backoff_delay, parse_retry_after, PRIORITY_BULK, PriorityRateLimiter
+from reminders import REMINDERS_ENABLED, REMINDER_TIMES, REMINDER_UTC_OFFSET, ReminderSchedule, ReminderScheduler
+from storage import create_user_store
+from cycles import CycleForecaster, local_today, log_period
+from mood_insights import MoodInsightsCache, log_activity
+from notes import NOTES_PAGE_SIZE
+from faq import FAQ_ENABLED, FaqRetriever, load_faq
+from i18n import FALLBACK_LANGUAGE, t
+from logpipeline import setup_logging
+from memreport import AllocationTracer, build_report
+from profiler import PROFILER_MAX_SECONDS, PROFILER_SECONDS, SamplingProfiler, register_handler
+from prompts import build_payload, has_history, remember_exchange, replace_reply
+from concurrency import PerUserUpdateProcessor
+from streaming import GEMINI_STREAMING, STREAM_PLACEHOLDER, ProgressiveReply
+from metrics import CRISIS_CHECKS, CRISIS_HITS, PROMPT_TOKENS, REPLY_FOLLOWUPS, REPLY_SOURCES, handler_latency, monitor_loop_lag, observe_gemini, observe_reply_size, runtime, start_metrics_server, timed
+from offsets import UpdateJournal, replay_backlog
+from sharding import BOT_WORKERS, serve_sharded
+from webhook import WebhookServer, enqueue_with_timeout, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import Forbidden
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, ContextTypes, filters, CallbackQueryHandler
 
 # ✅ Environment variables for security
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN", "YOUR_TELEGRAM_TOKEN_HERE")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "YOUR_GEMINI_API_KEY_HERE")
+# Telegram user ids allowed to run admin commands such as /memreport
+ADMIN_USER_IDS = frozenset(int(user_id) for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip())
 
-# ✅ Logging config
-logging.basicConfig(
-    format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO
-)
+# ✅ API endpoints (override to point at a local Bot API server or test doubles)
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE")  # e.g. http://localhost:8081
+
+# ✅ Serving mode: "polling" for local development, "webhook" for production
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", "1000"))
+STATS_LOG_INTERVAL = float(os.getenv("STATS_LOG_INTERVAL", "60"))
+
+# ✅ Gemini HTTP connection pool tuning
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "30"))
+GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "100"))
+GEMINI_MAX_KEEPALIVE = int(os.getenv("GEMINI_MAX_KEEPALIVE", "20"))
+GEMINI_KEEPALIVE_EXPIRY = float(os.getenv("GEMINI_KEEPALIVE_EXPIRY", "60"))
+GEMINI_HTTP2 = os.getenv("GEMINI_HTTP2", "false").lower() in ("1", "true", "yes")
+
+# ✅ Gemini admission control: rate limits, retries and circuit breaker
+GEMINI_RATE = float(os.getenv("GEMINI_RATE", "10"))  # requests/second across all users
+GEMINI_BURST = float(os.getenv("GEMINI_BURST", "20"))
+GEMINI_USER_RATE = float(os.getenv("GEMINI_USER_RATE", "0.5"))  # requests/second per user
+GEMINI_USER_BURST = float(os.getenv("GEMINI_USER_BURST", "3"))
+GEMINI_MAX_WAITERS = int(os.getenv("GEMINI_MAX_WAITERS", "200"))
+GEMINI_QUEUE_TIMEOUT = float(os.getenv("GEMINI_QUEUE_TIMEOUT", "5"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_RETRY_BASE = float(os.getenv("GEMINI_RETRY_BASE", "0.5"))
+GEMINI_RETRY_MAX_DELAY = float(os.getenv("GEMINI_RETRY_MAX_DELAY", "8"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# ✅ Reply latency budgets: seconds to wait for Gemini before answering locally
+REPLY_BUDGET = float(os.getenv("REPLY_BUDGET", "8"))
+REPLY_BUDGETS = {
+    'mitra': float(os.getenv("REPLY_BUDGET_MITRA", "3")),  # Distressed users shouldn't be kept waiting
+    'sakhi': float(os.getenv("REPLY_BUDGET_SAKHI", str(REPLY_BUDGET))),
+    'educare': float(os.getenv("REPLY_BUDGET_EDUCARE", str(REPLY_BUDGET))),
+}
+REPLY_FOLLOWUP = os.getenv("REPLY_FOLLOWUP", "true").lower() in ("1", "true", "yes")
+
+# ✅ Gemini response cache
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+
+# ✅ Logging config: records are queued and written as JSON lines by a background thread
+log_pipeline = setup_logging()
 logger = logging.getLogger(__name__)
 
-# ✅ User data storage (in production, use a proper database)
-user_data = {}
+# ✅ User data storage (select a durable backend with USER_STORE=sqlite)
+store = create_user_store()
+reminder_schedule = ReminderSchedule()
+cycle_forecaster = CycleForecaster()
+mood_insights = MoodInsightsCache()
+allocation_tracer = AllocationTracer()
+sampling_profiler = SamplingProfiler()
+
+# ✅ Local FAQ answers (build the index with python build_faq.py)
+faq_retriever = load_faq() if FAQ_ENABLED else FaqRetriever({})
+
+def forget_session(user_id: int):
+    """Drop per-user caches once the user's profile has been evicted from memory"""
+    mood_insights.forget(user_id)
+    # Reminder subscribers keep their prediction so reminders can still mention it
+    if user_id not in reminder_schedule:
+        cycle_forecaster.forget(user_id)
+
+store.add_eviction_hook(forget_session)
 
 # ✅ Crisis support resources
 CRISIS_RESOURCES = {
@@ -47,636 +136,1219 @@ LANGUAGES = {
     'punjabi': {'name': 'ਪੰਜਾਬੀ', 'code': 'pa'}
 }
 
-# ✅ Wellness activities and coping strategies
+# ✅ Wellness activities and coping strategies (titles and instructions live in the message catalog)
 WELLNESS_ACTIVITIES = {
-    'breathing': {
-        'title': '🫁 Deep Breathing Exercise',
-        'description': 'A simple 4-7-8 breathing technique to calm anxiety',
-        'instructions': [
-            '1. Sit comfortably and close your eyes',
-            '2. Inhale through nose for 4 counts',
-            '3. Hold your breath for 7 counts', 
-            '4. Exhale through mouth for 8 counts',
-            '5. Repeat 3-4 times'
-        ]
-    },
-    'grounding': {
-        'title': '🌱 5-4-3-2-1 Grounding Technique',
-        'description': 'Ground yourself in the present moment',
-        'instructions': [
-            '5 things you can SEE around you',
-            '4 things you can TOUCH',
-            '3 things you can HEAR',
-            '2 things you can SMELL',
-            '1 thing you can TASTE'
-        ]
-    },
-    'gratitude': {
-        'title': '🙏 Gratitude Practice',
-        'description': 'Shift focus to positive aspects of life',
-        'instructions': [
-            '1. Think of 3 things you\'re grateful for today',
-            '2. Write them down or say them aloud',
-            '3. Feel the emotion of gratitude',
-            '4. Notice how this changes your mood'
-        ]
-    },
-    'movement': {
-        'title': '🚶 Gentle Movement',
-        'description': 'Light physical activity to boost mood',
-        'instructions': [
-            '1. Stand up and stretch your arms',
-            '2. Take 10 deep breaths while moving',
-            '3. Walk around for 2-3 minutes',
-            '4. Notice how your body feels'
-        ]
-    }
+    'breathing': '🫁',
+    'grounding': '🌱',
+    'gratitude': '🙏',
+    'movement': '🚶',
+    'music': '🎵',
+    'affirmations': '📖',
 }
 
+# ✅ Local reply used when Gemini is overloaded or unavailable
+BUSY_FALLBACK_REPLY = (
+    "💚 I'm receiving a lot of messages right now and need a moment before I can reply properly. "
+    "Please try again shortly. In the meantime, the Mitra wellness activities are always available, "
+    "and if you're in crisis please reach out to a helpline right away."
+)
+
+EMPTY_REPLY = "I'm having trouble processing your request right now. Please try again."
+TIMEOUT_REPLY = "⏰ I'm taking a bit longer to respond. Please try again."
+HTTP_ERROR_REPLY = "🔧 I'm experiencing technical difficulties. Please try again later."
+UNEXPECTED_ERROR_REPLY = "❌ Something went wrong. Please try again."
+
+# Replies that mean Gemini did not answer; never shown in place of a local reply
+GEMINI_ERROR_REPLIES = {BUSY_FALLBACK_REPLY, EMPTY_REPLY, TIMEOUT_REPLY, HTTP_ERROR_REPLY, UNEXPECTED_ERROR_REPLY}
+
 class YkarbBot:
     def __init__(self):
-        self.gemini_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent?key={GEMINI_API_KEY}"
+        self.gemini_url = f"{GEMINI_API_BASE}/v1beta/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
+        self.gemini_stream_url = f"{GEMINI_API_BASE}/v1beta/models/{GEMINI_MODEL}:streamGenerateContent?alt=sse&key={GEMINI_API_KEY}"
+        self.http_client = None
+        self.response_cache = TTLCache(max_size=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+        self.admission = AdmissionController(
+            GEMINI_RATE, GEMINI_BURST, GEMINI_USER_RATE, GEMINI_USER_BURST, max_waiters=GEMINI_MAX_WAITERS
+        )
+        self.breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+
+    async def start(self):
+        """Open the shared, pooled HTTP client used for all Gemini calls"""
+        if self.http_client is not None:
+            return
+
+        http2 = GEMINI_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("GEMINI_HTTP2 is enabled but the 'h2' package is missing; falling back to HTTP/1.1")
+                http2 = False
+
+        self.http_client = httpx.AsyncClient(
+            timeout=GEMINI_TIMEOUT,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=GEMINI_MAX_CONNECTIONS,
+                max_keepalive_connections=GEMINI_MAX_KEEPALIVE,
+                keepalive_expiry=GEMINI_KEEPALIVE_EXPIRY,
+            ),
+        )
+        logger.info(
+            f"Gemini HTTP client ready (max_connections={GEMINI_MAX_CONNECTIONS}, "
+            f"keepalive={GEMINI_MAX_KEEPALIVE}, http2={http2})"
+        )
+
+    async def close(self):
+        """Close the shared HTTP client and release pooled connections"""
+        if self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
+            logger.info("Gemini HTTP client closed")
+
+    def _cache_key(self, prompt: str, context: str, language: str, use_cache: bool, crisis: bool = None):
+        """Return the response cache key, or None when the reply must not be cached
+
+        Pass crisis when the caller already checked the prompt, so it isn't scanned twice.
+        """
+        if not use_cache:
+            return None
+        if crisis is None:
+            crisis = self.detect_crisis_keywords(prompt)
+        if crisis:
+            return None
+        return (normalize_prompt(prompt), context, language)
+
+    def _build_payload(self, prompt: str, context: str, language: str, conversation: dict = None) -> dict:
+        """Build the Gemini request body with the Ykarb persona as systemInstruction"""
+        language_name = None
+        if language != "english":
+            language_name = LANGUAGES.get(language, {}).get('name', language)
         
-    async def get_gemini_response(self, prompt: str, context: str = "", language: str = "english") -> str:
-        """Get response from Gemini API with Ykarb personality and language support"""
+        payload, tokens = build_payload(prompt, context, language_name, conversation)
+        turns = len(conversation['turns']) if conversation else 0
+        logger.info("Gemini prompt: ~%d input tokens (%d history turns)", tokens, turns, extra={'sampled': True})
+        PROMPT_TOKENS.observe(tokens)
+        return payload
+
+    async def _request(self, url: str, payload: dict, user_id=None, stream: bool = False) -> httpx.Response:
+        """POST to Gemini through admission control, retrying transient failures
         
-        language_instruction = ""
-        if language != "english":
-            lang_name = LANGUAGES.get(language, {}).get('name', language)
-            language_instruction = f"Please respond in {lang_name} language when appropriate, while being culturally sensitive."
+        Raises AdmissionRejected when the call is not admitted or the circuit
+        breaker is open, so callers can answer locally instead of waiting.
+        """
+        if self.http_client is None:
+            await self.start()
+        
+        endpoint = "stream" if stream else "generate"
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise AdmissionRejected("Gemini circuit breaker is open")
+            
+            retry_after = None
+            try:
+                await self.admission.acquire(user_id, timeout=GEMINI_QUEUE_TIMEOUT)
+                started = time.perf_counter()
+                request = self.http_client.build_request("POST", url, json=payload)
+                response = await self.http_client.send(request, stream=stream)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                observe_gemini(endpoint, "timeout" if isinstance(e, httpx.TimeoutException) else "transport_error",
+                               time.perf_counter() - started)
+                self.breaker.record_failure()
+                error = e
+            except BaseException:
+                # Not admitted, or cancelled by the reply budget: the call never got an answer to judge
+                self.breaker.release_probe()
+                raise
+            else:
+                # For streams this is the time to the response headers
+                observe_gemini(endpoint, response.status_code, time.perf_counter() - started)
+                if response.status_code not in RETRYABLE_STATUS:
+                    # Any non-retryable answer means the upstream itself is reachable
+                    self.breaker.record_success()
+                    return response
+                self.breaker.record_failure()
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                error = httpx.HTTPStatusError(
+                    f"Gemini returned {response.status_code}", request=response.request, response=response
+                )
+                await response.aclose()
+            
+            delay = backoff_delay(attempt, GEMINI_RETRY_BASE, GEMINI_RETRY_MAX_DELAY, retry_after)
+            if attempt >= GEMINI_MAX_RETRIES or delay > GEMINI_RETRY_MAX_DELAY:
+                raise error
+            attempt += 1
+            logger.warning(f"Gemini call failed ({error}), retry {attempt}/{GEMINI_MAX_RETRIES} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def get_gemini_response(self, prompt: str, context: str = "", language: str = "english", use_cache: bool = True, user_id: int = None, conversation: dict = None, crisis: bool = None) -> str:
+        """Get response from Gemini API with Ykarb personality and language support
         
-        ykarb_prompt = f"""
-        You are Ykarb, a kind, multilingual, AI-powered digital companion that supports women and students. 
-        You are emotionally intelligent, culturally aware, private and supportive with no judgments.
-        You provide help through three modules:
-        1. Sakhi Module - Menstrual and hormonal health tracking
-        2. EduCare Module - Voice-to-text notes and learning assistance  
-        3. Mitra Module - Mental health support in regional languages
+        Set use_cache=False for messages that carry personal history. Crisis-flagged
+        prompts are never served from or stored in the cache; pass crisis if the
+        prompt was already checked. A conversation, if
+        given, is sent as history; recording the exchange is left to the caller,
+        which knows when the reply was actually shown.
+        """
         
-        {language_instruction}
+        cache_key = self._cache_key(prompt, context, language, use_cache, crisis)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
         
-        Context: {context}
-        User message: {prompt}
+        payload = self._build_payload(prompt, context, language, conversation)
+
+        try:
+            response = await self._request(self.gemini_url, payload, user_id)
+            response.raise_for_status()
+            data = response.json()
+            
+            if 'candidates' in data and len(data['candidates']) > 0:
+                reply = data['candidates'][0]['content']['parts'][0]['text']
+                observe_reply_size("generate", reply)
+                if cache_key is not None:
+                    self.response_cache.set(cache_key, reply)
+                return reply
+            else:
+                return EMPTY_REPLY
+                
+        except AdmissionRejected as e:
+            logger.warning(f"Gemini call not admitted: {e}")
+            return BUSY_FALLBACK_REPLY
+        except httpx.TimeoutException:
+            logger.error("Gemini API timeout")
+            return TIMEOUT_REPLY
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Gemini API HTTP error: {e}")
+            return HTTP_ERROR_REPLY
+        except Exception as e:
+            logger.error(f"Gemini API error: {e}")
+            return UNEXPECTED_ERROR_REPLY
+
+    async def stream_gemini_response(self, prompt: str, context: str = "", language: str = "english", use_cache: bool = True, user_id: int = None, conversation: dict = None, crisis: bool = None):
+        """Stream a Gemini reply, yielding the accumulated text after every chunk
         
-        Respond as Ykarb with empathy, cultural sensitivity, and helpful guidance. If the user seems to be in crisis or mentions self-harm, provide immediate support and crisis resources.
+        Uses the streamGenerateContent endpoint with server-sent events. Cache
+        hits and errors are yielded as a single, complete text.
         """
         
-        payload = {
-            "contents": [{
-                "parts": [{"text": ykarb_prompt}]
-            }],
-            "generationConfig": {
-                "temperature": 0.7,
-                "topK": 40,
-                "topP": 0.95,
-                "maxOutputTokens": 1024,
-            }
-        }
-
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        cache_key = self._cache_key(prompt, context, language, use_cache, crisis)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        payload = self._build_payload(prompt, context, language, conversation)
+
+        text = ""
+        try:
+            response = await self._request(self.gemini_stream_url, payload, user_id, stream=True)
             try:
-                response = await client.post(self.gemini_url, json=payload)
                 response.raise_for_status()
-                data = response.json()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    chunk = json.loads(line[5:])
+                    for candidate in chunk.get('candidates', [])[:1]:
+                        for part in candidate.get('content', {}).get('parts', []):
+                            text += part.get('text', '')
+                    if text:
+                        yield text
+            finally:
+                await response.aclose()
+            
+            if not text:
+                yield EMPTY_REPLY
+                return
+            observe_reply_size("stream", text)
+            if cache_key is not None:
+                self.response_cache.set(cache_key, text)
                 
-                if 'candidates' in data and len(data['candidates']) > 0:
-                    return data['candidates'][0]['content']['parts'][0]['text']
-                else:
-                    return "I'm having trouble processing your request right now. Please try again."
-                    
-            except httpx.TimeoutException:
-                logger.error("Gemini API timeout")
-                return "⏰ I'm taking a bit longer to respond. Please try again."
-            except httpx.HTTPStatusError as e:
-                logger.error(f"Gemini API HTTP error: {e}")
-                return "🔧 I'm experiencing technical difficulties. Please try again later."
-            except Exception as e:
-                logger.error(f"Gemini API error: {e}")
-                return "❌ Something went wrong. Please try again."
+        except AdmissionRejected as e:
+            logger.warning(f"Gemini call not admitted: {e}")
+            yield text or BUSY_FALLBACK_REPLY
+        except httpx.TimeoutException:
+            logger.error("Gemini API timeout")
+            yield text or TIMEOUT_REPLY
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Gemini API HTTP error: {e}")
+            yield text or HTTP_ERROR_REPLY
+        except Exception as e:
+            logger.error(f"Gemini API error: {e}")
+            yield text or UNEXPECTED_ERROR_REPLY
 
     def detect_crisis_keywords(self, text: str) -> bool:
-        """Detect potential crisis situations in user messages"""
-        crisis_keywords = [
-            'suicide', 'kill myself', 'end it all', 'want to die', 'hurt myself',
-            'self harm', 'cutting', 'overdose', 'jump', 'hanging', 'worthless',
-            'hopeless', 'can\'t go on', 'better off dead', 'no point living'
-        ]
-        text_lower = text.lower()
-        return any(keyword in text_lower for keyword in crisis_keywords)
+        """Detect potential crisis situations in user messages (all supported languages)"""
+        return crisis_detector.detect(text)
 
 bot = YkarbBot()
 
+# ✅ Static keyboards and message bodies, built once at import and reused
+def _keyboard(*rows) -> InlineKeyboardMarkup:
+    """Build an inline keyboard from rows of (label, callback_data) pairs"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(label, callback_data=data) for label, data in row]
+        for row in rows
+    ])
+
+def _localized_keyboard(*rows) -> dict:
+    """Build one keyboard per language from rows of (catalog key, callback_data) pairs
+
+    A label can also be an (emoji, catalog key) pair when the icon is not part of the message.
+    """
+    def label(language, key):
+        if isinstance(key, tuple):
+            return f"{key[0]} {t(language, key[1])}"
+        return t(language, key)
+    return {
+        language: _keyboard(*[[(label(language, key), data) for key, data in row] for row in rows])
+        for language in LANGUAGES
+    }
+
+def profile_language(profile: dict) -> str:
+    """The user's language, falling back to English for anything unsupported"""
+    language = profile.get('language', FALLBACK_LANGUAGE)
+    return language if language in LANGUAGES else FALLBACK_LANGUAGE
+
+BACK_TO_MITRA = ('button.back_to_mitra', 'mitra')
+
+MAIN_MENU_KEYBOARD = _localized_keyboard(
+    [('menu.button.sakhi', 'sakhi')],
+    [('menu.button.educare', 'educare')],
+    [('menu.button.mitra', 'mitra')],
+    [('menu.button.language', 'language_settings')],
+    [('menu.button.about', 'about')]
+)
+
+MITRA_KEYBOARD = _localized_keyboard(
+    [('mitra.button.mood_checkin', 'mood_checkin')],
+    [('mitra.button.mood_history', 'mood_history')],
+    [('mitra.button.wellness', 'wellness_menu')],
+    [('mitra.button.daily_goals', 'daily_goals')],
+    [('mitra.button.reminders', 'reminders')],
+    [('mitra.button.crisis_support', 'crisis_support')],
+    [('mitra.button.language', 'language_support')],
+    [('button.main_menu', 'main_menu')]
+)
+
+MOODS = ['happy', 'sad', 'anxious', 'angry', 'peaceful', 'tired', 'overwhelmed', 'grateful']
+MOOD_EMOJI = {
+    'happy': '😊', 'sad': '😢', 'anxious': '😰', 'angry': '😡',
+    'peaceful': '😌', 'tired': '😴', 'overwhelmed': '😵‍💫', 'grateful': '🤗',
+}
+
+MOOD_CHECKIN_KEYBOARD = _localized_keyboard(
+    *[[((MOOD_EMOJI[mood], f'mood.name.{mood}'), f'mood_{mood}') for mood in MOODS[i:i + 2]]
+      for i in range(0, len(MOODS), 2)],
+    [BACK_TO_MITRA]
+)
+
+MOOD_HISTORY_KEYBOARD = _localized_keyboard(
+    [('mitra.button.mood_insights', 'mood_insights')],
+    [('mitra.button.wellness', 'wellness_menu')],
+    [BACK_TO_MITRA]
+)
+
+MOOD_INSIGHTS_KEYBOARD = _localized_keyboard(
+    [('mitra.button.mood_checkin', 'mood_checkin')],
+    [('mitra.button.mood_history', 'mood_history')],
+    [BACK_TO_MITRA]
+)
+
+WELLNESS_KEYBOARD = _localized_keyboard(
+    *[[((emoji, f'activity.{key}.name'), f'activity_{key}')] for key, emoji in WELLNESS_ACTIVITIES.items()],
+    [BACK_TO_MITRA]
+)
+
+COMPLETED_KEYBOARD = _localized_keyboard(
+    [('activity.button.check_again', 'mood_checkin')],
+    [('activity.button.more', 'wellness_menu')],
+    [BACK_TO_MITRA]
+)
+
+CRISIS_KEYBOARD = _localized_keyboard(
+    [('crisis.button.talk_now', 'talk_now')],
+    [('crisis.button.immediate_coping', 'immediate_coping')],
+    [('crisis.button.local_resources', 'local_resources')],
+    [BACK_TO_MITRA]
+)
+
+LANGUAGE_KEYBOARD = {
+    language: _keyboard(
+        *[[(lang_info['name'], f'set_language_{lang_key}')] for lang_key, lang_info in LANGUAGES.items()],
+        [(t(language, 'button.back_to_mitra'), 'mitra')]
+    )
+    for language in LANGUAGES
+}
+
+BACK_TO_MITRA_KEYBOARD = _localized_keyboard([BACK_TO_MITRA])
+
+SAKHI_KEYBOARD = _localized_keyboard(
+    [('sakhi.button.track_period', 'track_period')],
+    [('sakhi.button.predictions', 'predictions')],
+    [('sakhi.button.insights', 'insights')],
+    [('button.main_menu', 'main_menu')]
+)
+
+BACK_TO_SAKHI = ('button.back_to_sakhi', 'sakhi')
+
+PERIOD_START_CHOICES = {'0', '1', '2', '3', '4', '7'}  # Days ago offered by TRACK_PERIOD_KEYBOARD
+
+TRACK_PERIOD_KEYBOARD = {
+    language: _keyboard(
+        [(t(language, 'sakhi.button.today'), 'period_start_0'), (t(language, 'sakhi.button.yesterday'), 'period_start_1')],
+        [(t(language, 'sakhi.button.days_ago', days=2), 'period_start_2'), (t(language, 'sakhi.button.days_ago', days=3), 'period_start_3')],
+        [(t(language, 'sakhi.button.days_ago', days=4), 'period_start_4'), (t(language, 'sakhi.button.week_ago'), 'period_start_7')],
+        [(t(language, 'button.back_to_sakhi'), 'sakhi')]
+    )
+    for language in LANGUAGES
+}
+
+CYCLE_KEYBOARD = _localized_keyboard(
+    [('sakhi.button.predictions', 'predictions')],
+    [('sakhi.button.insights', 'insights')],
+    [BACK_TO_SAKHI]
+)
+
+NO_CYCLE_DATA_KEYBOARD = _localized_keyboard(
+    [('sakhi.button.track_period', 'track_period')],
+    [BACK_TO_SAKHI]
+)
+
+EDUCARE_KEYBOARD = _localized_keyboard(
+    [('educare.button.voice_help', 'voice_help')],
+    [('educare.button.study_tips', 'study_tips')],
+    [('educare.button.resources', 'resources')],
+    [('educare.button.notes', 'notes')],
+    [('button.main_menu', 'main_menu')]
+)
+
+REMINDER_TIME_ROWS = [
+    [(f"🕐 {slot}", f"reminder_at_{slot.replace(':', '')}") for slot in REMINDER_TIMES[i:i + 2]]
+    for i in range(0, len(REMINDER_TIMES), 2)
+]
+
+REMINDER_SETTINGS_KEYBOARD = {
+    language: _keyboard(
+        *REMINDER_TIME_ROWS,
+        [(t(language, 'reminder.button.off'), 'reminders_off')],
+        [(t(language, 'button.back_to_mitra'), 'mitra')]
+    )
+    for language in LANGUAGES
+}
+
+REMINDER_KEYBOARD = _localized_keyboard(
+    [('reminder.button.check_in', 'mood_checkin')],
+    [('reminder.button.stop', 'reminders_off')]
+)
+
+CRISIS_ALERT_KEYBOARD = _localized_keyboard(
+    [('crisis.button.get_help', 'crisis_support')],
+    [('crisis.button.talk_to_me', 'mitra')],
+    [('crisis.button.coping', 'immediate_coping')]
+)
+
+MITRA_CHAT_KEYBOARD = _localized_keyboard(
+    [('mitra.button.check_mood', 'mood_checkin')],
+    [('mitra.button.wellness_activity', 'wellness_menu')]
+)
+
+NO_MODULE_CHAT_KEYBOARD = _localized_keyboard(
+    [('mitra.button.support', 'mitra')],
+    [('button.main_menu', 'main_menu')]
+)
+
+INTENSITY_LEVELS = range(1, 6)
+# Callback data is client-supplied: only the values our keyboards offer are accepted
+INTENSITY_CHOICES = {str(level) for level in INTENSITY_LEVELS}
+
+def _intensity_keyboard(mood: str) -> dict:
+    return _localized_keyboard(
+        *[[(f'mood.intensity.{level}', f'intensity_{mood}_{level}')] for level in INTENSITY_LEVELS],
+        [('button.back', 'mood_checkin')]
+    )
+
+INTENSITY_KEYBOARDS = {mood: _intensity_keyboard(mood) for mood in MOODS}
+
+def _activity_keyboard(activity_key: str) -> dict:
+    return _localized_keyboard(
+        [('activity.button.completed', f'completed_{activity_key}')],
+        [('activity.button.try_another', 'wellness_menu')],
+        [BACK_TO_MITRA]
+    )
+
+ACTIVITY_KEYBOARDS = {key: _activity_keyboard(key) for key in WELLNESS_ACTIVITIES}
+
 # ✅ Start command with module selection
+@timed("start")
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    user_data[user_id] = {
-        'active_module': None,
-        'language': 'english',
-        'cycle_data': {},
-        'mood_history': [],
-        'wellness_streak': 0,
-        'notes': [],
-        'crisis_support_shown': False
-    }
+    profile = await store.get(user_id)
+    profile['active_module'] = None
+    profile['pending_note'] = None
+    store.mark_dirty(user_id)
+    language = profile_language(profile)
     
-    keyboard = [
-        [InlineKeyboardButton("🌸 Sakhi - Menstrual Health", callback_data='sakhi')],
-        [InlineKeyboardButton("📚 EduCare - Learning Assistant", callback_data='educare')],
-        [InlineKeyboardButton("💚 Mitra - Mental Health Support", callback_data='mitra')],
-        [InlineKeyboardButton("🌍 Language Settings", callback_data='language_settings')],
-        [InlineKeyboardButton("ℹ️ About Ykarb", callback_data='about')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    await update.message.reply_text(
+        t(language, 'menu.welcome'),
+        parse_mode='Markdown',
+        reply_markup=MAIN_MENU_KEYBOARD[language]
+    )
+
+# ✅ Note commands: /note <text> saves a note, /notes [words] lists or searches them
+@timed("note")
+async def note_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    profile = await store.get(user_id)
+    parts = update.message.text.split(maxsplit=1)
+    
+    if len(parts) > 1:
+        await save_note(update.message, user_id, profile, parts[1])
+        return
+    
+    # No text yet: save the next message instead
+    profile['pending_note'] = ''
+    store.mark_dirty(user_id)
+    await update.message.reply_text(t(profile_language(profile), 'notes.prompt'), parse_mode='Markdown')
+
+@timed("notes")
+async def notes_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    profile = await store.get(user_id)
+    parts = update.message.text.split(maxsplit=1)
+    query = parts[1] if len(parts) > 1 else ''
     
-    welcome_message = """
-🌟 *Welcome to Ykarb!* 🌟
+    # Remembered so the page buttons keep searching the same words
+    profile['notes_query'] = query
+    store.mark_dirty(user_id)
+    notes = await store.notes(user_id)
+    text, reply_markup = render_notes_page(notes, query, 0, profile_language(profile))
+    await update.message.reply_text(text, reply_markup=reply_markup)
 
-I'm your caring digital companion, here to support you through:
+# ✅ Admin commands (only ADMIN_USER_IDS reach these handlers)
+@timed("memreport")
+async def memreport_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.message.text.split()[1:] == ['stop']:
+        allocation_tracer.stop()
+        await update.message.reply_text("Allocation tracing stopped.")
+        return
+    
+    # Plain text: the report contains file paths and user ids
+    await update.message.reply_text(await build_report(store, allocation_tracer))
 
-🌸 *Sakhi Module* - Menstrual & hormonal health tracking
-📚 *EduCare Module* - Smart learning assistance  
-💚 *Mitra Module* - Mental health support in your language
+PROFILE_USAGE = "Usage: /profile [seconds], /profile <count> updates, or /profile stop"
 
-Choose a module to get started, or just chat with me about anything! 💕
+def processed_updates(app) -> int:
+    return getattr(app.update_processor, 'processed', 0)
 
-*Remember: You're never alone, and your feelings are always valid.*
-    """
+def start_profile(app, seconds: float = None, max_updates: int = None):
+    """Start a profiling session; returns its result future, None if one is running, or an error message"""
+    try:
+        return sampling_profiler.start(seconds, max_updates, updates=lambda: processed_updates(app))
+    except RuntimeError as e:
+        return str(e)
+
+async def report_profile(app, session, chat_id: int = None):
+    """Wait for a session to end, save its collapsed stacks and send or log the summary"""
+    result = await session
+    path = await asyncio.to_thread(result.save)
+    if chat_id is None:
+        logger.info(f"Profile saved to {path}\n{result.summary()}")
+        return
+    await app.bot.send_message(chat_id, result.summary())
+    await app.bot.send_document(chat_id, Path(path), caption="Collapsed stacks for flamegraph.pl or speedscope")
+
+@timed("profile")
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    args = update.message.text.split()[1:]
+    if args == ['stop']:
+        stopped = sampling_profiler.stop()
+        await update.message.reply_text("Profiler stopped; results follow." if stopped else "The profiler is not running.")
+        return
     
-    await update.message.reply_text(
-        welcome_message, 
+    seconds, max_updates = None, None
+    try:
+        if len(args) == 1:
+            seconds = float(args[0])
+        elif len(args) == 2 and args[1] == 'updates':
+            seconds, max_updates = PROFILER_MAX_SECONDS, int(args[0])
+        elif args:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text(PROFILE_USAGE)
+        return
+    
+    session = start_profile(context.application, seconds, max_updates)
+    if session is None:
+        await update.message.reply_text("A profiling session is already running; send /profile stop to end it.")
+        return
+    if isinstance(session, str):
+        await update.message.reply_text(f"Profiling is unavailable: {session}")
+        return
+    # Reported from a separate task so this user's later updates aren't held up for the whole window
+    context.application.create_task(report_profile(context.application, session, update.effective_chat.id))
+    limit = f"{max_updates} updates" if max_updates else f"{min(seconds or PROFILER_SECONDS, PROFILER_MAX_SECONDS):.0f}s"
+    await update.message.reply_text(f"🔬 Profiling for up to {limit}; results follow when it stops.")
+
+def toggle_profiler(app):
+    """SIGUSR2 handler: start a default session, or end the running one; the summary goes to the log"""
+    if sampling_profiler.stop():
+        return
+    session = start_profile(app)
+    if isinstance(session, str):
+        logger.warning(f"Profiling is unavailable: {session}")
+    elif session is not None:
+        app.create_task(report_profile(app, session))
+
+# ✅ Callback routers, one per module. Handlers receive
+# (query, user_id, profile, arg) where arg is the callback data after a prefix.
+core_routes = CallbackRouter('core')
+mitra_routes = CallbackRouter('mitra')
+sakhi_routes = CallbackRouter('sakhi')
+educare_routes = CallbackRouter('educare')
+
+@mitra_routes.route('mitra')
+async def show_mitra(query, user_id, profile, arg):
+    profile['active_module'] = 'mitra'
+    profile['pending_note'] = None
+    store.mark_dirty(user_id)
+    
+    # Get user's mood trend
+    language = profile_language(profile)
+    mood_trend = get_mood_trend(profile, language)
+    streak_text = t(language, 'mitra.streak', days=profile['wellness_streak']) if profile['wellness_streak'] > 0 else ""
+    
+    await query.edit_message_text(
+        f"{t(language, 'mitra.title')}\n\n"
+        f"{t(language, 'mitra.intro')}\n\n"
+        f"{mood_trend}\n{streak_text}\n\n"
+        f"{t(language, 'mitra.remember')}\n\n"
+        f"{t(language, 'mitra.prompt')}",
+        parse_mode='Markdown',
+        reply_markup=MITRA_KEYBOARD[language]
+    )
+
+@mitra_routes.route('mood_checkin')
+async def show_mood_checkin(query, user_id, profile, arg):
+    language = profile_language(profile)
+    await query.edit_message_text(
+        t(language, 'mood.checkin_text'),
+        parse_mode='Markdown',
+        reply_markup=MOOD_CHECKIN_KEYBOARD[language]
+    )
+
+@mitra_routes.prefix('mood_')
+async def choose_mood_intensity(query, user_id, profile, mood_key):
+    if mood_key not in INTENSITY_KEYBOARDS:
+        return
+    language = profile_language(profile)
+    
+    await query.edit_message_text(
+        t(language, 'mood.intensity_prompt', mood=t(language, f'mood.name.{mood_key}')),
+        parse_mode='Markdown',
+        reply_markup=INTENSITY_KEYBOARDS[mood_key][language]
+    )
+
+@lru_cache(maxsize=len(MOODS) * len(INTENSITY_LEVELS) * len(LANGUAGES))
+def intensity_response(mood: str, intensity: int, language: str = FALLBACK_LANGUAGE) -> tuple:
+    """Return the (text, keyboard) shown after logging a mood; built once per combination"""
+    response_text, suggested_activities = generate_mood_response(mood, intensity, language)
+    
+    rows = [
+        [(f"🧘 {t(language, f'activity.{activity_key}.name')}", f'activity_{activity_key}')]
+        for activity_key in suggested_activities
+    ]
+    rows.extend([
+        [(t(language, 'mood.button.add_note'), f'add_note_{mood}_{intensity}')],
+        [(t(language, 'mood.button.view_history'), 'mood_history')],
+        [(t(language, 'button.back_to_mitra'), 'mitra')]
+    ])
+    
+    # Check if crisis intervention is needed
+    if (mood in ['sad', 'angry', 'overwhelmed'] and intensity >= 4) or intensity == 5:
+        rows.insert(0, [(t(language, 'mood.button.immediate_support'), 'crisis_support')])
+        response_text += f"\n\n{t(language, 'mood.intense_warning')}"
+    
+    logged = t(language, 'mood.logged', mood=t(language, f'mood.name.{mood}'), intensity=intensity)
+    return f"{logged}\n\n{response_text}", _keyboard(*rows)
+
+@mitra_routes.prefix('intensity_')
+async def log_mood(query, user_id, profile, arg):
+    mood_key, _, intensity = arg.rpartition('_')
+    if mood_key not in INTENSITY_KEYBOARDS or intensity not in INTENSITY_CHOICES:
+        return
+    intensity = int(intensity)
+    
+    # Save mood entry
+    profile['mood_history'].append(mood_key, intensity)
+    store.mark_dirty(user_id)
+    
+    # Personalized response based on mood and intensity
+    text, reply_markup = intensity_response(mood_key, intensity, profile_language(profile))
+    
+    await query.edit_message_text(
+        text,
         parse_mode='Markdown',
         reply_markup=reply_markup
     )
 
-# ✅ Enhanced module selection handler
+@mitra_routes.prefix('add_note_')
+async def prompt_mood_note(query, user_id, profile, arg):
+    mood_key, _, intensity = arg.rpartition('_')
+    if mood_key not in INTENSITY_KEYBOARDS or intensity not in INTENSITY_CHOICES:
+        return
+    # The next text message is saved as a note tagged with this mood
+    profile['pending_note'] = f"{mood_key} {intensity}/5"
+    store.mark_dirty(user_id)
+    language = profile_language(profile)
+    
+    await query.edit_message_text(
+        t(language, 'notes.prompt'),
+        parse_mode='Markdown',
+        reply_markup=BACK_TO_MITRA_KEYBOARD[language]
+    )
+
+@mitra_routes.route('mood_history')
+async def show_mood_history(query, user_id, profile, arg):
+    language = profile_language(profile)
+    history_text = generate_mood_history_text(profile, language)
+    
+    await query.edit_message_text(
+        f"{t(language, 'mood.history_title')}\n\n{history_text}",
+        parse_mode='Markdown',
+        reply_markup=MOOD_HISTORY_KEYBOARD[language]
+    )
+
+@mitra_routes.route('mood_insights')
+async def show_mood_insights(query, user_id, profile, arg):
+    language = profile_language(profile)
+    insights_text = mood_insights.get(user_id, profile, REMINDER_UTC_OFFSET, language)
+    
+    await query.edit_message_text(
+        f"{t(language, 'insights.title')}\n\n{insights_text}",
+        parse_mode='Markdown',
+        reply_markup=MOOD_INSIGHTS_KEYBOARD[language]
+    )
+
+@mitra_routes.route('wellness_menu')
+async def show_wellness_menu(query, user_id, profile, arg):
+    language = profile_language(profile)
+    await query.edit_message_text(
+        t(language, 'wellness.text'),
+        parse_mode='Markdown',
+        reply_markup=WELLNESS_KEYBOARD[language]
+    )
+
+@mitra_routes.prefix('activity_')
+async def show_activity(query, user_id, profile, activity_key):
+    language = profile_language(profile)
+    activity_text = generate_activity_instructions(activity_key, language)
+    reply_markup = ACTIVITY_KEYBOARDS.get(activity_key) or _activity_keyboard(activity_key)
+    
+    await query.edit_message_text(
+        activity_text,
+        parse_mode='Markdown',
+        reply_markup=reply_markup[language]
+    )
+
+@mitra_routes.prefix('completed_')
+async def complete_activity(query, user_id, profile, activity_key):
+    language = profile_language(profile)
+    if activity_key in WELLNESS_ACTIVITIES:
+        activity = t(language, f'activity.{activity_key}.name')
+    else:
+        activity = activity_key.replace('_', ' ').title()
+    profile['wellness_streak'] += 1
+    log_activity(profile, activity_key)
+    store.mark_dirty(user_id)
+    
+    await query.edit_message_text(
+        t(language, 'activity.completed', activity=activity, streak=profile['wellness_streak']),
+        parse_mode='Markdown',
+        reply_markup=COMPLETED_KEYBOARD[language]
+    )
+
+@mitra_routes.route('crisis_support')
+async def show_crisis_support(query, user_id, profile, arg):
+    profile['crisis_support_shown'] = True
+    store.mark_dirty(user_id)
+    language = profile_language(profile)
+    
+    await query.edit_message_text(
+        generate_crisis_support_text(language),
+        parse_mode='Markdown',
+        reply_markup=CRISIS_KEYBOARD[language]
+    )
+
+@mitra_routes.route('language_support')
+async def show_language_support(query, user_id, profile, arg):
+    language = profile_language(profile)
+    await query.edit_message_text(
+        t(language, 'language.choose'),
+        parse_mode='Markdown',
+        reply_markup=LANGUAGE_KEYBOARD[language]
+    )
+
+@mitra_routes.prefix('set_language_')
+async def set_language(query, user_id, profile, language):
+    if language not in LANGUAGES:
+        return
+    profile['language'] = language
+    reminder = profile.get('reminder')
+    if reminder:
+        reminder['language'] = language
+        reminder_schedule.set(user_id, reminder['time'], reminder.get('utc_offset', REMINDER_UTC_OFFSET), language)
+    store.mark_dirty(user_id)
+    lang_name = LANGUAGES[language]['name']
+    
+    await query.edit_message_text(
+        t(language, 'language.set', language=lang_name),
+        parse_mode='Markdown',
+        reply_markup=BACK_TO_MITRA_KEYBOARD[language]
+    )
+
+@mitra_routes.route('reminders')
+async def show_reminders(query, user_id, profile, arg):
+    language = profile_language(profile)
+    reminder = profile.get('reminder')
+    status = t(language, 'reminder.status_on', time=reminder['time']) if reminder else t(language, 'reminder.status_off')
+    await query.edit_message_text(
+        f"{t(language, 'reminder.title')}\n\n{status}\n\n{t(language, 'reminder.pick_time')}",
+        parse_mode='Markdown',
+        reply_markup=REMINDER_SETTINGS_KEYBOARD[language]
+    )
+
+@mitra_routes.prefix('reminder_at_')
+async def set_reminder(query, user_id, profile, hhmm):
+    local_time = f"{hhmm[:2]}:{hhmm[2:]}"
+    if local_time not in REMINDER_TIMES:
+        return
+    language = profile_language(profile)
+    profile['reminder'] = {'time': local_time, 'utc_offset': REMINDER_UTC_OFFSET, 'language': language}
+    store.mark_dirty(user_id)
+    reminder_schedule.set(user_id, local_time, REMINDER_UTC_OFFSET, language)
+    await query.edit_message_text(
+        t(language, 'reminder.set', time=local_time),
+        parse_mode='Markdown',
+        reply_markup=BACK_TO_MITRA_KEYBOARD[language]
+    )
+
+@mitra_routes.route('reminders_off')
+async def disable_reminders(query, user_id, profile, arg):
+    profile['reminder'] = None
+    store.mark_dirty(user_id)
+    reminder_schedule.remove(user_id)
+    language = profile_language(profile)
+    await query.edit_message_text(
+        t(language, 'reminder.off'),
+        parse_mode='Markdown',
+        reply_markup=BACK_TO_MITRA_KEYBOARD[language]
+    )
+
+@sakhi_routes.route('sakhi')
+async def show_sakhi(query, user_id, profile, arg):
+    profile['active_module'] = 'sakhi'
+    store.mark_dirty(user_id)
+    language = profile_language(profile)
+    
+    await query.edit_message_text(
+        t(language, 'sakhi.text'),
+        parse_mode='Markdown',
+        reply_markup=SAKHI_KEYBOARD[language]
+    )
+
+@sakhi_routes.route('track_period')
+async def show_track_period(query, user_id, profile, arg):
+    language = profile_language(profile)
+    starts = profile['cycle_data'].get('starts', [])
+    last_text = ""
+    if starts:
+        last_text = t(language, 'sakhi.last_logged', date=_format_day(date.fromisoformat(starts[-1]))) + "\n\n"
+    await query.edit_message_text(
+        f"{t(language, 'sakhi.track_title')}\n\n{last_text}{t(language, 'sakhi.track_prompt')}",
+        parse_mode='Markdown',
+        reply_markup=TRACK_PERIOD_KEYBOARD[language]
+    )
+
+@sakhi_routes.prefix('period_start_')
+async def record_period(query, user_id, profile, days_ago):
+    if days_ago not in PERIOD_START_CHOICES:
+        return
+    day = local_today(REMINDER_UTC_OFFSET) - timedelta(days=int(days_ago))
+    cycle_data = profile['cycle_data']
+    if log_period(cycle_data, day):
+        store.mark_dirty(user_id)
+        prediction = cycle_forecaster.update(user_id, cycle_data, day)
+    else:
+        prediction = cycle_forecaster.get(user_id, cycle_data)
+    language = profile_language(profile)
+    
+    await query.edit_message_text(
+        f"{t(language, 'sakhi.logged', date=_format_day(day))}\n\n"
+        f"{generate_prediction_text(prediction, local_today(REMINDER_UTC_OFFSET), language)}",
+        parse_mode='Markdown',
+        reply_markup=CYCLE_KEYBOARD[language]
+    )
+
+async def show_no_cycle_data(query, language: str):
+    await query.edit_message_text(
+        t(language, 'sakhi.no_data'), parse_mode='Markdown', reply_markup=NO_CYCLE_DATA_KEYBOARD[language]
+    )
+
+@sakhi_routes.route('predictions')
+async def show_predictions(query, user_id, profile, arg):
+    language = profile_language(profile)
+    prediction = cycle_forecaster.get(user_id, profile['cycle_data'])
+    if prediction is None:
+        await show_no_cycle_data(query, language)
+        return
+    
+    await query.edit_message_text(
+        f"{t(language, 'sakhi.predictions_title')}\n\n"
+        f"{generate_prediction_text(prediction, local_today(REMINDER_UTC_OFFSET), language)}\n\n"
+        f"{t(language, 'sakhi.predictions_disclaimer')}",
+        parse_mode='Markdown',
+        reply_markup=CYCLE_KEYBOARD[language]
+    )
+
+@sakhi_routes.route('insights')
+async def show_cycle_insights(query, user_id, profile, arg):
+    language = profile_language(profile)
+    prediction = cycle_forecaster.get(user_id, profile['cycle_data'])
+    if prediction is None:
+        await show_no_cycle_data(query, language)
+        return
+    
+    await query.edit_message_text(
+        f"{t(language, 'sakhi.insights_title')}\n\n{generate_cycle_insights_text(prediction, language)}",
+        parse_mode='Markdown',
+        reply_markup=CYCLE_KEYBOARD[language]
+    )
+
+@educare_routes.route('educare')
+async def show_educare(query, user_id, profile, arg):
+    profile['active_module'] = 'educare'
+    store.mark_dirty(user_id)
+    language = profile_language(profile)
+    
+    await query.edit_message_text(
+        t(language, 'educare.text'),
+        parse_mode='Markdown',
+        reply_markup=EDUCARE_KEYBOARD[language]
+    )
+
+@educare_routes.route('notes')
+async def show_notes(query, user_id, profile, arg):
+    profile['notes_query'] = ''
+    store.mark_dirty(user_id)
+    notes = await store.notes(user_id)
+    text, reply_markup = render_notes_page(notes, '', 0, profile_language(profile))
+    
+    await query.edit_message_text(text, reply_markup=reply_markup)
+
+@educare_routes.prefix('notes_page_')
+async def show_notes_page(query, user_id, profile, offset):
+    notes = await store.notes(user_id)
+    text, reply_markup = render_notes_page(
+        notes, profile['notes_query'], max(0, int(offset)), profile_language(profile)
+    )
+    
+    await query.edit_message_text(text, reply_markup=reply_markup)
+
+@core_routes.route('main_menu')
+async def show_main_menu(query, user_id, profile, arg):
+    language = profile_language(profile)
+    await query.edit_message_text(
+        t(language, 'menu.welcome_back'),
+        parse_mode='Markdown',
+        reply_markup=MAIN_MENU_KEYBOARD[language]
+    )
+
+callback_router = CallbackRouter()
+callback_router.include(core_routes, mitra_routes, sakhi_routes, educare_routes)
+# Profiles attribute samples to routes under the same labels as the latency metrics
+for route, handler in callback_router.routes():
+    register_handler(handler, f"button:{route}")
+
+# ✅ Module selection handler: dispatches every button press through the router
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
+    handler, arg, route = callback_router.resolve(query.data or "")
+    if handler is None:
+        logger.debug(f"No handler for callback '{query.data}'")
+        return
+    
     user_id = query.from_user.id
-    if user_id not in user_data:
-        user_data[user_id] = {
-            'active_module': None, 
-            'language': 'english',
-            'cycle_data': {}, 
-            'mood_history': [], 
-            'wellness_streak': 0,
-            'notes': [],
-            'crisis_support_shown': False
-        }
-    
-    if query.data == 'mitra':
-        user_data[user_id]['active_module'] = 'mitra'
-        keyboard = [
-            [InlineKeyboardButton("💭 Mood Check-in", callback_data='mood_checkin')],
-            [InlineKeyboardButton("📊 Mood History", callback_data='mood_history')],
-            [InlineKeyboardButton("🧘 Wellness Activities", callback_data='wellness_menu')],
-            [InlineKeyboardButton("🎯 Daily Goals", callback_data='daily_goals')],
-            [InlineKeyboardButton("🆘 Crisis Support", callback_data='crisis_support')],
-            [InlineKeyboardButton("🌍 Language Support", callback_data='language_support')],
-            [InlineKeyboardButton("🏠 Main Menu", callback_data='main_menu')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        # Get user's mood trend
-        mood_trend = get_mood_trend(user_id)
-        streak_text = f"Wellness streak: {user_data[user_id]['wellness_streak']} days" if user_data[user_id]['wellness_streak'] > 0 else ""
-        
-        await query.edit_message_text(
-            f"💚 *Mitra Module - Your Mental Health Companion*\n\n"
-            f"I'm here to listen, support, and provide culturally sensitive mental health guidance.\n\n"
-            f"{mood_trend}\n{streak_text}\n\n"
-            f"*Remember: Your mental health matters, and seeking support is a sign of strength.*\n\n"
-            f"How can I support you today?",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-        
-    elif query.data == 'mood_checkin':
-        keyboard = [
-            [InlineKeyboardButton("😊 Happy", callback_data='mood_happy'), InlineKeyboardButton("😢 Sad", callback_data='mood_sad')],
-            [InlineKeyboardButton("😰 Anxious", callback_data='mood_anxious'), InlineKeyboardButton("😡 Angry", callback_data='mood_angry')],
-            [InlineKeyboardButton("😌 Peaceful", callback_data='mood_peaceful'), InlineKeyboardButton("😴 Tired", callback_data='mood_tired')],
-            [InlineKeyboardButton("😵‍💫 Overwhelmed", callback_data='mood_overwhelmed'), InlineKeyboardButton("🤗 Grateful", callback_data='mood_grateful')],
-            [InlineKeyboardButton("🔙 Back to Mitra", callback_data='mitra')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            "💭 *How are you feeling right now?*\n\n"
-            "Take a moment to check in with yourself. Your emotions are valid, and I'm here to listen and support you.\n\n"
-            "Choose the emotion that best describes how you're feeling:",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-        
-    elif query.data.startswith('mood_'):
-        mood = query.data.replace('mood_', '').title()
-        intensity_keyboard = [
-            [InlineKeyboardButton("1️⃣ Very Low", callback_data=f'intensity_{mood.lower()}_1')],
-            [InlineKeyboardButton("2️⃣ Low", callback_data=f'intensity_{mood.lower()}_2')],
-            [InlineKeyboardButton("3️⃣ Moderate", callback_data=f'intensity_{mood.lower()}_3')],
-            [InlineKeyboardButton("4️⃣ High", callback_data=f'intensity_{mood.lower()}_4')],
-            [InlineKeyboardButton("5️⃣ Very High", callback_data=f'intensity_{mood.lower()}_5')],
-            [InlineKeyboardButton("🔙 Back", callback_data='mood_checkin')]
-        ]
-        reply_markup = InlineKeyboardMarkup(intensity_keyboard)
-        
-        await query.edit_message_text(
-            f"💭 *You're feeling {mood}*\n\n"
-            f"On a scale of 1-5, how intense is this feeling right now?\n\n"
-            f"1 = Very mild\n5 = Very intense",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-        
-    elif query.data.startswith('intensity_'):
-        parts = query.data.split('_')
-        mood = parts[1].title()
-        intensity = int(parts[2])
-        
-        # Save mood entry
-        mood_entry = {
-            'mood': mood,
-            'intensity': intensity,
-            'date': datetime.now().isoformat(),
-            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M")
-        }
-        user_data[user_id]['mood_history'].append(mood_entry)
-        
-        # Generate personalized response based on mood and intensity
-        response_text, suggested_activities = generate_mood_response(mood, intensity)
-        
-        keyboard = []
-        if suggested_activities:
-            for activity in suggested_activities:
-                keyboard.append([InlineKeyboardButton(f"🧘 {activity}", callback_data=f'activity_{activity.lower().replace(" ", "_")}')])
-        
-        keyboard.extend([
-            [InlineKeyboardButton("📝 Add Note", callback_data=f'add_note_{mood.lower()}_{intensity}')],
-            [InlineKeyboardButton("📊 View Mood History", callback_data='mood_history')],
-            [InlineKeyboardButton("🔙 Back to Mitra", callback_data='mitra')]
-        ])
-        
-        # Check if crisis intervention is needed
-        if (mood.lower() in ['sad', 'angry', 'overwhelmed'] and intensity >= 4) or intensity == 5:
-            keyboard.insert(0, [InlineKeyboardButton("🆘 Get Immediate Support", callback_data='crisis_support')])
-            response_text += "\n\n⚠️ *I notice you're experiencing intense emotions. Please know that support is available.*"
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            f"*Mood logged: {mood} (Intensity: {intensity}/5)*\n\n{response_text}",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-        
-    elif query.data == 'mood_history':
-        history_text = generate_mood_history_text(user_id)
-        keyboard = [
-            [InlineKeyboardButton("📈 Mood Insights", callback_data='mood_insights')],
-            [InlineKeyboardButton("🧘 Wellness Activities", callback_data='wellness_menu')],
-            [InlineKeyboardButton("🔙 Back to Mitra", callback_data='mitra')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            f"📊 *Your Mood History*\n\n{history_text}",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-        
-    elif query.data == 'wellness_menu':
-        keyboard = [
-            [InlineKeyboardButton("🫁 Breathing Exercise", callback_data='activity_breathing')],
-            [InlineKeyboardButton("🌱 Grounding Technique", callback_data='activity_grounding')],
-            [InlineKeyboardButton("🙏 Gratitude Practice", callback_data='activity_gratitude')],
-            [InlineKeyboardButton("🚶 Gentle Movement", callback_data='activity_movement')],
-            [InlineKeyboardButton("🎵 Calming Music", callback_data='activity_music')],
-            [InlineKeyboardButton("📖 Positive Affirmations", callback_data='activity_affirmations')],
-            [InlineKeyboardButton("🔙 Back to Mitra", callback_data='mitra')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            "🧘 *Wellness Activities*\n\n"
-            "Choose an activity to help improve your mental well-being:\n\n"
-            "These evidence-based techniques can help you manage stress, anxiety, and difficult emotions.",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-        
-    elif query.data.startswith('activity_'):
-        activity_key = query.data.replace('activity_', '')
-        activity_text = generate_activity_instructions(activity_key)
-        
-        keyboard = [
-            [InlineKeyboardButton("✅ Completed Activity", callback_data=f'completed_{activity_key}')],
-            [InlineKeyboardButton("🔄 Try Another Activity", callback_data='wellness_menu')],
-            [InlineKeyboardButton("🔙 Back to Mitra", callback_data='mitra')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            activity_text,
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-        
-    elif query.data.startswith('completed_'):
-        activity = query.data.replace('completed_', '').replace('_', ' ').title()
-        user_data[user_id]['wellness_streak'] += 1
-        
-        await query.edit_message_text(
-            f"🎉 *Great job completing the {activity}!*\n\n"
-            f"Wellness streak: {user_data[user_id]['wellness_streak']} activities\n\n"
-            f"How are you feeling after this activity? Regular practice of wellness activities can significantly improve your mental health over time.",
-            parse_mode='Markdown',
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("💭 Check Mood Again", callback_data='mood_checkin')],
-                [InlineKeyboardButton("🧘 More Activities", callback_data='wellness_menu')],
-                [InlineKeyboardButton("🔙 Back to Mitra", callback_data='mitra')]
-            ])
-        )
-        
-    elif query.data == 'crisis_support':
-        user_data[user_id]['crisis_support_shown'] = True
-        crisis_text = generate_crisis_support_text()
-        
-        keyboard = [
-            [InlineKeyboardButton("🫂 Talk to Someone Now", callback_data='talk_now')],
-            [InlineKeyboardButton("🧘 Immediate Coping", callback_data='immediate_coping')],
-            [InlineKeyboardButton("📞 Local Resources", callback_data='local_resources')],
-            [InlineKeyboardButton("🔙 Back to Mitra", callback_data='mitra')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            crisis_text,
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-        
-    elif query.data == 'language_support':
-        keyboard = []
-        for lang_key, lang_info in LANGUAGES.items():
-            keyboard.append([InlineKeyboardButton(
-                f"{lang_info['name']}", 
-                callback_data=f'set_language_{lang_key}'
-            )])
-        keyboard.append([InlineKeyboardButton("🔙 Back to Mitra", callback_data='mitra')])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            "🌍 *Choose Your Preferred Language*\n\n"
-            "I can provide mental health support in multiple regional languages to ensure you feel comfortable and understood.\n\n"
-            "Select your preferred language:",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-        
-    elif query.data.startswith('set_language_'):
-        language = query.data.replace('set_language_', '')
-        user_data[user_id]['language'] = language
-        lang_name = LANGUAGES[language]['name']
-        
-        await query.edit_message_text(
-            f"✅ *Language set to {lang_name}*\n\n"
-            f"I'll now provide culturally appropriate mental health support in your preferred language.\n\n"
-            f"*Remember: Mental health support should always be culturally sensitive and respectful of your background.*",
-            parse_mode='Markdown',
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("🔙 Back to Mitra", callback_data='mitra')]
-            ])
-        )
-
-    # Handle other existing callbacks (sakhi, educare, etc.)
-    elif query.data == 'sakhi':
-        user_data[user_id]['active_module'] = 'sakhi'
-        keyboard = [
-            [InlineKeyboardButton("📅 Track Period", callback_data='track_period')],
-            [InlineKeyboardButton("🔮 Cycle Predictions", callback_data='predictions')],
-            [InlineKeyboardButton("📊 Health Insights", callback_data='insights')],
-            [InlineKeyboardButton("🏠 Main Menu", callback_data='main_menu')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            "🌸 *Sakhi Module - Your Menstrual Health Companion*\n\n"
-            "I'm here to help you track your cycle, predict your periods, and provide personalized health insights.\n\n"
-            "What would you like to do?",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-        
-    elif query.data == 'educare':
-        user_data[user_id]['active_module'] = 'educare'
-        keyboard = [
-            [InlineKeyboardButton("📝 Voice Notes Help", callback_data='voice_help')],
-            [InlineKeyboardButton("🧠 Study Tips", callback_data='study_tips')],
-            [InlineKeyboardButton("📚 Learning Resources", callback_data='resources')],
-            [InlineKeyboardButton("🏠 Main Menu", callback_data='main_menu')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            "📚 *EduCare Module - Your Learning Assistant*\n\n"
-            "I can help you with study techniques, note-taking strategies, and learning optimization.\n\n"
-            "What would you like to explore?",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-        
-    elif query.data == 'main_menu':
-        keyboard = [
-            [InlineKeyboardButton("🌸 Sakhi - Menstrual Health", callback_data='sakhi')],
-            [InlineKeyboardButton("📚 EduCare - Learning Assistant", callback_data='educare')],
-            [InlineKeyboardButton("💚 Mitra - Mental Health Support", callback_data='mitra')],
-            [InlineKeyboardButton("🌍 Language Settings", callback_data='language_settings')],
-            [InlineKeyboardButton("ℹ️ About Ykarb", callback_data='about')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            "🌟 *Welcome back to Ykarb!*\n\nChoose a module or just chat with me:",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
+    histogram, errors = handler_latency(f"button:{route}")
+    started = time.perf_counter()
+    try:
+        profile = await store.get(user_id)
+        await handler(query, user_id, profile, arg)
+    except Exception:
+        errors.inc()
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - started)
 
 # ✅ Helper functions for Mitra module
-def get_mood_trend(user_id: int) -> str:
-    """Generate mood trend analysis"""
-    if user_id not in user_data or not user_data[user_id]['mood_history']:
-        return "📊 Start tracking your mood to see patterns and insights."
+def get_mood_trend(profile: dict, language: str = FALLBACK_LANGUAGE) -> str:
+    """Generate mood trend analysis from the rolling 7-entry aggregate"""
+    mood_log = profile['mood_history']
+    if not mood_log:
+        return t(language, 'trend.none')
     
-    recent_moods = user_data[user_id]['mood_history'][-7:]  # Last 7 entries
-    if len(recent_moods) < 3:
-        return "📊 Keep tracking to see your mood patterns."
+    if mood_log.window_count < 3:
+        return t(language, 'trend.few')
     
-    avg_intensity = sum(entry['intensity'] for entry in recent_moods) / len(recent_moods)
+    avg_intensity = mood_log.window_mean
     
     if avg_intensity >= 4:
-        return "📈 Your recent mood trend shows high intensity emotions. Consider wellness activities."
+        return t(language, 'trend.high')
     elif avg_intensity >= 3:
-        return "📊 Your mood has been moderate recently. You're doing well!"
+        return t(language, 'trend.moderate')
     else:
-        return "📉 Your recent moods show lower intensity. Let's work on some uplifting activities."
-
-def generate_mood_response(mood: str, intensity: int) -> tuple:
-    """Generate personalized response based on mood and intensity"""
-    responses = {
-        'happy': {
-            'low': "😊 I'm glad you're feeling happy! Even small moments of joy are precious.",
-            'high': "🌟 Wonderful! Your happiness is radiating. What's bringing you such joy today?"
-        },
-        'sad': {
-            'low': "😢 It's okay to feel sad sometimes. Your emotions are valid. Would you like to talk about it?",
-            'high': "💙 I can feel your sadness, and I want you to know you're not alone. Let's work through this together."
-        },
-        'anxious': {
-            'low': "😰 A little anxiety is normal. Let's try some calming techniques.",
-            'high': "🫂 Anxiety can be overwhelming. Let's focus on grounding techniques to help you feel safer."
-        },
-        'angry': {
-            'low': "😡 It's natural to feel frustrated sometimes. What's bothering you?",
-            'high': "🔥 I can sense your anger is intense. Let's find healthy ways to process these feelings."
-        },
-        'peaceful': {
-            'low': "😌 A sense of peace is beautiful. Cherish this calm moment.",
-            'high': "🕊️ What a wonderful state of peace! This is your inner strength shining through."
-        },
-        'tired': {
-            'low': "😴 A little tiredness is normal. Make sure you're getting enough rest.",
-            'high': "💤 You sound exhausted. Rest is not selfish - it's necessary for your wellbeing."
-        },
-        'overwhelmed': {
-            'low': "😵‍💫 Feeling a bit overwhelmed? Let's break things down into smaller steps.",
-            'high': "🌊 Overwhelm can feel like drowning. Let's find your life raft with some grounding techniques."
-        },
-        'grateful': {
-            'low': "🙏 Gratitude is a beautiful feeling, even in small doses.",
-            'high': "✨ Your gratitude is powerful! This positive energy will attract more good things."
-        }
-    }
-    
+        return t(language, 'trend.low')
+
+def generate_mood_response(mood: str, intensity: int, language: str = FALLBACK_LANGUAGE) -> tuple:
+    """Generate personalized response based on mood and intensity; activities are WELLNESS_ACTIVITIES keys"""
+    mood = mood.lower()
     intensity_level = 'high' if intensity >= 4 else 'low'
-    response = responses.get(mood.lower(), {}).get(intensity_level, "Thank you for sharing how you feel.")
+    response = t(language, f'mood.response.{mood}.{intensity_level}' if mood in MOODS else 'mood.response.default')
     
     # Suggest activities based on mood
     suggested_activities = []
-    if mood.lower() in ['anxious', 'overwhelmed']:
-        suggested_activities = ['Breathing Exercise', 'Grounding Technique']
-    elif mood.lower() in ['sad', 'angry']:
-        suggested_activities = ['Gentle Movement', 'Gratitude Practice']
-    elif mood.lower() == 'tired':
-        suggested_activities = ['Gentle Movement', 'Positive Affirmations']
+    if mood in ['anxious', 'overwhelmed']:
+        suggested_activities = ['breathing', 'grounding']
+    elif mood in ['sad', 'angry']:
+        suggested_activities = ['movement', 'gratitude']
+    elif mood == 'tired':
+        suggested_activities = ['movement', 'affirmations']
     else:
-        suggested_activities = ['Gratitude Practice', 'Breathing Exercise']
+        suggested_activities = ['gratitude', 'breathing']
     
     return response, suggested_activities
 
-def generate_mood_history_text(user_id: int) -> str:
+def mood_name(mood: str, language: str = FALLBACK_LANGUAGE) -> str:
+    """Localized name of a logged mood; moods outside MOODS keep their logged name"""
+    key = mood.lower()
+    return t(language, f'mood.name.{key}') if key in MOODS else mood
+
+def generate_mood_history_text(profile: dict, language: str = FALLBACK_LANGUAGE) -> str:
     """Generate mood history summary"""
-    if user_id not in user_data or not user_data[user_id]['mood_history']:
-        return "No mood entries yet. Start tracking to see your patterns!"
+    mood_log = profile['mood_history']
+    if not mood_log:
+        return t(language, 'mood.history_empty')
     
-    history = user_data[user_id]['mood_history'][-10:]  # Last 10 entries
     history_text = ""
+    for mood, intensity, timestamp in mood_log.recent(10):  # Last 10 entries
+        date = datetime.fromtimestamp(timestamp).strftime("%m/%d %H:%M")
+        history_text += t(language, 'mood.history_entry', date=date, mood=mood_name(mood, language), intensity=intensity) + "\n"
     
-    for entry in reversed(history):
-        date = datetime.fromisoformat(entry['date']).strftime("%m/%d %H:%M")
-        history_text += f"• {date}: {entry['mood']} ({entry['intensity']}/5)\n"
+    if len(mood_log) >= 3:
+        history_text += "\n" + t(language, 'mood.history_most_frequent', mood=mood_name(mood_log.most_frequent(), language)) + "\n"
     
     return history_text
 
-def generate_activity_instructions(activity_key: str) -> str:
-    """Generate detailed activity instructions"""
-    if activity_key in WELLNESS_ACTIVITIES:
-        activity = WELLNESS_ACTIVITIES[activity_key]
-        instructions = "\n".join(activity['instructions'])
-        return f"{activity['title']}\n\n{activity['description']}\n\n*Instructions:*\n{instructions}\n\nTake your time and be gentle with yourself. 💚"
-    
-    # Additional activities not in the main dict
-    additional_activities = {
-        'music': {
-            'title': '🎵 Calming Music Therapy',
-            'instructions': 'Listen to soft, calming music for 5-10 minutes. Focus on the melody and let it wash over you.'
-        },
-        'affirmations': {
-            'title': '📖 Positive Affirmations',
-            'instructions': 'Repeat these affirmations:\n• I am worthy of love and respect\n• I am stronger than my challenges\n• I choose peace over worry\n• I am enough, just as I am'
-        }
-    }
+# ✅ Helper functions for Sakhi module
+def _format_day(day: date) -> str:
+    return day.strftime("%d %b")
+
+def generate_prediction_text(prediction, today: date, language: str = FALLBACK_LANGUAGE) -> str:
+    """Next period and fertile window, relative to today"""
+    next_start = date.fromordinal(prediction.next_start)
+    days_until = (next_start - today).days
+    if days_until > 1:
+        when = t(language, 'sakhi.when.in_days', days=days_until)
+    elif days_until == 1:
+        when = t(language, 'sakhi.when.tomorrow')
+    elif days_until == 0:
+        when = t(language, 'sakhi.when.today')
+    else:
+        when = t(language, 'sakhi.when.late', days=-days_until)
     
-    if activity_key in additional_activities:
-        activity = additional_activities[activity_key]
-        return f"{activity['title']}\n\n{activity['instructions']}\n\nTake your time and be kind to yourself. 💚"
+    lines = [t(language, 'sakhi.next_period', date=_format_day(next_start), when=when)]
+    if prediction.cycles > 1:
+        margin = max(1, round(prediction.std_length))
+        lines.append(t(language, 'sakhi.likely_between',
+                       start=_format_day(next_start - timedelta(days=margin)),
+                       end=_format_day(next_start + timedelta(days=margin))))
     
-    return "🧘 Take a few deep breaths and focus on the present moment. You're doing great! 💚"
-
-def generate_crisis_support_text() -> str:
-    """Generate crisis support information"""
-    return """
-🆘 *Immediate Crisis Support*
+    lines.append(t(language, 'sakhi.fertile_window',
+                   start=_format_day(date.fromordinal(prediction.fertile_start)),
+                   end=_format_day(date.fromordinal(prediction.fertile_end))))
+    lines.append(t(language, 'sakhi.ovulation', date=_format_day(date.fromordinal(prediction.ovulation))))
+    if prediction.cycles == 0:
+        basis = t(language, 'sakhi.based_on_typical')
+    elif prediction.cycles == 1:
+        basis = t(language, 'sakhi.based_on_one')
+    else:
+        basis = t(language, 'sakhi.based_on_cycles', count=prediction.cycles)
+    return "\n".join(lines) + f"\n\n{basis}"
 
-**You are not alone. Your life has value.**
+def generate_cycle_insights_text(prediction, language: str = FALLBACK_LANGUAGE) -> str:
+    """Cycle length statistics and regularity"""
+    if prediction.cycles == 0:
+        return t(language, 'sakhi.one_period', date=_format_day(date.fromordinal(prediction.last_start)))
+    
+    text = (
+        f"{t(language, 'sakhi.average_cycle', days=f'{prediction.mean_length:.1f}')}\n"
+        f"{t(language, 'sakhi.shortest', days=prediction.shortest)}\n"
+        f"{t(language, 'sakhi.longest', days=prediction.longest)}\n"
+        f"{t(language, 'sakhi.cycles_tracked', count=prediction.cycles)}\n"
+    )
+    if prediction.cycles < 2:
+        return text + "\n" + t(language, 'sakhi.need_more')
+    
+    std = prediction.std_length
+    if std <= 2:
+        regularity = 'very_regular'
+    elif std <= 4:
+        regularity = 'regular'
+    elif std <= 7:
+        regularity = 'somewhat_irregular'
+    else:
+        regularity = 'irregular'
+    text += t(language, 'sakhi.variability', days=f"{std:.1f}", regularity=t(language, f'sakhi.regularity.{regularity}')) + "\n"
+    
+    if std > 7 or prediction.shortest < 21 or prediction.longest > 35:
+        text += "\n" + t(language, 'sakhi.advice_irregular')
+    else:
+        text += "\n" + t(language, 'sakhi.advice_healthy')
+    return text
 
-If you're having thoughts of self-harm or suicide, please reach out immediately:
+def generate_activity_instructions(activity_key: str, language: str = FALLBACK_LANGUAGE) -> str:
+    """Generate detailed activity instructions"""
+    if activity_key not in WELLNESS_ACTIVITIES:
+        return t(language, 'activity.default')
+    
+    return (
+        f"{t(language, f'activity.{activity_key}.title')}\n\n"
+        f"{t(language, f'activity.{activity_key}.description')}\n\n"
+        f"{t(language, 'activity.instructions_heading')}\n"
+        f"{t(language, f'activity.{activity_key}.instructions')}\n\n"
+        f"{t(language, 'activity.footer')}"
+    )
 
-🇺🇸 **US Crisis Lifeline:** 988
-🇬🇧 **UK Samaritans:** 116 123
-🇮🇳 **India AASRA:** 91-9820466726
-🌍 **International:** befrienders.org
+def generate_local_reply(profile: dict, followup: bool = True, language: str = FALLBACK_LANGUAGE) -> str:
+    """Build an immediate reply from local content when Gemini is slow"""
+    recent_mood = profile['mood_history'].last()
+    if recent_mood:
+        mood, intensity, _ = recent_mood
+        response, suggested = generate_mood_response(mood, intensity, language)
+        activity_key = suggested[0]
+    else:
+        response = t(language, 'local.acknowledge')
+        activity_key = 'breathing'
+    
+    text = f"{response}\n\n{t(language, 'local.meanwhile')}\n\n"
+    text += generate_activity_instructions(activity_key, language)
+    if followup:
+        text += f"\n\n{t(language, 'local.followup')}"
+    return text
 
-**Right now, you can:**
-• Call a crisis hotline
-• Go to your nearest emergency room
-• Call emergency services (911, 999, 112)
-• Reach out to a trusted friend or family member
+def generate_crisis_support_text(language: str = FALLBACK_LANGUAGE) -> str:
+    """Generate crisis support information"""
+    return t(language, 'crisis.support')
 
-**Remember:**
-• This feeling is temporary
-• You matter and are loved
-• Professional help is available
-• Recovery is possible
+# ✅ Helper functions for EduCare module
+NOTE_PREVIEW_LENGTH = 300
 
-*Please don't hesitate to seek immediate professional help if you're in crisis.*
+def render_notes_page(notes, query: str, offset: int, language: str = FALLBACK_LANGUAGE) -> tuple:
+    """Return the (text, keyboard) for one page of notes, newest first
+    
+    Sent without parse_mode: note text is whatever the user typed.
     """
+    if query.strip():
+        note_ids, has_more = notes.search(query, offset)
+        title = t(language, 'notes.search_title', query=query.strip())
+        empty = t(language, 'notes.no_results', query=query.strip())
+    else:
+        note_ids, has_more = notes.recent(offset)
+        title = t(language, 'notes.title')
+        empty = t(language, 'notes.empty')
+    
+    lines = []
+    for note_id in note_ids:
+        text, timestamp, tag = notes.get(note_id)
+        if len(text) > NOTE_PREVIEW_LENGTH:
+            text = text[:NOTE_PREVIEW_LENGTH].rstrip() + "…"
+        stamp = datetime.fromtimestamp(timestamp).strftime("%m/%d %H:%M")
+        lines.append(f"• {stamp} [{tag}] {text}" if tag else f"• {stamp} {text}")
+    body = "\n\n".join(lines) if lines else empty
+    
+    page_row = []
+    if offset > 0:
+        page_row.append((t(language, 'notes.button.newer'), f'notes_page_{max(0, offset - NOTES_PAGE_SIZE)}'))
+    if has_more:
+        page_row.append((t(language, 'notes.button.older'), f'notes_page_{offset + NOTES_PAGE_SIZE}'))
+    rows = [page_row] if page_row else []
+    rows.append([(t(language, 'button.main_menu'), 'main_menu')])
+    return f"{title}\n\n{body}\n\n{t(language, 'notes.hint')}", _keyboard(*rows)
+
+async def save_note(message, user_id: int, profile: dict, text: str, tag: str = None):
+    """Add a note to the user's notebook and confirm it"""
+    notes = await store.notes(user_id)
+    notes.add(text, tag or None)
+    profile['pending_note'] = None
+    store.mark_dirty(user_id)
+    await message.reply_text(
+        t(profile_language(profile), 'notes.saved', count=len(notes)),
+        parse_mode='Markdown'
+    )
 
 # ✅ Enhanced message handler with crisis detection
+@timed("handle_message")
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_message = update.message.text
     user_id = update.effective_user.id
     
-    # Initialize user data if not exists
-    if user_id not in user_data:
-        user_data[user_id] = {
-            'active_module': None, 
-            'language': 'english',
-            'cycle_data': {}, 
-            'mood_history': [], 
-            'wellness_streak': 0,
-            'notes': [],
-            'crisis_support_shown': False
-        }
+    # Load (or create) the user's profile
+    profile = await store.get(user_id)
+    user_language = profile_language(profile)
     
-    logger.info(f"User {user_id}: {user_message}")
+    # The message body is only kept as a redactable field, never in the log line itself
+    logger.info("Message received", extra={'user_id': user_id, 'text': user_message, 'sampled': True})
     
     # Crisis detection
-    if bot.detect_crisis_keywords(user_message):
-        crisis_keyboard = [
-            [InlineKeyboardButton("🆘 Get Immediate Help", callback_data='crisis_support')],
-            [InlineKeyboardButton("🫂 Talk to Me", callback_data='mitra')],
-            [InlineKeyboardButton("🧘 Coping Techniques", callback_data='immediate_coping')]
-        ]
-        reply_markup = InlineKeyboardMarkup(crisis_keyboard)
-        
+    CRISIS_CHECKS.inc()
+    crisis_match = crisis_detector.find(user_message)
+    if crisis_match is not None:
+        CRISIS_HITS.labels(crisis_match[1]).inc()
+        await update.message.reply_text(
+            t(user_language, 'crisis.alert'),
+            parse_mode='Markdown',
+            reply_markup=CRISIS_ALERT_KEYBOARD[user_language]
+        )
+        return
+    
+    # A note was requested with the add-note button or a bare /note
+    if profile.get('pending_note') is not None:
+        await save_note(update.message, user_id, profile, user_message, profile['pending_note'])
+        return
+    
+    active_module = profile.get('active_module')
+    module_label = active_module or 'none'
+    
+    # Add helpful buttons based on context
+    reply_markup = None
+    if active_module == 'mitra':
+        reply_markup = MITRA_CHAT_KEYBOARD[user_language]
+    elif not active_module:
+        reply_markup = NO_MODULE_CHAT_KEYBOARD[user_language]
+    
+    # Common Sakhi and EduCare questions are answered from the local FAQ without a Gemini call
+    faq_answer = faq_retriever.answer(user_language, user_message, active_module)
+    if faq_answer is not None:
+        remember_exchange(profile['conversation'], user_message, faq_answer)
+        store.mark_dirty(user_id)
+        REPLY_SOURCES.labels(module_label, 'faq').inc()
         await update.message.reply_text(
-            "🚨 *I'm concerned about you*\n\n"
-            "I noticed you might be going through a really difficult time. Please know that you're not alone and that help is available.\n\n"
-            "**If you're in immediate danger, please contact emergency services or a crisis hotline right away.**\n\n"
-            "I'm here to support you. What would help you most right now?",
+            f"{faq_answer}\n\n{t(user_language, 'faq.footer')}",
             parse_mode='Markdown',
             reply_markup=reply_markup
         )
@@ -684,53 +1356,319 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Build context based on active module and user history
     context_info = ""
-    active_module = user_data[user_id].get('active_module')
-    user_language = user_data[user_id].get('language', 'english')
     
     if active_module:
         context_info += f"Active module: {active_module}. "
         
-    if user_data[user_id]['mood_history']:
-        recent_mood = user_data[user_id]['mood_history'][-1]
-        context_info += f"Recent mood: {recent_mood['mood']} (intensity: {recent_mood['intensity']}/5). "
+    recent_mood = profile['mood_history'].last()
+    if recent_mood:
+        mood, intensity, _ = recent_mood
+        context_info += f"Recent mood: {mood} (intensity: {intensity}/5). "
     
-    if user_data[user_id]['wellness_streak'] > 0:
-        context_info += f"Wellness streak: {user_data[user_id]['wellness_streak']} activities. "
+    if profile['wellness_streak'] > 0:
+        context_info += f"Wellness streak: {profile['wellness_streak']} activities. "
     
-    # Get AI response with context and language preference
-    reply = await bot.get_gemini_response(user_message, context_info, user_language)
+    conversation = profile['conversation']
     
-    # Add typing indicator for more natural feel
-    await update.message.reply_chat_action("typing")
-    await asyncio.sleep(1)  # Brief pause for natural conversation flow
+    # Replies built on personal history are never shared through the cache
+    has_personal_history = (
+        bool(profile['mood_history']) or profile['wellness_streak'] > 0 or has_history(conversation)
+    )
+    use_cache = not has_personal_history
     
-    # Add helpful buttons based on context
-    keyboard = []
-    if active_module == 'mitra':
-        keyboard = [
-            [InlineKeyboardButton("💭 Check Mood", callback_data='mood_checkin')],
-            [InlineKeyboardButton("🧘 Wellness Activity", callback_data='wellness_menu')]
-        ]
-    elif not active_module:
-        keyboard = [
-            [InlineKeyboardButton("💚 Mitra Support", callback_data='mitra')],
-            [InlineKeyboardButton("🌟 Main Menu", callback_data='main_menu')]
-        ]
+    budget = REPLY_BUDGETS.get(active_module, REPLY_BUDGET)
+    started = asyncio.Event()  # Set once the model has started answering
+    # Crisis messages returned above, so the cache key needn't scan the message again
+    gemini_kwargs = dict(use_cache=use_cache, user_id=user_id, conversation=conversation, crisis=False)
+    
+    if GEMINI_STREAMING:
+        # Show a placeholder right away and fill it in as the reply streams
+        placeholder = await update.message.reply_text(STREAM_PLACEHOLDER)
+        progressive = ProgressiveReply(placeholder)
+        fell_back = False
+        
+        async def model_reply() -> str:
+            reply = ""
+            async for reply in bot.stream_gemini_response(user_message, context_info, user_language, **gemini_kwargs):
+                started.set()
+                if not fell_back:
+                    await progressive.update(reply)
+            return reply
+    else:
+        await update.message.reply_chat_action("typing")
+        progressive = None
+        
+        async def model_reply() -> str:
+            return await bot.get_gemini_response(user_message, context_info, user_language, **gemini_kwargs)
+    
+    task = asyncio.create_task(model_reply())
+    if await within_budget(task, started, budget):
+        reply = await task
+        if reply not in GEMINI_ERROR_REPLIES:
+            remember_exchange(conversation, user_message, reply)
+        store.mark_dirty(user_id)
+        REPLY_SOURCES.labels(module_label, 'model').inc()
+        if progressive is not None:
+            await progressive.finish(reply, reply_markup=reply_markup)
+        else:
+            await update.message.reply_text(reply, reply_markup=reply_markup)
+        return
     
-    reply_markup = InlineKeyboardMarkup(keyboard) if keyboard else None
+    # Budget spent with no answer yet: reply from local content right away
+    logger.info(f"Gemini exceeded the {budget:.1f}s budget for module {module_label}, replying locally")
+    REPLY_SOURCES.labels(module_label, 'local').inc()
+    fell_back = True
+    local_text = generate_local_reply(profile, followup=REPLY_FOLLOWUP, language=user_language)
+    if progressive is not None:
+        await progressive.finish(local_text, reply_markup=reply_markup, parse_mode='Markdown')
+    else:
+        message = await update.message.reply_text(local_text, parse_mode='Markdown', reply_markup=reply_markup)
+        progressive = ProgressiveReply(message)
+    
+    # Record the turn while this user's lock is held so later messages land after it
+    model_turn = remember_exchange(conversation, user_message, local_text)
+    store.mark_dirty(user_id)
+    if not REPLY_FOLLOWUP:
+        task.cancel()
+        return
+    
+    async def follow_up():
+        reply = await task
+        if reply in GEMINI_ERROR_REPLIES:
+            # Take back the promise of a fuller reply rather than leave it hanging
+            promise = f"\n\n{t(user_language, 'local.followup')}"
+            local_only = local_text[:-len(promise)] if local_text.endswith(promise) else local_text
+            replace_reply(model_turn, local_only)
+            store.mark_dirty(user_id)
+            await progressive.finish(local_only, reply_markup=reply_markup, parse_mode='Markdown')
+            REPLY_FOLLOWUPS.labels('failed').inc()
+            return
+        replace_reply(model_turn, reply)
+        store.mark_dirty(user_id)
+        await progressive.finish(reply, reply_markup=reply_markup)
+        REPLY_FOLLOWUPS.labels('edited').inc()
     
-    await update.message.reply_text(reply, reply_markup=reply_markup)
+    # Don't hold the user's queue while the slow answer finishes
+    context.application.create_task(follow_up(), update=update)
+
+async def within_budget(task: asyncio.Task, started: asyncio.Event, budget: float) -> bool:
+    """Wait until the model starts answering or finishes; False when the budget runs out first"""
+    waiter = asyncio.ensure_future(started.wait())
+    try:
+        done, _ = await asyncio.wait({task, waiter}, timeout=budget, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        waiter.cancel()
+    return bool(done)
 
 # ✅ Error handler
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    logger.error(f"Update {update} caused error {context.error}")
+    # Log ids only: the update itself carries the user's message
+    update_id = update.update_id if isinstance(update, Update) else None
+    user_id = update.effective_user.id if isinstance(update, Update) and update.effective_user else None
+    logger.error("Update caused an error", exc_info=context.error, extra={'update_id': update_id, 'user_id': user_id})
     if update and update.message:
         await update.message.reply_text(
             "🔧 I encountered an error. Please try again or contact support if the issue persists."
         )
 
+# ✅ Application lifecycle hooks
+async def log_runtime_stats(app):
+    """Periodically log update queue depth and per-user wait times"""
+    while True:
+        await asyncio.sleep(STATS_LOG_INTERVAL)
+        stats = app.update_processor.stats()
+        logger.info(
+            f"Update processing: queue={app.update_queue.qsize()} waiting={stats['waiting']} "
+            f"in_flight={stats['in_flight']}/{stats['max_concurrent']} "
+            f"avg_wait={stats['avg_wait'] * 1000:.1f}ms max_wait={stats['max_wait'] * 1000:.1f}ms "
+            f"p95_user_wait={stats['p95_user_avg_wait'] * 1000:.1f}ms"
+        )
+
+def checked_in_today(profile: dict, utc_offset: int = REMINDER_UTC_OFFSET) -> bool:
+    """True if the user's latest mood entry falls on today's date in their time zone"""
+    last = profile['mood_history'].last()
+    if not last:
+        return False
+    now = time.time()
+    day_start = now - (now + utc_offset * 60) % 86400
+    return last[2] >= day_start
+
+async def send_reminder(app, user_id: int) -> bool:
+    """Send one daily check-in reminder as a low-priority bulk message"""
+    # Only profiles already in memory are checked; loading every user would defeat the schedule
+    profile = store.peek(user_id)
+    if profile is not None and checked_in_today(profile):
+        return False
+    # The profile is rarely in memory here; the schedule keeps the language the reminder was set in
+    language = profile_language(profile or {'language': reminder_schedule.languages.get(user_id)})
+    text = t(language, 'reminder.push')
+    prediction = cycle_forecaster.get(user_id)
+    if prediction is not None:
+        days_until = prediction.next_start - local_today(REMINDER_UTC_OFFSET).toordinal()
+        if days_until == 1:
+            text += "\n\n" + t(language, 'reminder.period_tomorrow')
+        elif 1 < days_until <= 3:
+            text += "\n\n" + t(language, 'reminder.period_soon', days=days_until)
+    try:
+        await app.bot.send_message(
+            user_id, text, parse_mode='Markdown', reply_markup=REMINDER_KEYBOARD[language],
+            rate_limit_args=PRIORITY_BULK
+        )
+    except Forbidden:
+        # The user blocked the bot; stop reminding them
+        reminder_schedule.remove(user_id)
+        profile = await store.get(user_id)
+        profile['reminder'] = None
+        store.mark_dirty(user_id)
+        return False
+    return True
+
+async def on_startup(app):
+    await store.start()
+    await bot.start()
+    runtime.cache, runtime.store, runtime.app, runtime.logs = bot.response_cache, store, app, log_pipeline
+    runtime.faq = faq_retriever
+    if start_metrics_server():
+        app.bot_data['loop_lag_task'] = asyncio.create_task(monitor_loop_lag())
+    if hasattr(signal, 'SIGUSR2'):
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR2, toggle_profiler, app)
+        except (NotImplementedError, RuntimeError, ValueError):
+            pass  # Not in the main thread; /profile still works
+    if REMINDERS_ENABLED:
+        await reminder_schedule.load(store)
+        # Predictions for everyone who gets reminders, in one batch; the rest are computed on demand
+        await cycle_forecaster.refresh_all(store, only=reminder_schedule)
+        scheduler = ReminderScheduler(reminder_schedule, lambda user_id: send_reminder(app, user_id),
+                                      send_rate=app.bot.rate_limiter.bulk_bucket.rate)
+        scheduler.start()
+        app.bot_data['reminder_scheduler'] = scheduler
+    if STATS_LOG_INTERVAL > 0 and isinstance(app.update_processor, PerUserUpdateProcessor):
+        app.bot_data['stats_task'] = asyncio.create_task(log_runtime_stats(app))
+
+async def on_shutdown(app):
+    sampling_profiler.stop()
+    for task_name in ('stats_task', 'loop_lag_task'):
+        task = app.bot_data.pop(task_name, None)
+        if task:
+            task.cancel()
+    scheduler = app.bot_data.pop('reminder_scheduler', None)
+    if scheduler:
+        await scheduler.stop()
+    logger.info(f"Gemini response cache stats: {bot.response_cache.stats()}")
+    await bot.close()
+    await store.close()
+
+# ✅ Application setup shared by every serving mode
+def build_application(mode: str = None):
+    """Build the Telegram application with all handlers registered"""
+    mode = mode or BOT_MODE
+    builder = (
+        ApplicationBuilder()
+        .token(TELEGRAM_TOKEN)
+        .update_queue(asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE))
+        .concurrent_updates(PerUserUpdateProcessor())
+        .rate_limiter(PriorityRateLimiter())
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if TELEGRAM_API_BASE:
+        builder = builder.base_url(f"{TELEGRAM_API_BASE}/bot").base_file_url(f"{TELEGRAM_API_BASE}/file/bot")
+    if mode == 'webhook':
+        # Updates arrive through our own webhook server instead of getUpdates
+        builder = builder.updater(None)
+    app = builder.build()
+    
+    # Add handlers
+    app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("note", note_command))
+    app.add_handler(CommandHandler("notes", notes_command))
+    admins = filters.User(user_id=ADMIN_USER_IDS)
+    app.add_handler(CommandHandler("memreport", memreport_command, filters=admins))
+    app.add_handler(CommandHandler("profile", profile_command, filters=admins))
+    app.add_handler(CallbackQueryHandler(button_handler))
+    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_message))
+    app.add_error_handler(error_handler)
+    return app
+
+async def serve(app, mode: str, stop_event: asyncio.Event = None):
+    """Run the application in polling or webhook mode until a stop signal arrives"""
+    if stop_event is None:
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Not supported on Windows; Ctrl+C still raises KeyboardInterrupt
+    
+    journal = UpdateJournal()
+    if isinstance(app.update_processor, PerUserUpdateProcessor):
+        app.update_processor.journal = journal
+    
+    webhook_server = None
+    async with app:
+        if app.post_init:
+            await app.post_init(app)
+        await app.start()
+        journal.start()
+        
+        # Replay whatever queued up while we were down. getUpdates only works without a
+        # webhook, so this is skipped when an externally managed webhook stays in place.
+        app.bot_data['backlog'] = None
+        if mode == 'polling' or WEBHOOK_URL:
+            await app.bot.delete_webhook(drop_pending_updates=False)
+            app.bot_data['backlog'] = await replay_backlog(app, journal)
+        
+        if mode == 'webhook':
+            async def dispatch(data: dict) -> bool:
+                if journal.is_processed(data['update_id']):
+                    return True  # Redelivery of an update handled before the restart
+                return await enqueue_with_timeout(app.update_queue, Update.de_json(data, app.bot))
+            
+            def health() -> dict:
+                return {
+                    'mode': mode,
+                    'running': app.running,
+                    'queue_depth': app.update_queue.qsize(),
+                    'queue_max': app.update_queue.maxsize,
+                    'processing': app.update_processor.stats(),
+                    'last_processed_update': journal.watermark,
+                    'backlog': app.bot_data['backlog'],
+                }
+            
+            webhook_server = WebhookServer(dispatch, health)
+            await webhook_server.start()
+            if WEBHOOK_URL:
+                await app.bot.set_webhook(
+                    url=f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+                    secret_token=WEBHOOK_SECRET_TOKEN,
+                    allowed_updates=Update.ALL_TYPES
+                )
+                logger.info(f"Webhook set to: {WEBHOOK_URL}{WEBHOOK_PATH}")
+        else:
+            # python-telegram-bot's poller confirms updates once they are queued, not once they
+            # are handled, so a crash here can lose the updates in flight (unlike the backlog above)
+            await app.updater.start_polling()
+        
+        logger.info(f"🤖 Ykarb Bot is running in {mode} mode... Press Ctrl+C to stop.")
+        try:
+            await stop_event.wait()
+        finally:
+            logger.info("🛑 Shutting down...")
+            if webhook_server is not None:
+                await webhook_server.stop()
+            if app.updater and app.updater.running:
+                await app.updater.stop()
+            await app.stop()
+            await journal.close()
+            if app.post_stop:
+                await app.post_stop(app)
+    if app.post_shutdown:
+        await app.post_shutdown(app)
+
 # ✅ Main app setup
-async def main():
+async def main(mode: str = None):
     if not TELEGRAM_TOKEN or TELEGRAM_TOKEN == "YOUR_TELEGRAM_TOKEN_HERE":
         logger.error("❌ TELEGRAM_TOKEN not set!")
         return
@@ -739,29 +1677,31 @@ async def main():
         logger.error("❌ GEMINI_API_KEY not set!")
         return
     
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+    mode = mode or BOT_MODE
+    if mode not in ('polling', 'webhook'):
+        logger.error(f"❌ Unknown BOT_MODE '{mode}' (expected 'polling' or 'webhook')")
+        return
     
-    # Add handlers
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(CallbackQueryHandler(button_handler))
-    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_message))
-    app.add_error_handler(error_handler)
-
-    logger.info("🤖 Ykarb Bot is running... Press Ctrl+C to stop.")
-    await app.run_polling(drop_pending_updates=True)
+    if BOT_WORKERS > 1:
+        # Handlers run in worker processes; this process only receives updates
+        await serve_sharded(mode, BOT_WORKERS)
+        return
+    
+    app = build_application(mode)
+    await serve(app, mode)
 
 # ✅ Cross-platform safe launcher
-def run():
+def run(mode: str = None):
     try:
-        asyncio.run(main())
+        asyncio.run(main(mode))
     except KeyboardInterrupt:
         logger.info("🛑 Bot stopped by user")
     except RuntimeError as e:
         if "already running" in str(e):
             loop = asyncio.get_running_loop()
-            loop.create_task(main())
+            loop.create_task(main(mode))
         else:
             raise
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
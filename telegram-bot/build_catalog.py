@@ -0,0 +1,40 @@
+"""
+Catalog build script for Ykarb Telegram Bot
+Validates locales/*.json and writes one compiled bundle per language to locales/build/
+"""
+
+import argparse
+import logging
+import sys
+
+from i18n import CATALOG_BUILD_DIR, CATALOG_SOURCE_DIR, CatalogError, build_catalog, compile_catalog
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build the localized message catalog")
+    parser.add_argument("--source", default=CATALOG_SOURCE_DIR, help="directory with <language>.json sources")
+    parser.add_argument("--output", default=CATALOG_BUILD_DIR, help="directory for compiled bundles")
+    parser.add_argument("--check", action="store_true", help="validate only, write nothing")
+    args = parser.parse_args()
+
+    try:
+        if args.check:
+            _, report = compile_catalog(args.source)
+        else:
+            report = build_catalog(args.source, args.output)
+    except CatalogError as e:
+        logger.error(str(e))
+        return 1
+
+    for language, coverage in report.items():
+        logger.info(f"{language}: {coverage['translated']}/{coverage['total']} messages translated")
+    if not args.check:
+        logger.info(f"Wrote {len(report)} bundles to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
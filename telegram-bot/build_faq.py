@@ -0,0 +1,41 @@
+"""
+FAQ build script for Ykarb Telegram Bot
+Validates faqs/*.json and writes each language's n-gram matrix and answers to faqs/build/
+"""
+
+import argparse
+import logging
+import sys
+
+from faq import FAQ_BUILD_DIR, FAQ_SOURCE_DIR, FaqError, build_faq, compile_faq, index_sizes
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build the local FAQ index")
+    parser.add_argument("--source", default=FAQ_SOURCE_DIR, help="directory with <language>.json sources")
+    parser.add_argument("--output", default=FAQ_BUILD_DIR, help="directory for the built indexes")
+    parser.add_argument("--check", action="store_true", help="validate only, write nothing")
+    args = parser.parse_args()
+
+    try:
+        if args.check:
+            report = index_sizes(compile_faq(args.source))
+        else:
+            report = build_faq(args.source, args.output)
+    except FaqError as e:
+        logger.error(str(e))
+        return 1
+
+    for language, sizes in report.items():
+        logger.info(f"{language}: {sizes['answers']} answers, {sizes['questions']} questions, "
+                    f"{sizes['features']} n-grams")
+    if not args.check:
+        logger.info(f"Wrote {len(report)} indexes to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Concurrent update processing for Ykarb Telegram Bot
+Handles different users in parallel while keeping each user's updates in order
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+# ✅ Concurrency configuration
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+MAX_PENDING_UPDATES = int(os.getenv("MAX_PENDING_UPDATES", "4096"))
+WAIT_STATS_USERS = int(os.getenv("WAIT_STATS_USERS", "1000"))
+
+
+def update_user_key(update: object):
+    """Return the key used to serialize an update: the user id, else the chat id"""
+    if isinstance(update, Update):
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+    return None
+
+
+class _UserSlot:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Process updates concurrently across users, sequentially per user
+
+    PTB admits up to max_pending updates at once (in flight plus waiting on a
+    per-user lock); at most max_concurrent of them run handlers at the same
+    time. An update only takes a concurrency slot after it holds its user's
+    lock, so a user with a long queue never blocks other users.
+    """
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_UPDATES, max_pending: int = MAX_PENDING_UPDATES):
+        super().__init__(max_concurrent_updates=max(max_pending, max_concurrent))
+        self.max_concurrent = max_concurrent
+        self._slots = {}
+        self._running = asyncio.BoundedSemaphore(max_concurrent)
+        self.waiting = 0
+        self.in_flight = 0
+        self.processed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._user_waits = OrderedDict()
+        self.journal = None  # Optional UpdateJournal notified when updates start and finish
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        key = update_user_key(update)
+        enqueued = time.monotonic()
+        self.waiting += 1
+        started = False
+        journal = self.journal if isinstance(update, Update) else None
+        if journal is not None:
+            journal.begin(update.update_id)
+
+        slot = None
+        if key is not None:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = _UserSlot()
+            slot.users += 1
+        try:
+            if slot is not None:
+                await slot.lock.acquire()
+            try:
+                async with self._running:
+                    self.waiting -= 1
+                    started = True
+                    self._record_wait(key, time.monotonic() - enqueued)
+                    self.in_flight += 1
+                    try:
+                        await coroutine
+                    finally:
+                        self.in_flight -= 1
+                        self.processed += 1
+            finally:
+                if slot is not None:
+                    slot.lock.release()
+        finally:
+            if not started:
+                self.waiting -= 1
+                coroutine.close()
+            if slot is not None:
+                slot.users -= 1
+                if slot.users == 0:
+                    self._slots.pop(key, None)
+            if journal is not None:
+                journal.done(update.update_id)
+
+    def _record_wait(self, key, wait: float):
+        self.total_wait += wait
+        if wait > self.max_wait:
+            self.max_wait = wait
+        if key is None:
+            return
+        count, total, worst = self._user_waits.pop(key, (0, 0.0, 0.0))
+        self._user_waits[key] = (count + 1, total + wait, max(worst, wait))
+        while len(self._user_waits) > WAIT_STATS_USERS:
+            self._user_waits.popitem(last=False)
+
+    def user_wait_stats(self, user_id) -> dict:
+        """Return wait-time statistics for one recently active user"""
+        count, total, worst = self._user_waits.get(user_id, (0, 0.0, 0.0))
+        return {
+            'updates': count,
+            'avg_wait': total / count if count else 0.0,
+            'max_wait': worst,
+        }
+
+    def stats(self) -> dict:
+        """Return queue depth, concurrency and wait-time figures for sizing"""
+        per_user_avg = [total / count for count, total, _ in self._user_waits.values() if count]
+        per_user_avg.sort()
+        return {
+            'max_concurrent': self.max_concurrent,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'active_users': len(self._slots),
+            'processed': self.processed,
+            'avg_wait': self.total_wait / self.processed if self.processed else 0.0,
+            'max_wait': self.max_wait,
+            'p95_user_avg_wait': per_user_avg[int(len(per_user_avg) * 0.95)] if per_user_avg else 0.0,
+        }
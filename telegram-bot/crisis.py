@@ -0,0 +1,168 @@
+"""
+Crisis detection for Ykarb Telegram Bot
+Multilingual keyword lists compiled into one regular expression per script
+"""
+
+import re
+import unicodedata
+
+from textutil import LATIN_FOLDS, WORD_CHARS, collapse_repeats, fold_latin, is_latin
+
+# ✅ Crisis keywords per language. Phrases are matched on whole words after
+# normalization; ambiguous single words ("jump", "cutting") are only listed
+# in self-directed phrases to avoid false positives.
+CRISIS_KEYWORDS = {
+    'english': [
+        'suicide', 'suicidal', 'kill myself', 'killing myself', 'end it all', 'end my life',
+        'want to die', 'wanna die', 'hurt myself', 'harm myself', 'self harm', 'self harming',
+        'cut myself', 'cutting myself', 'overdose', 'jump off', 'hang myself', 'worthless',
+        'hopeless', "can't go on", 'cannot go on', 'cant go on', 'better off dead',
+        'no point living', 'no reason to live', 'take my own life'
+    ],
+    # Romanized Hindi/Hinglish as typed on Latin keyboards
+    'hinglish': [
+        'khudkushi', 'aatmahatya', 'atmahatya', 'marna chahti', 'marna chahta', 'marna hai',
+        'mar jana chahti', 'mar jana chahta', 'mar jaungi', 'mar jaunga', 'jeena nahi chahti',
+        'jeena nahi chahta', 'jeena nahin chahti', 'jeena nahin chahta', 'jine ka man nahi',
+        'zindagi khatam', 'khud ko khatam', 'khud ko nuksan', 'suicide karna', 'suicide kar lungi',
+        'suicide kar lunga'
+    ],
+    'hindi': [
+        'आत्महत्या', 'खुदकुशी', 'ख़ुदकुशी', 'मरना चाहती', 'मरना चाहता', 'मर जाना चाहती',
+        'मर जाना चाहता', 'जीना नहीं चाहती', 'जीना नहीं चाहता', 'जीने का मन नहीं',
+        'खुद को खत्म', 'ज़िंदगी खत्म', 'जिंदगी खत्म'
+    ],
+    'bengali': ['আত্মহত্যা', 'মরে যেতে চাই', 'বাঁচতে চাই না', 'নিজেকে শেষ করে'],
+    'tamil': ['தற்கொலை', 'சாக வேண்டும்', 'சாகணும்', 'வாழ விரும்பவில்லை'],
+    'telugu': ['ఆత్మహత్య', 'చనిపోవాలని', 'చచ్చిపోవాలని', 'బతకాలని లేదు'],
+    'marathi': ['आत्महत्या', 'मरायचं आहे', 'जगायचं नाही', 'जीव द्यायचा'],
+    'gujarati': ['આત્મહત્યા', 'મરી જવું છે', 'જીવવું નથી'],
+    'kannada': ['ಆತ್ಮಹತ್ಯೆ', 'ಸಾಯಬೇಕು', 'ಬದುಕಲು ಇಷ್ಟವಿಲ್ಲ'],
+    'malayalam': ['ആത്മഹത്യ', 'മരിക്കണം', 'ജീവിക്കാൻ ആഗ്രഹമില്ല'],
+    'punjabi': ['ਖੁਦਕੁਸ਼ੀ', 'ਆਤਮ ਹੱਤਿਆ', 'ਮਰਨਾ ਚਾਹੁੰਦੀ', 'ਮਰਨਾ ਚਾਹੁੰਦਾ', 'ਜੀਣਾ ਨਹੀਂ ਚਾਹੁੰਦੀ'],
+}
+
+# Keyword lists typed in Latin script, whose spelling varies ("jeena"/"jina")
+ROMANIZED_LANGUAGES = ('hinglish',)
+
+
+# Latin spelling variants folded by fold_latin, by the letter they fold to
+_FOLD_SOURCES = {}
+for _variant, _replacement in LATIN_FOLDS:
+    _FOLD_SOURCES.setdefault(_replacement, [_replacement]).append(_variant)
+
+# Zero-width characters common in Indic typing; they would split words apart
+_INVISIBLE = re.compile("[\u200b\u200c\u200d\u2060\ufeff]")
+
+
+def canonical(text: str) -> str:
+    """Lowercase text in one pass; only non-ASCII text also needs NFC and invisible characters removed
+
+    Separators, apostrophe styles, repeated letters and romanized spelling
+    variants are left in place and absorbed by the pattern instead.
+    """
+    if text.isascii():
+        return text.lower()
+    if not unicodedata.is_normalized("NFC", text):
+        text = unicodedata.normalize("NFC", text)
+    text = text.casefold()
+    return _INVISIBLE.sub("", text) if _INVISIBLE.search(text) else text
+
+
+def _letter(ch: str, fold: bool) -> list:
+    """(leading character, regex for the rest) for each way one character of a phrase may be typed"""
+    if ch == " ":
+        return [(None, r"[\s_\-]+")]
+    if ch == "'":
+        return [(None, "['`\u2019\u2018\u02bc]")]
+    if not "a" <= ch <= "z":
+        return [(ch, "")]
+    sources = sorted(_FOLD_SOURCES.get(ch, [ch]) if fold else [ch], key=len, reverse=True)
+    repeat = f"(?:{'|'.join(sources)})*" if len(sources) > 1 else f"{ch}*"
+    return [(source[0], re.escape(source[1:]) + repeat) for source in sources]
+
+
+def _phrase_branches(phrase: str, fold: bool) -> list:
+    """(first character, regex for the rest of the phrase) pairs; letters may repeat"""
+    rest = ""
+    for ch in phrase[1:]:
+        if "a" <= ch <= "z":
+            sources = sorted(_FOLD_SOURCES.get(ch, [ch]) if fold else [ch], key=len, reverse=True)
+            rest += f"(?:{'|'.join(sources)})+" if len(sources) > 1 else f"{ch}+"
+        else:
+            rest += _letter(ch, fold)[0][1] or re.escape(ch)
+    end = f"(?![{WORD_CHARS}])" if is_latin(phrase) else ""
+    return [(first, head + rest + end) for first, head in _letter(phrase[0], fold)]
+
+
+def _compile(branches: list):
+    """One alternation grouped by first character, checking the word start right after it
+
+    A literal first character lets the regex engine skip most positions
+    cheaply; a deeper trie of the remaining letters measured slower.
+    """
+    groups = {}
+    for first, rest in branches:
+        groups.setdefault(first, []).append(rest)
+    alternatives = []
+    for first, rests in sorted(groups.items()):
+        char = re.escape(first)
+        rests = "|".join(sorted(set(rests), key=len, reverse=True))
+        alternatives.append(f"{char}(?<![{WORD_CHARS}]{char})(?:{rests})")
+    return re.compile("|".join(alternatives))
+
+
+class CrisisDetector:
+    """Single-pass crisis keyword matcher over all configured languages
+
+    Latin-script phrases must match whole words and tolerate repeated letters
+    ("sooo hopeless"); romanized Hindi phrases also accept the spelling
+    variants folded by fold_latin ("jeena"/"jina"). Indic-script phrases only
+    need a word start, because suffixes attach directly to the stem
+    (e.g. "தற்கொலைக்கு", "आत्महत्याएं"). ASCII messages, the common case, are
+    searched with the Latin phrases alone.
+    """
+
+    def __init__(self, keywords: dict = None):
+        keywords = CRISIS_KEYWORDS if keywords is None else keywords
+        self.languages = {}
+        latin, everything = [], []
+        for language, phrases in keywords.items():
+            fold = language in ROMANIZED_LANGUAGES
+            for phrase in phrases:
+                key = _phrase_key(canonical(phrase), fold)
+                if key in self.languages:
+                    continue
+                self.languages[key] = language
+                branches = _phrase_branches(key, fold)
+                everything.extend(branches)
+                if key.isascii():
+                    latin.extend(branches)
+        self.latin_pattern = _compile(latin)
+        self.pattern = _compile(everything)
+
+    def _search(self, text: str):
+        text = canonical(text)
+        return (self.latin_pattern if text.isascii() else self.pattern).search(text)
+
+    def find(self, text: str):
+        """Return (phrase, language) for the first crisis phrase in text, or None"""
+        match = self._search(text)
+        if match is None:
+            return None
+        phrase = _phrase_key(match.group(0), False)
+        if phrase not in self.languages:
+            phrase = _phrase_key(match.group(0), True)
+        return phrase, self.languages[phrase]
+
+    def detect(self, text: str) -> bool:
+        return self._search(text) is not None
+
+
+def _phrase_key(text: str, fold: bool) -> str:
+    """The form a phrase is listed under: single spaces, repeats collapsed, variants folded if romanized"""
+    text = " ".join(text.replace("-", " ").replace("_", " ").replace("`", "'").split())
+    return collapse_repeats(fold_latin(text) if fold else text)
+
+
+crisis_detector = CrisisDetector()
@@ -0,0 +1,216 @@
+"""
+Cycle predictions for Ykarb Telegram Bot
+Period log plus vectorized next-period, fertile-window and cycle-variability estimates
+"""
+
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import NamedTuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ✅ Prediction configuration
+CYCLE_HISTORY = int(os.getenv("CYCLE_HISTORY", "12"))  # Most recent cycles used for a prediction
+CYCLE_BATCH_SIZE = int(os.getenv("CYCLE_BATCH_SIZE", "10000"))
+DEFAULT_CYCLE_LENGTH = 28
+DEFAULT_PERIOD_LENGTH = 5
+MIN_CYCLE_DAYS = 15  # Shorter gaps are treated as a correction of the previous entry
+MAX_CYCLE_DAYS = 60  # Longer gaps most likely hide a period that wasn't logged
+LUTEAL_DAYS = 14  # Ovulation happens about two weeks before the next period
+FERTILE_DAYS_BEFORE = 5
+FERTILE_DAYS_AFTER = 1
+RECENCY_DECAY = 0.85  # Weight of each older cycle relative to the next newer one
+
+# Oldest cycle first, so row i of a length matrix lines up with these weights
+_WEIGHTS = RECENCY_DECAY ** np.arange(CYCLE_HISTORY - 1, -1, -1, dtype=np.float64)
+
+
+class CyclePrediction(NamedTuple):
+    """Prediction for one user; all dates are proleptic ordinals (date.toordinal)"""
+    last_start: int
+    next_start: int
+    ovulation: int
+    fertile_start: int
+    fertile_end: int
+    mean_length: float
+    std_length: float  # NaN until two cycles are known
+    shortest: int
+    longest: int
+    cycles: int  # Cycle lengths the estimate is based on; 0 means the default was assumed
+
+
+def new_cycle_data() -> dict:
+    """Empty cycle log as stored in a user profile"""
+    return {'starts': []}
+
+
+def local_today(utc_offset: int) -> date:
+    """Today's date for a user `utc_offset` minutes east of UTC"""
+    return (datetime.now(timezone.utc) + timedelta(minutes=utc_offset)).date()
+
+
+def log_period(cycle_data: dict, day: date) -> bool:
+    """Record a period starting on `day`; returns False if nothing changed
+
+    A start within MIN_CYCLE_DAYS of an existing one replaces it, so users
+    can correct the date without ending up with an impossible short cycle.
+    """
+    starts = [date.fromisoformat(s) for s in cycle_data.get('starts', ())]
+    if day in starts:
+        return False
+    starts = [s for s in starts if abs((s - day).days) >= MIN_CYCLE_DAYS]
+    starts.append(day)
+    starts.sort()
+    cycle_data['starts'] = [s.isoformat() for s in starts[-(CYCLE_HISTORY + 1):]]
+    return True
+
+
+def start_ordinals(cycle_data: dict) -> np.ndarray:
+    return np.array([date.fromisoformat(s).toordinal() for s in cycle_data.get('starts', ())], dtype=np.int64)
+
+
+def cycle_lengths(ordinals: np.ndarray) -> np.ndarray:
+    """Plausible cycle lengths between consecutive starts, most recent CYCLE_HISTORY only"""
+    lengths = np.diff(ordinals)
+    lengths = lengths[(lengths >= MIN_CYCLE_DAYS) & (lengths <= MAX_CYCLE_DAYS)]
+    return lengths[-CYCLE_HISTORY:].astype(np.float64)
+
+
+def predict_matrix(lengths: np.ndarray, last_starts: np.ndarray) -> dict:
+    """Predict for many users at once
+
+    `lengths` is an (users, CYCLE_HISTORY) matrix of cycle lengths, right
+    aligned with NaN where a user has fewer cycles; `last_starts` holds each
+    user's latest period start as an ordinal. The next start uses a
+    recency-weighted mean so a shift in the cycle shows up quickly, while the
+    spread is the plain sample standard deviation.
+    """
+    valid = ~np.isnan(lengths)
+    filled = np.where(valid, lengths, 0.0)
+    count = valid.sum(axis=1)
+    has_data = count > 0
+
+    weights = np.where(valid, _WEIGHTS[-lengths.shape[1]:], 0.0)
+    weight_sum = weights.sum(axis=1)
+    mean = np.where(has_data, (weights * filled).sum(axis=1) / np.where(has_data, weight_sum, 1.0),
+                    DEFAULT_CYCLE_LENGTH)
+
+    plain_mean = filled.sum(axis=1) / np.maximum(count, 1)
+    squares = np.where(valid, (filled - plain_mean[:, None]) ** 2, 0.0).sum(axis=1)
+    std = np.where(count > 1, np.sqrt(squares / np.maximum(count - 1, 1)), np.nan)
+
+    shortest = np.where(has_data, np.where(valid, lengths, np.inf).min(axis=1), DEFAULT_CYCLE_LENGTH)
+    longest = np.where(has_data, np.where(valid, lengths, -np.inf).max(axis=1), DEFAULT_CYCLE_LENGTH)
+
+    next_start = last_starts + np.rint(mean).astype(np.int64)
+    ovulation = next_start - LUTEAL_DAYS
+    return {
+        'next_start': next_start,
+        'ovulation': ovulation,
+        'fertile_start': ovulation - FERTILE_DAYS_BEFORE,
+        'fertile_end': ovulation + FERTILE_DAYS_AFTER,
+        'mean_length': mean,
+        'std_length': std,
+        'shortest': shortest.astype(np.int64),
+        'longest': longest.astype(np.int64),
+        'cycles': count,
+    }
+
+
+def _length_matrix(rows: list) -> np.ndarray:
+    matrix = np.full((len(rows), CYCLE_HISTORY), np.nan)
+    for i, lengths in enumerate(rows):
+        if len(lengths):
+            matrix[i, -len(lengths):] = lengths
+    return matrix
+
+
+class CycleForecaster:
+    """Per-user prediction cache, updated incrementally as periods are logged
+
+    Each cached user keeps the array of recent cycle lengths next to the
+    prediction. Logging a new most-recent period just appends one length and
+    re-runs the arithmetic for that row; back-dated corrections rebuild the
+    row from the stored log. predict_many() and refresh_all() fill the cache
+    for many users with a single matrix computation.
+    """
+
+    def __init__(self):
+        self._lengths = {}
+        self._predictions = {}
+
+    def __len__(self):
+        return len(self._predictions)
+
+    def _store(self, user_ids: list, last_starts: np.ndarray, rows: list):
+        result = predict_matrix(_length_matrix(rows), last_starts)
+        # One tolist() per column is far cheaper than indexing numpy scalars per user
+        columns = [last_starts.tolist()] + [result[field].tolist() for field in CyclePrediction._fields[1:]]
+        for user_id, lengths, values in zip(user_ids, rows, zip(*columns)):
+            self._lengths[user_id] = lengths
+            self._predictions[user_id] = CyclePrediction(*values)
+
+    def predict_many(self, items) -> int:
+        """Compute and cache predictions for (user_id, cycle_data) pairs; returns how many"""
+        user_ids, last_starts, rows = [], [], []
+        for user_id, cycle_data in items:
+            ordinals = start_ordinals(cycle_data or {})
+            if not len(ordinals):
+                self.forget(user_id)
+                continue
+            user_ids.append(user_id)
+            last_starts.append(ordinals[-1])
+            rows.append(cycle_lengths(ordinals))
+        if user_ids:
+            self._store(user_ids, np.array(last_starts, dtype=np.int64), rows)
+        return len(user_ids)
+
+    def get(self, user_id: int, cycle_data: dict = None):
+        """Cached prediction, computed from `cycle_data` on a miss; None without any logged period"""
+        prediction = self._predictions.get(user_id)
+        if prediction is None and cycle_data:
+            self.predict_many([(user_id, cycle_data)])
+            prediction = self._predictions.get(user_id)
+        return prediction
+
+    def update(self, user_id: int, cycle_data: dict, day: date):
+        """Refresh a user's prediction after `day` was logged in cycle_data"""
+        previous = self._predictions.get(user_id)
+        new_start = day.toordinal()
+        if previous is None or new_start - previous.last_start < MIN_CYCLE_DAYS:
+            # First entry, back-dated entry or a correction of the latest start
+            self.predict_many([(user_id, cycle_data)])
+            return self._predictions.get(user_id)
+
+        lengths = self._lengths[user_id]
+        gap = new_start - previous.last_start
+        if MIN_CYCLE_DAYS <= gap <= MAX_CYCLE_DAYS:
+            lengths = np.append(lengths, float(gap))[-CYCLE_HISTORY:]
+        self._store([user_id], np.array([new_start], dtype=np.int64), [lengths])
+        return self._predictions[user_id]
+
+    def forget(self, user_id: int):
+        self._lengths.pop(user_id, None)
+        self._predictions.pop(user_id, None)
+
+    async def refresh_all(self, store, only=None, batch_size: int = CYCLE_BATCH_SIZE) -> int:
+        """Recompute predictions for every stored user with a cycle log (or those in `only`)"""
+        started = time.perf_counter()
+        batch = []
+        total = 0
+        async for user_id, cycle_data in store.scan_field('cycle_data'):
+            if not cycle_data or not cycle_data.get('starts'):
+                continue
+            if only is not None and user_id not in only:
+                continue
+            batch.append((user_id, cycle_data))
+            if len(batch) >= batch_size:
+                total += self.predict_many(batch)
+                batch = []
+        total += self.predict_many(batch)
+        logger.info(f"Cycle predictions refreshed for {total} users in {time.perf_counter() - started:.2f}s")
+        return total
@@ -3,34 +3,31 @@ Production deployment script for Ykarb Telegram Bot
 Includes webhook setup and security configurations
 """
 
-import os
 import logging
-from telegram.ext import ApplicationBuilder
-import asyncio
+import secrets
 
-# Production configuration
-WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Your domain + /webhook
-PORT = int(os.getenv("PORT", 8443))
-TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+import webhook
+from bot import run
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def setup_webhook():
-    """Setup webhook for production deployment"""
-    if not WEBHOOK_URL or not TELEGRAM_TOKEN:
+def check_webhook_config() -> bool:
+    """Validate the settings required to serve Telegram webhooks"""
+    from bot import TELEGRAM_TOKEN
+    if not webhook.WEBHOOK_URL or not TELEGRAM_TOKEN:
         logger.error("Missing WEBHOOK_URL or TELEGRAM_TOKEN for production deployment")
-        return
-    
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
-    
-    # Set webhook
-    await app.bot.set_webhook(
-        url=f"{WEBHOOK_URL}/webhook",
-        drop_pending_updates=True
-    )
-    
-    logger.info(f"Webhook set to: {WEBHOOK_URL}/webhook")
+        return False
+    if not webhook.WEBHOOK_SECRET_TOKEN:
+        logger.error(
+            "Missing WEBHOOK_SECRET_TOKEN; generate one with e.g. "
+            f"WEBHOOK_SECRET_TOKEN={secrets.token_urlsafe(32)}"
+        )
+        return False
+    return True
 
 if __name__ == "__main__":
-    asyncio.run(setup_webhook())
\ No newline at end of file
+    # Registers the webhook with Telegram and serves it with the same
+    # handler setup as `python bot.py`
+    if check_webhook_config():
+        run(mode='webhook')
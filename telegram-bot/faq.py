@@ -0,0 +1,284 @@
+"""
+FAQ answers for Ykarb Telegram Bot
+Curated per-language answers matched by character n-gram TF-IDF similarity; the index is built offline and memory-mapped
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from i18n import MAX_MESSAGE_LENGTH
+from textutil import WORD_CHARS, collapse_repeats, fold_latin, is_latin, normalize_text
+
+logger = logging.getLogger(__name__)
+
+# ✅ FAQ configuration
+FAQ_ENABLED = os.getenv("FAQ_ENABLED", "true").lower() in ("1", "true", "yes")
+FAQ_SOURCE_DIR = os.getenv("FAQ_SOURCE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "faqs"))
+FAQ_BUILD_DIR = os.getenv("FAQ_BUILD_DIR", os.path.join(FAQ_SOURCE_DIR, "build"))
+FAQ_THRESHOLD = float(os.getenv("FAQ_THRESHOLD", "0.65"))  # Minimum cosine similarity; see benchmarks/bench_faq.py
+# Active modules whose chat is checked against the FAQ first ("none" = no module selected, off by default)
+FAQ_MODULES = frozenset(filter(None, os.getenv("FAQ_MODULES", "sakhi,educare").split(",")))
+
+NGRAM_SIZES = (3, 4, 5)
+MAX_QUERY_LENGTH = 300  # Longer messages are personal stories, not FAQ lookups
+ENTRY_MODULES = ('sakhi', 'educare')
+INDEX_FORMAT = 1
+
+_WORD = re.compile(f"[{WORD_CHARS}]+")
+
+
+class FaqError(Exception):
+    """Raised when the FAQ sources do not validate"""
+
+
+def char_ngrams(text: str) -> Counter:
+    """Character 3- to 5-grams of each word, padded with spaces so word starts and ends count
+
+    Words are normalized like crisis detection and note search, so
+    romanized spelling variants ("padhai"/"padhaaai") share their n-grams.
+    """
+    grams = Counter()
+    for word in _WORD.findall(normalize_text(text)):
+        if is_latin(word):
+            word = collapse_repeats(fold_latin(word))
+        padded = f" {word} "
+        for size in NGRAM_SIZES:
+            for i in range(len(padded) - size + 1):
+                grams[padded[i:i + size]] += 1
+    return grams
+
+
+def validate_entries(language: str, entries) -> list:
+    """Return a list of problems with one language's FAQ entries"""
+    if not isinstance(entries, list):
+        return [f"{language}: expected a list of entries"]
+    problems, seen = [], set()
+    for number, entry in enumerate(entries):
+        where = f"{language}:{entry.get('id', f'#{number}') if isinstance(entry, dict) else f'#{number}'}"
+        if not isinstance(entry, dict):
+            problems.append(f"{where}: entry must be an object")
+            continue
+        if entry.get('id') in seen:
+            problems.append(f"{where}: duplicate id")
+        seen.add(entry.get('id'))
+        if entry.get('module') not in ENTRY_MODULES:
+            problems.append(f"{where}: module must be one of {', '.join(ENTRY_MODULES)}")
+        questions = entry.get('questions')
+        if not questions or not all(isinstance(q, str) and char_ngrams(q) for q in questions):
+            problems.append(f"{where}: needs a non-empty list of questions with words in them")
+        answer = entry.get('answer')
+        if not isinstance(answer, str) or not answer.strip():
+            problems.append(f"{where}: answer must be a non-empty string")
+            continue
+        # Unbalanced Markdown entities make Telegram reject the whole message
+        for marker in ('*', '_', '`'):
+            if answer.count(marker) % 2:
+                problems.append(f"{where}: unbalanced Markdown '{marker}'")
+        if len(answer) > MAX_MESSAGE_LENGTH - 200:  # Room for the footer
+            problems.append(f"{where}: answer is too long for one message")
+    return problems
+
+
+def build_index(entries: list) -> tuple:
+    """Return (matrix, features, idf, row_answers) for a language's entries
+
+    Each question variant is one column of the float32 matrix, whose rows are
+    n-gram features in sorted order; columns are L2-normalized TF-IDF
+    vectors, so a query's cosine similarity to every question is a single
+    product over the rows of the n-grams it contains.
+    """
+    rows = [(index, char_ngrams(question))
+            for index, entry in enumerate(entries) for question in entry['questions']]
+    df = Counter()
+    for _, grams in rows:
+        df.update(grams.keys())
+    features = sorted(df)
+    column_of = {feature: i for i, feature in enumerate(features)}
+    idf = np.log((1 + len(rows)) / (1 + np.array([df[f] for f in features], dtype=np.float64))) + 1
+
+    matrix = np.zeros((len(features), len(rows)), dtype=np.float32)
+    for row, (_, grams) in enumerate(rows):
+        for gram, count in grams.items():
+            i = column_of[gram]
+            matrix[i, row] = (1 + math.log(count)) * idf[i]
+    matrix /= np.linalg.norm(matrix, axis=0)
+    return matrix, features, idf, [index for index, _ in rows]
+
+
+def _read_sources(source_dir: str) -> dict:
+    sources = {}
+    for name in sorted(os.listdir(source_dir)):
+        if name.endswith('.json'):
+            with open(os.path.join(source_dir, name), encoding="utf-8") as f:
+                sources[name[:-len('.json')]] = json.load(f)
+    return sources
+
+
+def compile_faq(source_dir: str = FAQ_SOURCE_DIR) -> dict:
+    """Validate every language's entries and return {language: (matrix, metadata)}"""
+    sources = _read_sources(source_dir)
+    problems = []
+    for language, entries in sources.items():
+        problems.extend(validate_entries(language, entries))
+    if problems:
+        raise FaqError("FAQ validation failed:\n  " + "\n  ".join(problems))
+
+    source_hash = hashlib.sha256(
+        json.dumps(sources, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    compiled = {}
+    for language, entries in sources.items():
+        matrix, features, idf, row_answers = build_index(entries)
+        compiled[language] = matrix, {
+            'format': INDEX_FORMAT,
+            'language': language,
+            'source_hash': source_hash,
+            'features': features,
+            'idf': idf.tolist(),
+            'row_answers': row_answers,
+            'answers': [{key: entry[key] for key in ('id', 'module', 'answer')} for entry in entries],
+        }
+    return compiled
+
+
+def build_faq(source_dir: str = FAQ_SOURCE_DIR, build_dir: str = FAQ_BUILD_DIR) -> dict:
+    """Compile the FAQ sources and write a matrix and metadata file per language; returns a size report"""
+    compiled = compile_faq(source_dir)
+    os.makedirs(build_dir, exist_ok=True)
+    for language, (matrix, meta) in compiled.items():
+        base = os.path.join(build_dir, language)
+        with open(f"{base}.npy.tmp", "wb") as f:
+            np.save(f, matrix)
+        os.replace(f"{base}.npy.tmp", f"{base}.npy")
+        with open(f"{base}.json.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(f"{base}.json.tmp", f"{base}.json")
+    return index_sizes(compiled)
+
+
+def index_sizes(compiled: dict) -> dict:
+    """{language: answer, question and n-gram counts} for compiled indexes"""
+    return {
+        language: {
+            'answers': len(meta['answers']),
+            'questions': len(meta['row_answers']),
+            'features': len(meta['features']),
+        }
+        for language, (_, meta) in compiled.items()
+    }
+
+
+class FaqIndex:
+    """One language's answers and its (memory-mapped) n-gram matrix"""
+
+    def __init__(self, matrix: np.ndarray, meta: dict):
+        self.matrix = matrix
+        self.answers = meta['answers']
+        self.columns = {feature: i for i, feature in enumerate(meta['features'])}
+        self.idf = np.asarray(meta['idf'], dtype=np.float32)
+        # N-grams never seen in a question get the highest weight, so extra words lower the score
+        self.unknown_idf = math.log(1 + len(meta['row_answers'])) + 1
+        self.row_answers = np.asarray(meta['row_answers'], dtype=np.int32)
+
+    def best(self, text: str) -> tuple:
+        """(answer index, cosine similarity) of the closest question in any module, or (None, 0.0)"""
+        columns, weights, unknown = [], [], 0.0
+        for gram, count in char_ngrams(text).items():
+            tf = 1 + math.log(count)
+            i = self.columns.get(gram)
+            if i is None:
+                unknown += (tf * self.unknown_idf) ** 2
+            else:
+                columns.append(i)
+                weights.append(tf * self.idf[i])
+        if not columns:
+            return None, 0.0
+        weights = np.asarray(weights, dtype=np.float32)
+        norm = math.sqrt(float(weights @ weights) + unknown)
+        scores = weights @ self.matrix[columns] / norm
+        row = int(scores.argmax())
+        return int(self.row_answers[row]), float(scores[row])
+
+
+class FaqRetriever:
+    """Local answers to frequent questions, tried before Gemini"""
+
+    def __init__(self, indexes: dict, threshold: float = FAQ_THRESHOLD, modules=FAQ_MODULES):
+        self.indexes = indexes
+        self.threshold = threshold
+        self.modules = modules
+        self.lookups = 0
+        self.hits = 0
+
+    def answer(self, language: str, text: str, module: str = None):
+        """The curated answer for text if one matches closely enough, else None
+
+        The closest question is searched across every module and only answered
+        when it belongs to the active one; a study question asked in Sakhi goes
+        to Gemini rather than to the nearest period answer.
+        """
+        index = self.indexes.get(language)
+        if index is None or (module or 'none') not in self.modules or len(text) > MAX_QUERY_LENGTH:
+            return None
+        self.lookups += 1
+        answer, score = index.best(text)
+        if answer is None or score < self.threshold:
+            return None
+        if module is not None and index.answers[answer]['module'] != module:
+            return None
+        self.hits += 1
+        logger.debug(f"FAQ hit {index.answers[answer]['id']} ({score:.2f})")
+        return index.answers[answer]['answer']
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def stats(self) -> dict:
+        return {
+            'languages': len(self.indexes),
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'hit_rate': round(self.hit_rate, 4),
+        }
+
+
+def load_faq(source_dir: str = FAQ_SOURCE_DIR, build_dir: str = FAQ_BUILD_DIR) -> FaqRetriever:
+    """Memory-map the built indexes, compiling in memory if they are missing or out of date"""
+    try:
+        indexes, hashes = {}, set()
+        for name in os.listdir(build_dir):
+            if not name.endswith('.json'):
+                continue
+            base = os.path.join(build_dir, name[:-len('.json')])
+            with open(f"{base}.json", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get('format') != INDEX_FORMAT:
+                raise ValueError(f"{base}.json has index format {meta.get('format')}")
+            indexes[meta['language']] = FaqIndex(np.load(f"{base}.npy", mmap_mode='r'), meta)
+            hashes.add(meta['source_hash'])
+        sources = [name for name in os.listdir(source_dir) if name.endswith('.json')]
+        sources_changed = any(
+            os.path.getmtime(os.path.join(source_dir, name)) > os.path.getmtime(os.path.join(build_dir, name))
+            for name in sources
+        )
+        if indexes and len(hashes) == 1 and len(indexes) == len(sources) and not sources_changed:
+            logger.info(f"FAQ indexes loaded: {', '.join(indexes)}")
+            return FaqRetriever(indexes)
+        reason = "out of date"
+    except (OSError, ValueError, KeyError):
+        reason = "missing"
+    logger.warning(f"FAQ index {reason}; compiling from sources (run build_faq.py when deploying)")
+    try:
+        compiled = compile_faq(source_dir)
+    except (OSError, FaqError) as e:
+        logger.error(f"FAQ disabled: {e}")
+        return FaqRetriever({})
+    return FaqRetriever({language: FaqIndex(matrix, meta) for language, (matrix, meta) in compiled.items()})
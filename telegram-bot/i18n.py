@@ -0,0 +1,199 @@
+"""
+Localized content for Ykarb Telegram Bot
+Compiled per-language message bundles with English fallback, plus the offline build and validation step
+"""
+
+import hashlib
+import json
+import logging
+import os
+from string import Formatter
+
+logger = logging.getLogger(__name__)
+
+# ✅ Catalog configuration
+CATALOG_SOURCE_DIR = os.getenv(
+    "CATALOG_SOURCE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "locales")
+)
+CATALOG_BUILD_DIR = os.getenv("CATALOG_BUILD_DIR", os.path.join(CATALOG_SOURCE_DIR, "build"))
+FALLBACK_LANGUAGE = 'english'
+MAX_MESSAGE_LENGTH = 4096  # Telegram's limit for a text message
+
+BUNDLE_FORMAT = 1
+# Keys every language must translate: crisis help is never shown in a language the user didn't pick
+REQUIRED_PREFIXES = ('crisis.',)
+
+
+class CatalogError(Exception):
+    """Raised when the source catalogs do not validate"""
+
+
+def _placeholders(text: str) -> set:
+    return {field for _, field, _, _ in Formatter().parse(text) if field is not None}
+
+
+def validate_messages(language: str, messages: dict, reference: dict) -> list:
+    """Return a list of problems with one language's messages, checked against English"""
+    problems = []
+    for key, text in messages.items():
+        where = f"{language}:{key}"
+        if not isinstance(text, str):
+            problems.append(f"{where}: value must be a string")
+            continue
+        if key not in reference:
+            problems.append(f"{where}: unknown key (not in {FALLBACK_LANGUAGE})")
+            continue
+        try:
+            placeholders = _placeholders(text)
+        except ValueError as e:
+            problems.append(f"{where}: bad format string: {e}")
+            continue
+        if placeholders != _placeholders(reference[key]):
+            problems.append(
+                f"{where}: placeholders {sorted(placeholders)} differ from {sorted(_placeholders(reference[key]))}"
+            )
+        # Unbalanced Markdown entities make Telegram reject the whole message
+        for marker in ('*', '_', '`'):
+            if text.count(marker) % 2:
+                problems.append(f"{where}: unbalanced Markdown '{marker}'")
+        if len(text) > MAX_MESSAGE_LENGTH:
+            problems.append(f"{where}: {len(text)} characters exceeds Telegram's {MAX_MESSAGE_LENGTH}")
+    return problems
+
+
+def _read_sources(source_dir: str) -> dict:
+    sources = {}
+    for name in sorted(os.listdir(source_dir)):
+        if not name.endswith('.json'):
+            continue
+        with open(os.path.join(source_dir, name), encoding="utf-8") as f:
+            sources[name[:-len('.json')]] = json.load(f)
+    if FALLBACK_LANGUAGE not in sources:
+        raise CatalogError(f"{source_dir} has no {FALLBACK_LANGUAGE}.json reference catalog")
+    return sources
+
+
+def compile_catalog(source_dir: str = CATALOG_SOURCE_DIR) -> tuple:
+    """Validate every source catalog and return ({language: bundle}, report)
+
+    Each bundle holds every key: translations where they exist and the
+    English text elsewhere, so a lookup never needs a second dictionary.
+    """
+    sources = _read_sources(source_dir)
+    reference = sources[FALLBACK_LANGUAGE]
+
+    problems = []
+    for language, messages in sources.items():
+        problems.extend(validate_messages(language, messages, reference))
+        problems.extend(
+            f"{language}:{key}: required translation is missing"
+            for key in reference
+            if key.startswith(REQUIRED_PREFIXES) and key not in messages
+        )
+    if problems:
+        raise CatalogError("Catalog validation failed:\n  " + "\n  ".join(problems))
+
+    source_hash = hashlib.sha256(
+        json.dumps(sources, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    bundles, report = {}, {}
+    for language, messages in sources.items():
+        missing = [key for key in reference if key not in messages]
+        bundles[language] = {
+            'format': BUNDLE_FORMAT,
+            'language': language,
+            'source_hash': source_hash,
+            'missing': missing,
+            'messages': {key: messages.get(key, text) for key, text in reference.items()},
+        }
+        report[language] = {
+            'translated': len(reference) - len(missing),
+            'total': len(reference),
+            'missing': missing,
+        }
+    return bundles, report
+
+
+def build_catalog(source_dir: str = CATALOG_SOURCE_DIR, build_dir: str = CATALOG_BUILD_DIR) -> dict:
+    """Compile the source catalogs and write one bundle per language; returns the coverage report"""
+    bundles, report = compile_catalog(source_dir)
+    os.makedirs(build_dir, exist_ok=True)
+    for language, bundle in bundles.items():
+        path = os.path.join(build_dir, f"{language}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(bundle, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    return report
+
+
+class Catalog:
+    """Per-language message lookup with English fallback"""
+
+    def __init__(self, bundles: dict):
+        self.messages = {language: bundle['messages'] for language, bundle in bundles.items()}
+        self.fallback = self.messages.get(FALLBACK_LANGUAGE, {})
+
+    def get(self, language: str, key: str) -> str:
+        messages = self.messages.get(language, self.fallback)
+        text = messages.get(key)
+        if text is None:
+            text = self.fallback.get(key)
+            if text is None:
+                logger.error(f"Missing catalog key: {key}")
+                return key
+        return text
+
+    def format(self, language: str, key: str, /, **values) -> str:
+        text = self.get(language, key)
+        return text.format(**values) if values else text
+
+    def languages(self) -> list:
+        return list(self.messages)
+
+
+def load_catalog(source_dir: str = CATALOG_SOURCE_DIR, build_dir: str = CATALOG_BUILD_DIR) -> Catalog:
+    """Load the compiled bundles, compiling in memory if they are missing or out of date"""
+    try:
+        bundles = {}
+        for name in os.listdir(build_dir):
+            if name.endswith('.json'):
+                with open(os.path.join(build_dir, name), encoding="utf-8") as f:
+                    bundle = json.load(f)
+                bundles[bundle['language']] = bundle
+        hashes = {bundle['source_hash'] for bundle in bundles.values()}
+        sources_changed = any(
+            os.path.getmtime(os.path.join(source_dir, name)) > os.path.getmtime(os.path.join(build_dir, name))
+            for name in os.listdir(source_dir)
+            if name.endswith('.json')
+        )
+        if FALLBACK_LANGUAGE in bundles and len(hashes) == 1 and not sources_changed:
+            return Catalog(bundles)
+        reason = "out of date"
+    except (OSError, ValueError, KeyError):
+        reason = "missing"
+    logger.warning(f"Compiled catalog {reason}; compiling from sources (run build_catalog.py when deploying)")
+    bundles, _ = compile_catalog(source_dir)
+    return Catalog(bundles)
+
+
+_catalog = None
+
+
+def get_catalog() -> Catalog:
+    """The process-wide catalog, loaded on first use"""
+    global _catalog
+    if _catalog is None:
+        _catalog = load_catalog()
+        logger.info(f"Message catalog loaded: {', '.join(_catalog.languages())}")
+    return _catalog
+
+
+def t(language: str, key: str, /, **values) -> str:
+    """Localized message for `key`, formatted with `values`"""
+    return get_catalog().format(language, key, **values)
+
+
+def has_message(key: str) -> bool:
+    """True if the reference catalog defines `key`"""
+    return key in get_catalog().fallback
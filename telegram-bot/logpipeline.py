@@ -0,0 +1,171 @@
+"""
+Log pipeline for Ykarb Telegram Bot
+Queue-based logging: callers only enqueue records, a background thread formats, redacts and writes them
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# ✅ Logging configuration
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" lines, or "text" for reading locally
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_REDACT = os.getenv("LOG_REDACT", "true").lower() in ("1", "true", "yes")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))  # Share of high-volume info events kept
+# httpx logs one INFO line per Bot API and Gemini request
+LOG_SAMPLED_LOGGERS = frozenset(filter(None, os.getenv("LOG_SAMPLED_LOGGERS", "httpx").split(",")))
+
+# `extra` fields that can carry what a user wrote or what was sent back
+REDACTED_FIELDS = frozenset({'text', 'reply', 'prompt'})
+
+# Credentials that travel inside request URLs: the Bot API token in the path, the Gemini key in the query
+_SECRET_PATTERNS = (
+    (re.compile(r'(/bot)\d+:[\w-]+'), r'\1<redacted>'),
+    (re.compile(r'([?&]key=)[^&\s"\'\\]+'), r'\1<redacted>'),
+)
+
+# Attributes every LogRecord has; anything else arrived through `extra`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'sampled'}
+
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    fields = {}
+    for key, value in record.__dict__.items():
+        if key in _RECORD_ATTRS:
+            continue
+        if LOG_REDACT and key in REDACTED_FIELDS and isinstance(value, str):
+            value = f"<redacted {len(value)} chars>"
+        fields[key] = value
+    return fields
+
+
+def redact_secrets(text: str) -> str:
+    """Mask the bot token and API key in any URL that made it into a log line"""
+    for pattern, replacement in _SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, any `extra` fields and the traceback"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return redact_secrets(json.dumps(entry, ensure_ascii=False, default=str))
+
+
+class TextFormatter(logging.Formatter):
+    """The classic one-line format, with `extra` fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)s - %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = " ".join(f"{key}={value}" for key, value in _extra_fields(record).items())
+        if fields:
+            line, newline, rest = text.partition("\n")
+            text = f"{line} {fields}{newline}{rest}"
+        return redact_secrets(text)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only LOG_SAMPLE_RATE of high-volume info events
+
+    Applies to INFO and DEBUG records from LOG_SAMPLED_LOGGERS and to records
+    logged with extra={'sampled': True}; warnings and errors always pass.
+    """
+
+    def __init__(self, rate: float = LOG_SAMPLE_RATE, loggers=LOG_SAMPLED_LOGGERS):
+        super().__init__()
+        self.rate = rate
+        self.loggers = loggers
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        if not (getattr(record, 'sampled', False) or record.name in self.loggers):
+            return True
+        if self.rate >= 1 or random.random() < self.rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves all formatting to the listener thread and never blocks
+
+    The stock prepare() renders the message and traceback in the calling
+    thread, which is the event loop for every handler; here the record is
+    queued as it is. When the queue is full the record is dropped and counted
+    so a burst of logging cannot stall replies.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.enqueued = 0
+        self.dropped = 0
+        self.sampler = SamplingFilter()
+        self.addFilter(self.sampler)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self) -> dict:
+        return {
+            'queued': self.queue.qsize(),
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+            'sampled_out': self.sampler.sampled_out,
+        }
+
+
+_handler = None
+
+
+def setup_logging(stream=None) -> DeferredQueueHandler:
+    """Send every log record through the queue to one background writer; later calls are no-ops"""
+    global _handler
+    if _handler is not None:
+        return _handler
+
+    sink = logging.StreamHandler(stream or sys.stderr)
+    sink.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter())
+    handler = DeferredQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+
+    listener = QueueListener(handler.queue, sink, respect_handler_level=True)
+    listener.start()
+    # Drains whatever is still queued before the process exits
+    atexit.register(listener.stop)
+    _handler = handler
+    return handler
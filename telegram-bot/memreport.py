@@ -0,0 +1,179 @@
+"""
+Memory report for Ykarb Telegram Bot
+On-demand breakdown of what user sessions hold, plus tracemalloc snapshot diffs between reports
+"""
+
+import asyncio
+import gc
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+
+# ✅ Memory report configuration
+MEMREPORT_SAMPLE = int(os.getenv("MEMREPORT_SAMPLE", "500"))  # Profiles measured field by field per report
+MEMREPORT_TOP = int(os.getenv("MEMREPORT_TOP", "8"))
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "1"))
+
+
+def deep_size(obj, seen: set = None) -> int:
+    """Approximate bytes held by obj and everything it references that is not shared with `seen`"""
+    if seen is None:
+        seen = set()
+    stack, total = [obj], 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, (str, bytes, int, float, bool, type(None))):
+            continue
+        if isinstance(item, np.ndarray):
+            # getsizeof already counts the data of arrays that own it
+            if item.base is not None:
+                total += item.nbytes
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        else:
+            for name in getattr(type(item), '__slots__', ()):
+                if hasattr(item, name):
+                    stack.append(getattr(item, name))
+            if hasattr(item, '__dict__'):
+                stack.append(item.__dict__)
+    return total
+
+
+def field_sizes(profiles: list) -> dict:
+    """Total deep size of each profile field across (user_id, profile) pairs, largest first
+
+    Objects shared between profiles (interned strings, small ints) are counted once.
+    """
+    totals, seen = {}, set()
+    for _, profile in profiles:
+        for field, value in profile.items():
+            totals[field] = totals.get(field, 0) + deep_size(value, seen)
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def process_memory() -> tuple:
+    """(current, peak) resident set size in bytes; None where the platform does not say"""
+    current = peak = None
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak *= 1 if sys.platform == "darwin" else 1024  # Linux reports KiB
+    except ImportError:
+        pass
+    return current, peak
+
+
+def format_bytes(size) -> str:
+    if size is None:
+        return "n/a"
+    for unit in ("B", "KB", "MB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+class AllocationTracer:
+    """tracemalloc switched on by the first report, with a diff against the previous snapshot on each later one
+
+    Tracing slows every allocation down, so it stays off until an admin asks
+    for it and can be switched off again with stop().
+    """
+
+    def __init__(self, frames: int = TRACEMALLOC_FRAMES):
+        self.frames = frames
+        self._previous = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def _snapshot(self):
+        gc.collect()
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+
+    def diff(self, limit: int = MEMREPORT_TOP):
+        """Start tracing and return None, or return the top allocation changes since the last call"""
+        if not self.tracing:
+            tracemalloc.start(self.frames)
+            self._previous = self._snapshot()
+            return None
+        snapshot = self._snapshot()
+        previous, self._previous = self._previous, snapshot
+        if previous is None:
+            return None
+        return snapshot.compare_to(previous, 'lineno')[:limit]
+
+    def stop(self):
+        self._previous = None
+        if self.tracing:
+            tracemalloc.stop()
+
+
+def _trace_location(stat) -> str:
+    frame = stat.traceback[0]
+    return f"{os.path.basename(frame.filename)}:{frame.lineno}"
+
+
+async def build_report(store, tracer: AllocationTracer, sample_size: int = MEMREPORT_SAMPLE,
+                       top: int = MEMREPORT_TOP) -> str:
+    """Plain-text memory report for the admin /memreport command"""
+    stats = store.session_stats()
+    current, peak = process_memory()
+    lines = [
+        "🧠 Memory report",
+        "",
+        f"Process RSS: {format_bytes(current)} (peak {format_bytes(peak)})",
+        f"Sessions in memory: {stats['resident']} (limit {stats['limit'] or 'none'}"
+        + (f", evicted after {stats['idle_timeout']:.0f}s idle)" if stats['idle_timeout'] else ")"),
+        f"Serialized session size: {format_bytes(stats['serialized_bytes'])}"
+        + (f" of {format_bytes(stats['memory_budget'])} budget" if stats['memory_budget'] else ""),
+        f"Evicted: {stats['evicted_idle']} idle, {stats['evicted_budget']} over budget; "
+        f"{stats['dirty']} waiting to be written",
+    ]
+
+    # Deep sizes are measured on a sample and scaled up: walking every profile would stall the loop
+    sample = store.sample(sample_size)
+    if sample:
+        scale = stats['resident'] / len(sample)
+        lines += ["", f"Per field, estimated from {len(sample)} profiles:"]
+        for field, size in list(field_sizes(sample).items())[:top]:
+            lines.append(f"  {field}: {format_bytes(size * scale)}")
+
+    largest = store.largest(top)
+    if largest:
+        lines += ["", "Largest sessions (serialized):"]
+        lines += [f"  {user_id}: {format_bytes(size)}" for user_id, size in largest]
+
+    first_snapshot = not tracer.tracing
+    changes = await asyncio.to_thread(tracer.diff, top)
+    lines.append("")
+    if first_snapshot:
+        lines.append("Allocation tracing started; run /memreport again to see what grew.")
+    else:
+        traced, traced_peak = tracemalloc.get_traced_memory()
+        lines.append(f"Traced: {format_bytes(traced)} (peak {format_bytes(traced_peak)}). Changes since last report:")
+        for stat in changes or ():
+            sign = "+" if stat.size_diff >= 0 else "-"
+            lines.append(f"  {_trace_location(stat)}: {sign}{format_bytes(abs(stat.size_diff))} "
+                         f"({stat.count_diff:+d} blocks, {format_bytes(stat.size)} now)")
+        lines.append("Send /memreport stop to switch tracing off.")
+    return "\n".join(lines)
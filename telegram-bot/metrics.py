@@ -0,0 +1,227 @@
+"""
+Prometheus metrics for Ykarb Telegram Bot
+Handler and Gemini latency, crisis hits, cache and queue figures, event-loop lag
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import time
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, start_http_server
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from profiler import register_handler
+
+logger = logging.getLogger(__name__)
+
+# ✅ Metrics configuration (METRICS_PORT=0 disables the endpoint)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+METRICS_ADDR = os.getenv("METRICS_ADDR", "127.0.0.1")
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+
+REGISTRY = CollectorRegistry()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+SIZE_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 65536)
+
+HANDLER_LATENCY = Histogram(
+    'ykarb_handler_seconds', 'Time spent handling an update, by handler',
+    ['handler'], buckets=LATENCY_BUCKETS, registry=REGISTRY
+)
+HANDLER_ERRORS = Counter(
+    'ykarb_handler_errors_total', 'Updates whose handler raised, by handler',
+    ['handler'], registry=REGISTRY
+)
+GEMINI_LATENCY = Histogram(
+    'ykarb_gemini_request_seconds', 'Gemini HTTP request latency, by endpoint',
+    ['endpoint'], buckets=LATENCY_BUCKETS, registry=REGISTRY
+)
+GEMINI_RESPONSES = Counter(
+    'ykarb_gemini_responses_total', 'Gemini responses by endpoint and status code (or error kind)',
+    ['endpoint', 'status'], registry=REGISTRY
+)
+GEMINI_RESPONSE_BYTES = Histogram(
+    'ykarb_gemini_response_bytes', 'Size of successful Gemini replies in UTF-8 bytes',
+    ['endpoint'], buckets=SIZE_BUCKETS, registry=REGISTRY
+)
+PROMPT_TOKENS = Histogram(
+    'ykarb_gemini_prompt_tokens', 'Estimated input tokens per Gemini request',
+    buckets=(100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000), registry=REGISTRY
+)
+REPLY_SOURCES = Counter(
+    'ykarb_replies_total', 'Chat replies by module and source (model, faq, or local fallback after the budget)',
+    ['module', 'source'], registry=REGISTRY
+)
+REPLY_FOLLOWUPS = Counter(
+    'ykarb_reply_followups_total', 'Model answers delivered as an edit after a local fallback, by outcome',
+    ['outcome'], registry=REGISTRY
+)
+CRISIS_CHECKS = Counter(
+    'ykarb_crisis_checks_total', 'Inbound messages checked for crisis phrases', registry=REGISTRY
+)
+CRISIS_HITS = Counter(
+    'ykarb_crisis_hits_total', 'Messages flagged by crisis detection, by matched language',
+    ['language'], registry=REGISTRY
+)
+LOOP_LAG = Histogram(
+    'ykarb_event_loop_lag_seconds', 'How late the event loop woke a periodic timer',
+    buckets=LAG_BUCKETS, registry=REGISTRY
+)
+LOOP_LAG_LAST = Gauge(
+    'ykarb_event_loop_lag_last_seconds', 'Most recent event-loop lag sample', registry=REGISTRY
+)
+
+# Label children are resolved once per label value, keeping observe() a dict hit away
+_handler_children = {}
+
+
+def handler_latency(handler: str):
+    """Return the (latency histogram, error counter) children for a handler label"""
+    children = _handler_children.get(handler)
+    if children is None:
+        children = (HANDLER_LATENCY.labels(handler), HANDLER_ERRORS.labels(handler))
+        _handler_children[handler] = children
+    return children
+
+
+def timed(handler: str):
+    """Decorator recording the latency and failures of an async handler"""
+    def decorator(func):
+        histogram, errors = handler_latency(handler)
+        register_handler(func, handler)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def observe_gemini(endpoint: str, status, seconds: float):
+    """Record one Gemini HTTP attempt; status is the HTTP code or an error kind"""
+    GEMINI_LATENCY.labels(endpoint).observe(seconds)
+    GEMINI_RESPONSES.labels(endpoint, str(status)).inc()
+
+
+def observe_reply_size(endpoint: str, text: str):
+    GEMINI_RESPONSE_BYTES.labels(endpoint).observe(len(text.encode('utf-8')))
+
+
+class RuntimeCollector:
+    """Reads counters that already exist elsewhere at scrape time
+
+    Cache and FAQ hit/miss counts, the number of users held in memory, the
+    update processor's queue figures and the log pipeline's counters are kept
+    by their owners anyway, so they are exported lazily instead of being
+    mirrored on the hot path.
+    """
+
+    def __init__(self):
+        self.cache = None
+        self.faq = None
+        self.store = None
+        self.app = None
+        self.logs = None
+
+    def collect(self):
+        if self.cache is not None:
+            stats = self.cache.stats()
+            requests = CounterMetricFamily(
+                'ykarb_response_cache_requests', 'Gemini response cache lookups by result', labels=['result']
+            )
+            requests.add_metric(['hit'], stats['hits'])
+            requests.add_metric(['miss'], stats['misses'])
+            yield requests
+            yield CounterMetricFamily('ykarb_response_cache_evictions', 'Cache entries evicted for space',
+                                      value=stats['evictions'])
+            yield GaugeMetricFamily('ykarb_response_cache_entries', 'Entries in the response cache',
+                                    value=stats['size'])
+            yield GaugeMetricFamily('ykarb_response_cache_hit_ratio', 'Cache hits over lookups since start',
+                                    value=stats['hit_rate'])
+
+        if self.faq is not None:
+            stats = self.faq.stats()
+            lookups = CounterMetricFamily(
+                'ykarb_faq_lookups', 'Chat messages checked against the local FAQ, by result', labels=['result']
+            )
+            lookups.add_metric(['hit'], stats['hits'])
+            lookups.add_metric(['miss'], stats['lookups'] - stats['hits'])
+            yield lookups
+            yield GaugeMetricFamily('ykarb_faq_hit_ratio', 'FAQ answers over FAQ lookups since start',
+                                    value=stats['hit_rate'])
+
+        if self.store is not None:
+            yield GaugeMetricFamily('ykarb_active_users', 'User profiles held in memory', value=len(self.store))
+            sessions = self.store.session_stats()
+            yield GaugeMetricFamily('ykarb_session_bytes', 'Serialized size of the profiles held in memory',
+                                    value=sessions['serialized_bytes'])
+            evicted = CounterMetricFamily(
+                'ykarb_sessions_evicted', 'User profiles dropped from memory, by reason', labels=['reason']
+            )
+            evicted.add_metric(['idle'], sessions['evicted_idle'])
+            evicted.add_metric(['budget'], sessions['evicted_budget'])
+            yield evicted
+
+        if self.app is not None:
+            yield GaugeMetricFamily('ykarb_update_queue_depth', 'Updates waiting in the application queue',
+                                    value=self.app.update_queue.qsize())
+            # Plain attribute reads: collect() runs on the scrape thread, not the event loop
+            processor = self.app.update_processor
+            if hasattr(processor, 'in_flight'):
+                yield GaugeMetricFamily('ykarb_updates_in_flight', 'Updates being processed',
+                                        value=processor.in_flight)
+                yield GaugeMetricFamily('ykarb_updates_waiting', 'Updates waiting for a per-user slot',
+                                        value=processor.waiting)
+                yield CounterMetricFamily('ykarb_updates_processed', 'Updates processed since start',
+                                          value=processor.processed)
+
+        if self.logs is not None:
+            stats = self.logs.stats()
+            records = CounterMetricFamily(
+                'ykarb_log_records', 'Log records by outcome in the logging queue', labels=['outcome']
+            )
+            records.add_metric(['queued'], stats['enqueued'])
+            records.add_metric(['dropped'], stats['dropped'])
+            records.add_metric(['sampled_out'], stats['sampled_out'])
+            yield records
+            yield GaugeMetricFamily('ykarb_log_queue_depth', 'Log records waiting for the writer thread',
+                                    value=stats['queued'])
+
+runtime = RuntimeCollector()
+REGISTRY.register(runtime)
+
+
+async def monitor_loop_lag(interval: float = LOOP_LAG_INTERVAL):
+    """Sleep for `interval` repeatedly and record how late each wake-up is"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        LOOP_LAG.observe(lag)
+        LOOP_LAG_LAST.set(lag)
+
+
+def start_metrics_server(port: int = None, addr: str = None) -> bool:
+    """Serve /metrics from a background thread; returns False when disabled or the port is taken"""
+    port = METRICS_PORT if port is None else port
+    addr = METRICS_ADDR if addr is None else addr
+    if port <= 0:
+        return False
+    try:
+        start_http_server(port, addr=addr, registry=REGISTRY)
+    except OSError as e:
+        logger.warning(f"Metrics endpoint not started on {addr}:{port}: {e}")
+        return False
+    logger.info(f"Metrics available at http://{addr}:{port}/metrics")
+    return True
@@ -0,0 +1,192 @@
+"""
+Mood insights for Ykarb Telegram Bot
+Vectorized weekday, time-of-day, trend, transition and activity-effect analytics over a user's mood log
+"""
+
+import os
+import time
+
+import numpy as np
+
+from cache import TTLCache
+from i18n import FALLBACK_LANGUAGE, has_message, t
+from mood_log import MOOD_NAMES
+
+# ✅ Insights configuration
+ACTIVITY_LOG_RETENTION = int(os.getenv("ACTIVITY_LOG_RETENTION", "365"))
+INSIGHTS_CACHE_SIZE = int(os.getenv("INSIGHTS_CACHE_SIZE", "10000"))
+ROLLING_WINDOW = 7
+ACTIVITY_EFFECT_WINDOW = 6 * 3600  # Check-ins this close to an activity count as before/after it
+MIN_INSIGHT_ENTRIES = 5
+
+DAY_PARTS = 4  # Night, morning, afternoon, evening; catalog keys day_part.0 to day_part.3
+# Hour of the day -> day part
+_HOUR_PART = np.array([0] * 5 + [1] * 7 + [2] * 5 + [3] * 4 + [0] * 3)
+
+# How pleasant each mood is; wellbeing = valence * intensity, so an intense good mood scores high
+_VALENCE = np.array([{
+    'happy': 1.0, 'peaceful': 1.0, 'grateful': 1.0,
+    'sad': -1.0, 'anxious': -1.0, 'angry': -1.0, 'overwhelmed': -1.0, 'tired': -0.5,
+}.get(name, 0.0) for name in MOOD_NAMES])
+
+
+def log_activity(profile: dict, activity_key: str, timestamp: float = None):
+    """Append a completed wellness activity to the profile's activity log"""
+    log = profile.setdefault('activity_log', [])
+    log.append([activity_key, round(time.time() if timestamp is None else timestamp, 3)])
+    if len(log) > ACTIVITY_LOG_RETENTION:
+        del log[:len(log) - ACTIVITY_LOG_RETENTION]
+
+
+def _group_means(groups: np.ndarray, values: np.ndarray, size: int) -> tuple:
+    counts = np.bincount(groups, minlength=size)
+    sums = np.bincount(groups, weights=values, minlength=size)
+    return counts, np.divide(sums, counts, out=np.full(size, np.nan), where=counts > 0)
+
+
+def compute_insights(mood_log, activity_log: list, utc_offset: int) -> dict:
+    """All insight figures for one user, computed over whole columns at once"""
+    codes, intensities, times = (np.asarray(column) for column in mood_log.columns())
+    codes = codes.astype(np.int64)
+    intensities = intensities.astype(np.float64)
+    wellbeing = _VALENCE[codes] * intensities
+    local = times + utc_offset * 60
+    days = np.floor_divide(local, 86400).astype(np.int64)
+
+    # Epoch day 0 was a Thursday
+    weekday_counts, weekday_wellbeing = _group_means((days + 3) % 7, wellbeing, 7)
+    hours = (np.floor_divide(local, 3600) % 24).astype(np.int64)
+    part_counts, part_wellbeing = _group_means(_HOUR_PART[hours], wellbeing, DAY_PARTS)
+
+    # Rolling mean intensity over the last ROLLING_WINDOW check-ins, from one cumulative sum
+    window = max(1, min(ROLLING_WINDOW, len(intensities)))
+    cumulative = np.concatenate(([0.0], np.cumsum(intensities)))
+    rolling = (cumulative[window:] - cumulative[:-window]) / window
+
+    # Transition counts between consecutive check-ins of different moods
+    size = len(MOOD_NAMES)
+    pairs = codes[:-1] * size + codes[1:]
+    transitions = np.bincount(pairs[codes[:-1] != codes[1:]], minlength=size * size).reshape(size, size)
+
+    # Wellbeing right before and right after each completed activity
+    effects = {}
+    if activity_log and len(times):
+        activity_times = np.array([t for _, t in activity_log], dtype=np.float64)
+        before = np.searchsorted(times, activity_times, side='right') - 1
+        after = before + 1
+        has_pair = (before >= 0) & (after < len(times))
+        before, after = np.clip(before, 0, len(times) - 1), np.clip(after, 0, len(times) - 1)
+        has_pair &= (activity_times - times[before] <= ACTIVITY_EFFECT_WINDOW)
+        has_pair &= (times[after] - activity_times <= ACTIVITY_EFFECT_WINDOW)
+        deltas = wellbeing[after] - wellbeing[before]
+        names = np.array([name for name, _ in activity_log])
+        for name in np.unique(names[has_pair]):
+            selected = deltas[has_pair & (names == name)]
+            effects[str(name)] = (float(selected.mean()), int(selected.size))
+
+    return {
+        'entries': int(len(codes)),
+        'weekday_counts': weekday_counts,
+        'weekday_wellbeing': weekday_wellbeing,
+        'part_counts': part_counts,
+        'part_wellbeing': part_wellbeing,
+        'rolling': rolling,
+        'transitions': transitions,
+        'activity_effects': effects,
+    }
+
+
+def _describe_change(delta: float, language: str) -> str:
+    if delta >= 0.5:
+        return t(language, 'insights.change.improved')
+    if delta <= -0.5:
+        return t(language, 'insights.change.dipped')
+    return t(language, 'insights.change.same')
+
+
+def _label(language: str, key: str, name: str) -> str:
+    """Catalog text for key, or the logged name for moods and activities the catalog doesn't know"""
+    return t(language, key) if has_message(key) else name.replace('_', ' ').title()
+
+
+def render_insights(insights: dict, language: str = FALLBACK_LANGUAGE) -> str:
+    """Markdown text for the insights screen"""
+    if insights['entries'] < MIN_INSIGHT_ENTRIES:
+        return t(language, 'insights.too_few', count=insights['entries'], minimum=MIN_INSIGHT_ENTRIES)
+
+    text = ""
+    wellbeing = insights['weekday_wellbeing']
+    if np.count_nonzero(insights['weekday_counts']) >= 2:
+        text += (
+            f"{t(language, 'insights.best_day', day=t(language, f'weekday.{int(np.nanargmax(wellbeing))}'))}\n"
+            f"{t(language, 'insights.toughest_day', day=t(language, f'weekday.{int(np.nanargmin(wellbeing))}'))}\n"
+        )
+    parts = insights['part_wellbeing']
+    if np.count_nonzero(insights['part_counts']) >= 2:
+        text += t(language, 'insights.best_time', part=t(language, f'day_part.{int(np.nanargmax(parts))}')) + "\n"
+
+    rolling = insights['rolling']
+    text += "\n" + t(language, 'insights.average', count=min(ROLLING_WINDOW, insights['entries']),
+                     average=f"{rolling[-1]:.1f}") + "\n"
+    if len(rolling) > ROLLING_WINDOW:
+        change = rolling[-1] - rolling[-1 - ROLLING_WINDOW]
+        if abs(change) >= 0.3:
+            key = 'insights.higher' if change > 0 else 'insights.lower'
+            text += t(language, key, change=f"{abs(change):.1f}", count=ROLLING_WINDOW) + "\n"
+
+    transitions = insights['transitions']
+    if transitions.any():
+        text += "\n" + t(language, 'insights.shifts_title') + "\n"
+        flat = transitions.ravel()
+        for index in np.argsort(flat, kind='stable')[::-1][:3]:
+            if not flat[index]:
+                break
+            source, target = (MOOD_NAMES[code] for code in divmod(int(index), transitions.shape[1]))
+            text += t(language, 'insights.shift', count=flat[index],
+                      source=_label(language, f'mood.name.{source}', source),
+                      target=_label(language, f'mood.name.{target}', target)) + "\n"
+
+    effects = insights['activity_effects']
+    if effects:
+        text += "\n" + t(language, 'insights.effects_title') + "\n"
+        for name, (delta, count) in sorted(effects.items(), key=lambda item: -item[1][0])[:4]:
+            text += t(language, 'insights.effect', activity=_label(language, f'activity.{name}.name', name),
+                      change=_describe_change(delta, language), delta=f"{delta:+.1f}", count=count) + "\n"
+
+    return text
+
+
+class MoodInsightsCache:
+    """Rendered insights per user, keyed by the state of their logs
+
+    The key combines the mood log's version counter with the size and newest
+    timestamp of the activity log and the language it was rendered in, so any
+    new check-in or completed activity makes the cached entry stale without
+    the handlers having to remember to invalidate it. Repeat views are a dict
+    lookup.
+    """
+
+    def __init__(self, max_size: int = INSIGHTS_CACHE_SIZE):
+        self._cache = TTLCache(max_size=max_size, ttl=float('inf'))
+
+    @staticmethod
+    def _state(profile: dict) -> tuple:
+        activities = profile.get('activity_log') or ()
+        return profile['mood_history'].version, len(activities), activities[-1][1] if activities else 0
+
+    def get(self, user_id: int, profile: dict, utc_offset: int, language: str = FALLBACK_LANGUAGE) -> str:
+        state = (*self._state(profile), language)
+        cached = self._cache.get(user_id)
+        if cached is not None and cached[0] == state:
+            return cached[1]
+        text = render_insights(
+            compute_insights(profile['mood_history'], profile.get('activity_log'), utc_offset), language
+        )
+        self._cache.set(user_id, (state, text))
+        return text
+
+    def forget(self, user_id: int):
+        self._cache.discard(user_id)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
@@ -0,0 +1,153 @@
+"""
+Mood log for Ykarb Telegram Bot
+Bounded, array-backed ring buffer of mood check-ins with incremental aggregates
+"""
+
+import os
+import time
+from array import array
+from datetime import datetime
+
+MOOD_HISTORY_RETENTION = int(os.getenv("MOOD_HISTORY_RETENTION", "365"))
+MOOD_TREND_WINDOW = 7
+
+# Code 0 is reserved for moods we don't recognise
+MOOD_NAMES = ('other', 'happy', 'sad', 'anxious', 'angry', 'peaceful', 'tired', 'overwhelmed', 'grateful')
+MOOD_CODES = {name: code for code, name in enumerate(MOOD_NAMES)}
+
+
+class MoodLog:
+    """Per-user mood history holding the last `capacity` check-ins
+
+    Entries are stored column-wise (mood code, intensity, epoch seconds) in
+    arrays that grow with each check-in until they hold `capacity` entries
+    and are then overwritten in place, so users who rarely check in stay
+    small. The mean intensity over the last MOOD_TREND_WINDOW entries and the
+    per-mood counts over the retained entries are updated on every append,
+    so reading them never walks the history.
+    """
+
+    __slots__ = ('capacity', 'window', 'moods', 'intensities', 'times', 'size', 'head',
+                 'window_sum', 'counts', 'version')
+
+    def __init__(self, capacity: int = MOOD_HISTORY_RETENTION, window: int = MOOD_TREND_WINDOW):
+        self.capacity = max(capacity, window)
+        self.window = window
+        self.moods = array('B')
+        self.intensities = array('B')
+        self.times = array('d')
+        self.size = 0
+        self.head = 0  # Slot the next entry is written to
+        self.window_sum = 0
+        self.counts = [0] * len(MOOD_NAMES)
+        self.version = 0  # Bumped on every append so caches can detect changes
+
+    def _slot(self, age: int) -> int:
+        """Array index of the entry `age` steps back from the newest (0 = newest)"""
+        return (self.head - 1 - age) % self.capacity
+
+    def append(self, mood: str, intensity: int, timestamp: float = None):
+        code = MOOD_CODES.get(mood.lower(), 0)
+        intensity = max(1, min(5, int(intensity)))
+        timestamp = time.time() if timestamp is None else timestamp
+
+        # Entry leaving the trend window
+        if self.size >= self.window:
+            self.window_sum -= self.intensities[self._slot(self.window - 1)]
+        # Entry leaving the ring buffer
+        if self.size == self.capacity:
+            self.counts[self.moods[self.head]] -= 1
+        else:
+            self.size += 1
+
+        if len(self.moods) < self.capacity:
+            # Still filling up: the next slot is always the end of the arrays
+            self.moods.append(code)
+            self.intensities.append(intensity)
+            self.times.append(timestamp)
+        else:
+            self.moods[self.head] = code
+            self.intensities[self.head] = intensity
+            self.times[self.head] = timestamp
+        self.head = (self.head + 1) % self.capacity
+        self.window_sum += intensity
+        self.counts[code] += 1
+        self.version += 1
+
+    def __len__(self):
+        return self.size
+
+    def __bool__(self):
+        return self.size > 0
+
+    def entry(self, age: int = 0) -> tuple:
+        """Return (mood, intensity, timestamp) for the entry `age` steps back from the newest"""
+        if not 0 <= age < self.size:
+            raise IndexError("mood log index out of range")
+        slot = self._slot(age)
+        return MOOD_NAMES[self.moods[slot]].title(), self.intensities[slot], self.times[slot]
+
+    def last(self):
+        """Return the newest entry, or None if the log is empty"""
+        return self.entry(0) if self.size else None
+
+    def recent(self, count: int) -> list:
+        """Return up to `count` entries, newest first"""
+        return [self.entry(age) for age in range(min(count, self.size))]
+
+    @property
+    def window_count(self) -> int:
+        return min(self.size, self.window)
+
+    @property
+    def window_mean(self) -> float:
+        """Mean intensity over the last MOOD_TREND_WINDOW entries"""
+        count = self.window_count
+        return self.window_sum / count if count else 0.0
+
+    def mood_counts(self) -> dict:
+        """Number of retained entries per mood name"""
+        return {MOOD_NAMES[code].title(): n for code, n in enumerate(self.counts) if n}
+
+    def most_frequent(self):
+        if not self.size:
+            return None
+        code = max(range(len(self.counts)), key=self.counts.__getitem__)
+        return MOOD_NAMES[code].title()
+
+    def columns(self) -> tuple:
+        """Return (mood codes, intensities, timestamps) as arrays, oldest first"""
+        if self.size < self.capacity:
+            return self.moods[:self.size], self.intensities[:self.size], self.times[:self.size]
+        h = self.head
+        return (self.moods[h:] + self.moods[:h],
+                self.intensities[h:] + self.intensities[:h],
+                self.times[h:] + self.times[:h])
+
+    def to_dict(self) -> dict:
+        moods, intensities, times = self.columns()
+        return {
+            'moods': moods.tolist(),
+            'intensities': intensities.tolist(),
+            'times': [round(t, 3) for t in times],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, capacity: int = MOOD_HISTORY_RETENTION):
+        log = cls(capacity)
+        for code, intensity, timestamp in zip(data['moods'], data['intensities'], data['times']):
+            mood = MOOD_NAMES[code] if code < len(MOOD_NAMES) else 'other'
+            log.append(mood, intensity, timestamp)
+        return log
+
+    @classmethod
+    def from_entries(cls, entries: list, capacity: int = MOOD_HISTORY_RETENTION):
+        """Build a log from the legacy list of {'mood', 'intensity', 'date'} dicts"""
+        log = cls(capacity)
+        for entry in entries:
+            try:
+                timestamp = datetime.fromisoformat(entry['date']).timestamp()
+            except (KeyError, ValueError):
+                timestamp = time.time()
+            log.append(entry['mood'], entry['intensity'], timestamp)
+        return log
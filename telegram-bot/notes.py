@@ -0,0 +1,221 @@
+"""
+Notes for Ykarb Telegram Bot
+Per-user note store with an incrementally maintained inverted index for keyword and prefix search
+"""
+
+import bisect
+import heapq
+import os
+import re
+import time
+
+from textutil import WORD_CHARS, collapse_repeats, fold_latin, is_latin, normalize_text
+
+# ✅ Notes configuration
+NOTES_RETENTION = int(os.getenv("NOTES_RETENTION", "10000"))  # Oldest notes are dropped beyond this
+NOTE_MAX_LENGTH = int(os.getenv("NOTE_MAX_LENGTH", "2000"))
+NOTES_PAGE_SIZE = int(os.getenv("NOTES_PAGE_SIZE", "10"))
+
+_WORD = re.compile(f"[{WORD_CHARS}]+")
+
+
+def tokenize(text: str) -> list:
+    """Search tokens in order of appearance
+
+    Uses the same normalization as crisis detection: NFC, casefolding and
+    Indic combining marks kept inside words. Romanized words are also folded
+    ("jeena"/"jina", "padhaaai"/"padhai") so either spelling finds the note.
+    """
+    tokens = []
+    for word in _WORD.findall(normalize_text(text)):
+        if is_latin(word):
+            word = collapse_repeats(fold_latin(word))
+        tokens.append(word)
+    return tokens
+
+
+class NoteBook:
+    """A user's notes plus an inverted index over them
+
+    Notes are append-only and get increasing ids. The index maps each token
+    to the ascending list of note ids containing it, and a sorted vocabulary
+    answers prefix queries with two bisects. Adding a note only touches the
+    postings of its own tokens, and searches walk the shortest posting list
+    newest-first, stopping as soon as a page is full, so their cost depends
+    on how many notes match rather than on how many notes exist.
+
+    Notes are stored apart from the profile, one row each. The notebook
+    remembers which notes were added, and whether old ones were dropped,
+    since its last save, so a flush writes only those.
+    """
+
+    __slots__ = ('capacity', 'texts', 'times', 'tags', 'tokens', 'base', 'postings', 'vocab',
+                 'unsaved', 'saved_base')
+
+    def __init__(self, capacity: int = NOTES_RETENTION):
+        self.capacity = capacity
+        self.texts = []
+        self.times = []
+        self.tags = []
+        self.tokens = []  # Sorted unique tokens of each note, for checking further terms
+        self.base = 0  # Id of texts[0]; grows as old notes are dropped
+        self.postings = {}
+        self.vocab = []
+        self.unsaved = []  # Ids of notes added since the last save
+        self.saved_base = 0  # Stored notes below this id have been deleted
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __bool__(self):
+        return bool(self.texts)
+
+    def add(self, text: str, tag: str = None, timestamp: float = None) -> int:
+        """Store a note and index it; returns its id"""
+        text = text.strip()[:NOTE_MAX_LENGTH]
+        note_id = self.base + len(self.texts)
+        tokens = sorted(set(tokenize(f"{text} {tag or ''}")))
+        for token in tokens:
+            ids = self.postings.get(token)
+            if ids is None:
+                self.postings[token] = [note_id]
+                bisect.insort(self.vocab, token)
+            else:
+                ids.append(note_id)
+        self.texts.append(text)
+        self.times.append(round(time.time() if timestamp is None else timestamp, 3))
+        self.tags.append(tag)
+        self.tokens.append(tuple(tokens))
+        self.unsaved.append(note_id)
+        if len(self.texts) > self.capacity:
+            self._drop_oldest()
+        return note_id
+
+    def _drop_oldest(self):
+        for token in self.tokens[0]:
+            ids = self.postings[token]
+            del ids[0]  # The oldest note is always first in its postings
+            if not ids:
+                del self.postings[token]
+                del self.vocab[bisect.bisect_left(self.vocab, token)]
+        del self.texts[0], self.times[0], self.tags[0], self.tokens[0]
+        self.base += 1
+
+    def get(self, note_id: int) -> tuple:
+        """(text, timestamp, tag) of a note"""
+        i = note_id - self.base
+        return self.texts[i], self.times[i], self.tags[i]
+
+    def recent(self, offset: int = 0, limit: int = NOTES_PAGE_SIZE) -> tuple:
+        """One page of note ids, newest first, and whether older notes remain"""
+        end = self.base + len(self.texts) - offset
+        start = max(self.base, end - limit)
+        return list(range(end - 1, start - 1, -1)), start > self.base
+
+    def _vocab_range(self, prefix: str) -> list:
+        lo = bisect.bisect_left(self.vocab, prefix)
+        hi = bisect.bisect_left(self.vocab, prefix + "\U0010ffff")
+        return self.vocab[lo:hi]
+
+    def _newest_first(self, term: str, prefix: bool):
+        if not prefix:
+            return reversed(self.postings.get(term, ()))
+        lists = [reversed(self.postings[token]) for token in self._vocab_range(term)]
+        if len(lists) == 1:
+            return lists[0]
+        return _dedupe(heapq.merge(*lists, reverse=True))
+
+    def _matches(self, note_id: int, term: str, prefix: bool) -> bool:
+        tokens = self.tokens[note_id - self.base]
+        i = bisect.bisect_left(tokens, term)
+        if i == len(tokens):
+            return False
+        return tokens[i].startswith(term) if prefix else tokens[i] == term
+
+    def search(self, query: str, offset: int = 0, limit: int = NOTES_PAGE_SIZE) -> tuple:
+        """Note ids containing every query word, newest first, and whether more matches remain
+
+        The last word is matched as a prefix unless the query ends with a
+        space, so partial words find notes while the user is still typing.
+        """
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words:
+            return self.recent(offset, limit)
+        last_is_prefix = not query[-1:].isspace()
+        terms = [(word, last_is_prefix and i == len(words) - 1) for i, word in enumerate(words)]
+
+        sizes = []
+        for term, prefix in terms:
+            if prefix:
+                size = sum(len(self.postings[token]) for token in self._vocab_range(term))
+            else:
+                size = len(self.postings.get(term, ()))
+            if not size:
+                return [], False
+            sizes.append(size)
+
+        # Drive the walk from the rarest term and check the others per candidate
+        driver = min(range(len(terms)), key=sizes.__getitem__)
+        others = [terms[i] for i in range(len(terms)) if i != driver]
+        page, skipped = [], 0
+        for note_id in self._newest_first(*terms[driver]):
+            if all(self._matches(note_id, term, prefix) for term, prefix in others):
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                if len(page) == limit:
+                    return page, True
+                page.append(note_id)
+        return page, False
+
+    def unsaved_changes(self) -> tuple:
+        """(note_id, text, timestamp, tag) rows added since the last save, and the id below
+        which stored notes should be deleted (None when none were dropped)"""
+        rows = [(note_id, *self.get(note_id)) for note_id in self.unsaved if note_id >= self.base]
+        return rows, (self.base if self.base > self.saved_base else None)
+
+    def mark_saved(self, rows: list, prune_below):
+        """Record that changes returned by unsaved_changes() have been written"""
+        saved = {row[0] for row in rows}
+        self.unsaved = [note_id for note_id in self.unsaved if note_id not in saved and note_id >= self.base]
+        if prune_below is not None:
+            self.saved_base = max(self.saved_base, prune_below)
+
+    @classmethod
+    def from_rows(cls, rows: list, capacity: int = NOTES_RETENTION):
+        """Rebuild a notebook from its stored (note_id, text, timestamp, tag) rows, oldest first"""
+        book = cls(capacity)
+        if rows:
+            book.base = book.saved_base = rows[0][0]
+        for _, text, timestamp, tag in rows:
+            book.add(text, tag, timestamp)
+        book.unsaved = []
+        return book
+
+    @classmethod
+    def from_dict(cls, data: dict, capacity: int = NOTES_RETENTION):
+        """Build a notebook from the {'base', 'notes'} form once stored inside the profile"""
+        book = cls(capacity)
+        book.base = data.get('base', 0)  # Keeps note ids stable across restarts
+        for text, timestamp, tag in data.get('notes', ()):
+            book.add(text, tag, timestamp)
+        return book
+
+    @classmethod
+    def from_list(cls, notes: list, capacity: int = NOTES_RETENTION):
+        """Build a notebook from the legacy list of note strings or {'text', 'date'} dicts"""
+        book = cls(capacity)
+        for note in notes:
+            if isinstance(note, dict):
+                book.add(note.get('text', ''), note.get('tag'), note.get('timestamp'))
+            else:
+                book.add(str(note))
+        return book
+
+
+def _dedupe(ids):
+    previous = None
+    for note_id in ids:
+        if note_id != previous:
+            yield note_id
+            previous = note_id
@@ -0,0 +1,197 @@
+"""
+Update offset journal for Ykarb Telegram Bot
+Durably records the last fully processed update id so restarts replay instead of dropping the backlog
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# ✅ Journal configuration
+UPDATE_JOURNAL_PATH = os.getenv("UPDATE_JOURNAL_PATH", "ykarb_offset.json")
+UPDATE_JOURNAL_INTERVAL = float(os.getenv("UPDATE_JOURNAL_INTERVAL", "1"))
+# Only ids this close below the watermark count as redeliveries; Telegram restarts update ids
+# from a random value after about a week without updates
+UPDATE_REPLAY_WINDOW = int(os.getenv("UPDATE_REPLAY_WINDOW", "100000"))
+
+
+class UpdateJournal:
+    """Tracks the processed-update watermark and persists it to a small file
+
+    Updates finish out of order when several users are served at once, so the
+    journal keeps the ids that have started but not finished. The watermark is
+    the highest id below which every started update has finished; it is
+    written atomically (temp file + rename) at most every `interval` seconds
+    and once more on close.
+    """
+
+    def __init__(self, path: str = UPDATE_JOURNAL_PATH, interval: float = UPDATE_JOURNAL_INTERVAL,
+                 window: int = UPDATE_REPLAY_WINDOW):
+        self.path = path
+        self.interval = interval
+        self.window = window
+        self.in_flight = set()
+        self.highest_started = 0
+        self.restored = 0  # Watermark read at startup; ids at or below it were handled before
+        self._saved = 0
+        self._task = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.restored = int(json.load(f)['last_update_id'])
+        except FileNotFoundError:
+            return
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"Ignoring unreadable update journal {self.path}: {e}")
+            return
+        self.highest_started = self._saved = self.restored
+        logger.info(f"Update journal: last processed update {self.restored}")
+
+    def is_processed(self, update_id: int) -> bool:
+        """True for updates that were fully handled before this process started
+
+        Only ids within `window` below the restored watermark count. An id
+        further down means Telegram restarted its update ids, so the journal
+        starts over instead of skipping every new update.
+        """
+        if update_id > self.restored:
+            return False
+        if update_id > self.restored - self.window:
+            return True
+        logger.warning(f"Update {update_id} is far below the journal watermark {self.restored}: "
+                       f"Telegram restarted its update ids, resetting the journal")
+        self.reset()
+        return False
+
+    def reset(self):
+        """Forget the restored watermark so the next save writes the new, lower one"""
+        self.restored = self._saved = 0
+        self.highest_started = max(self.in_flight, default=0)
+
+    def begin(self, update_id: int):
+        self.in_flight.add(update_id)
+        if update_id > self.highest_started:
+            self.highest_started = update_id
+
+    def done(self, update_id: int):
+        self.in_flight.discard(update_id)
+
+    @property
+    def watermark(self) -> int:
+        if self.in_flight:
+            return min(self.in_flight) - 1
+        return self.highest_started
+
+    def finished_through(self, update_id: int) -> bool:
+        """True once update_id has started and every update up to it has finished"""
+        return self.highest_started >= update_id and self.watermark >= update_id
+
+    async def wait_finished(self, update_id: int, stop_event: asyncio.Event = None,
+                            interval: float = 0.05) -> bool:
+        """Wait until finished_through(update_id); False if stop_event is set first
+
+        getUpdates confirms every update below the offset it is called with,
+        so pollers call this before asking for the next batch: the confirmed
+        offset then never passes watermark + 1, and a crash mid-batch leaves
+        the unfinished updates with Telegram.
+        """
+        while not self.finished_through(update_id):
+            if stop_event is not None and stop_event.is_set():
+                return False
+            await asyncio.sleep(interval)
+        return True
+
+    def _write(self, update_id: int):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({'last_update_id': update_id, 'saved_at': time.time()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    async def save(self):
+        watermark = self.watermark
+        if watermark <= self._saved:
+            return
+        await asyncio.to_thread(self._write, watermark)
+        self._saved = watermark
+
+    async def _save_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.save()
+            except OSError as e:
+                logger.error(f"Could not write update journal: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._save_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.save()
+        if self.in_flight:
+            logger.warning(f"Update journal closed with {len(self.in_flight)} updates unfinished")
+
+
+async def replay_backlog(app, journal: UpdateJournal, batch: int = 100) -> dict:
+    """Fetch updates that queued up while the bot was down and run them through the handlers
+
+    Updates already covered by the journal are skipped, as are callback
+    queries: their inline buttons belong to menus the user has moved on from
+    and Telegram no longer accepts answers to them. The replayed updates go
+    through the normal update queue, so they run in parallel across users and
+    in order for each user; each batch is drained before the next getUpdates
+    call confirms it. Returns backlog statistics once they are drained.
+    """
+    started = time.monotonic()
+    # Start from the oldest pending update rather than the watermark: an offset above
+    # ids Telegram has restarted from would confirm, and so drop, the whole backlog
+    offset = None
+    replayed = skipped_callbacks = skipped_done = 0
+
+    while True:
+        updates = await app.bot.get_updates(offset=offset, limit=batch, timeout=0)
+        if not updates:
+            break
+        last_id = 0
+        for update in updates:
+            if journal.is_processed(update.update_id):
+                skipped_done += 1
+                continue
+            if update.callback_query is not None:
+                skipped_callbacks += 1
+                continue
+            last_id = update.update_id
+            await app.update_queue.put(update)
+            replayed += 1
+        # The next call confirms this batch, so it has to be handled first
+        if last_id:
+            await journal.wait_finished(last_id)
+        offset = updates[-1].update_id + 1
+
+    stats = {
+        'backlog': replayed + skipped_callbacks + skipped_done,
+        'replayed': replayed,
+        'skipped_callbacks': skipped_callbacks,
+        'skipped_processed': skipped_done,
+        'drain_seconds': round(time.monotonic() - started, 3),
+    }
+    logger.info(
+        f"Backlog replay: {stats['backlog']} pending updates, {replayed} replayed, "
+        f"{skipped_callbacks} stale callbacks skipped, drained in {stats['drain_seconds']}s"
+    )
+    return stats
@@ -0,0 +1,229 @@
+"""
+Sampling profiler for Ykarb Telegram Bot
+CPU-time sampling of the event loop for a bounded window, reported as collapsed stacks and per-handler time
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# ✅ Profiler configuration
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", "0.01"))  # Seconds of CPU time between samples
+PROFILER_SECONDS = float(os.getenv("PROFILER_SECONDS", "30"))  # Default window
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "300"))  # Hard cap on any window
+PROFILER_MAX_STACKS = int(os.getenv("PROFILER_MAX_STACKS", "20000"))  # Distinct stacks kept per session
+PROFILER_MAX_DEPTH = 64
+PROFILER_DIR = os.getenv("PROFILER_DIR", "profiles")
+
+OTHER_THREADS = "(other threads)"  # The loop was waiting in select(); the CPU went to log, storage or metrics threads
+UNATTRIBUTED = "(loop)"  # Busy outside any registered handler: library code, callbacks, timers
+
+# Code objects of handlers, filled in as they are defined; maps to the label used in the metrics
+_handler_labels = {}
+_frame_names = {}
+
+
+def register_handler(func, label: str):
+    """Attribute samples taken while func is running to `label`"""
+    code = getattr(func, '__code__', None)
+    if code is not None:
+        _handler_labels.setdefault(code, label)
+
+
+def _frame_name(code) -> str:
+    name = _frame_names.get(code)
+    if name is None:
+        name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        _frame_names[code] = name
+    return name
+
+
+def _is_waiting(code) -> bool:
+    return code.co_filename.endswith("selectors.py") and code.co_name == "select"
+
+
+class ProfileResult:
+    """Samples of one profiling session, by collapsed stack and by handler"""
+
+    def __init__(self, stacks: Counter, handlers: Counter, samples: int, seconds: float,
+                 cpu_seconds: float, updates: int, interval: float, reason: str):
+        self.stacks = stacks
+        self.handlers = handlers
+        self.samples = samples
+        self.seconds = seconds
+        self.cpu_seconds = cpu_seconds
+        self.updates = updates
+        self.interval = interval
+        self.reason = reason
+
+    @property
+    def loop_samples(self) -> int:
+        """Samples taken while the event loop itself was running code"""
+        return self.samples - self.handlers.get(OTHER_THREADS, 0)
+
+    def folded(self) -> str:
+        """Collapsed stacks, one 'frame;frame;frame count' line each, as flamegraph.pl and speedscope read them"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def save(self, directory: str = PROFILER_DIR) -> str:
+        """Write the collapsed stacks to a timestamped .folded file and return its path"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, time.strftime("profile-%Y%m%d-%H%M%S.folded"))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.folded())
+        return path
+
+    def leaf_functions(self, top: int) -> list:
+        """(frame, samples) for the functions most often on top of the loop's stack"""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            handler, _, frames = stack.partition(";")
+            if handler != OTHER_THREADS:
+                leaves[frames.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(top)
+
+    def summary(self, top: int = 10) -> str:
+        """Plain-text breakdown of CPU time by handler and by hottest function"""
+        on_loop = self.loop_samples
+        lines = [
+            f"🔬 Profile: {self.seconds:.1f}s, {self.updates} updates ({self.reason})",
+            f"Process CPU {self.cpu_seconds:.2f}s, sampled every {self.interval * 1000:.0f}ms of CPU: "
+            f"{self.samples} samples, {on_loop} on the event loop",
+        ]
+        if on_loop:
+            lines += ["", "Event-loop CPU by handler:"]
+            handlers = [(handler, count) for handler, count in self.handlers.most_common() if handler != OTHER_THREADS]
+            for handler, count in handlers[:top]:
+                lines.append(f"  {handler}: {count * self.interval * 1000:.0f}ms ({count / on_loop:.0%})")
+            lines += ["", "Hottest functions:"]
+            for frame, count in self.leaf_functions(top):
+                lines.append(f"  {frame}: {count / on_loop:.0%}")
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    """CPU-time sampling of the event-loop thread for a bounded window
+
+    A SIGPROF interval timer fires after every `interval` seconds of CPU the
+    process uses, and the signal handler records the stack the main thread
+    was interrupted in, so handlers run unmodified and the samples are
+    proportional to CPU time. Each sample is filed under the innermost
+    registered handler on the stack. A session ends after `seconds` (never
+    more than PROFILER_MAX_SECONDS), once `max_updates` updates have been
+    processed, or on stop(); only one runs at a time and the previous
+    SIGPROF disposition is restored afterwards.
+
+    Signal handlers only run in the main thread, so start() and stop() must
+    be called from the event loop running there. Needs setitimer (POSIX).
+    """
+
+    supported = hasattr(signal, 'setitimer') and hasattr(signal, 'SIGPROF')
+
+    def __init__(self, interval: float = PROFILER_INTERVAL, max_stacks: int = PROFILER_MAX_STACKS):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.last_result = None
+        self._session = None
+
+    @property
+    def running(self) -> bool:
+        return self._session is not None
+
+    def start(self, seconds: float = None, max_updates: int = None, updates=None):
+        """Start a session; returns a future for its ProfileResult, or None if one is already running
+
+        `updates` is a callable returning a running count of processed
+        updates, needed for `max_updates`.
+        """
+        if self._session is not None:
+            return None
+        if not self.supported:
+            raise RuntimeError("Sampling needs setitimer and SIGPROF, which this platform lacks")
+        if threading.current_thread() is not threading.main_thread():
+            raise RuntimeError("The profiler must be started from the main thread")
+        previous = signal.getsignal(signal.SIGPROF)
+        if previous not in (signal.SIG_DFL, signal.SIG_IGN, None):
+            raise RuntimeError("SIGPROF is already in use by another profiler")
+
+        loop = asyncio.get_running_loop()
+        seconds = min(seconds or PROFILER_SECONDS, PROFILER_MAX_SECONDS)
+        self._session = session = {
+            'future': loop.create_future(),
+            'stacks': Counter(),
+            'handlers': Counter(),
+            'samples': 0,
+            'started': time.perf_counter(),
+            'cpu_started': time.process_time(),
+            'updates': updates,
+            'first_update': updates() if updates else None,
+            'max_updates': max_updates,
+            'previous_handler': previous,
+            'loop': loop,
+        }
+        session['timer'] = loop.call_later(seconds, self.stop, "time limit")
+        signal.signal(signal.SIGPROF, self._on_signal)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        logger.info(f"Profiler started for {seconds:.0f}s" + (f" or {max_updates} updates" if max_updates else ""))
+        return session['future']
+
+    def stop(self, reason: str = "stopped") -> bool:
+        """End the running session and resolve its future; returns False if none is running"""
+        session, self._session = self._session, None
+        if session is None:
+            return False
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, session['previous_handler'] or signal.SIG_DFL)
+        session['timer'].cancel()
+
+        first_update = session['first_update']
+        result = ProfileResult(
+            session['stacks'], session['handlers'], session['samples'],
+            seconds=time.perf_counter() - session['started'],
+            cpu_seconds=time.process_time() - session['cpu_started'],
+            updates=session['updates']() - first_update if first_update is not None else 0,
+            interval=self.interval,
+            reason=reason,
+        )
+        self.last_result = result
+        logger.info(f"Profiler finished: {result.samples} samples in {result.seconds:.1f}s ({reason})")
+        if not session['future'].done():
+            session['future'].set_result(result)
+        return True
+
+    def _on_signal(self, signum, frame):
+        session = self._session
+        if session is None or frame is None:
+            return
+        self._sample(frame, session['stacks'], session['handlers'])
+        session['samples'] += 1
+        max_updates = session['max_updates']
+        if max_updates and session['first_update'] is not None \
+                and session['updates']() - session['first_update'] >= max_updates:
+            # Leave the signal handler before tearing the session down
+            session['loop'].call_soon_threadsafe(self.stop, "update limit")
+            session['max_updates'] = None
+
+    def _sample(self, frame, stacks: Counter, handlers: Counter):
+        leaf = frame.f_code
+        names = []
+        handler = None
+        while frame is not None and len(names) < PROFILER_MAX_DEPTH:
+            code = frame.f_code
+            names.append(_frame_name(code))
+            if handler is None:
+                handler = _handler_labels.get(code)
+            frame = frame.f_back
+        if handler is None:
+            handler = OTHER_THREADS if _is_waiting(leaf) else UNATTRIBUTED
+        handlers[handler] += 1
+        stack = f"{handler};{';'.join(reversed(names))}"
+        if stack in stacks or len(stacks) < self.max_stacks:
+            stacks[stack] += 1
+        else:
+            stacks[f"{handler};(truncated)"] += 1
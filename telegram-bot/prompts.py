@@ -0,0 +1,118 @@
+"""
+Prompt construction for Ykarb Telegram Bot
+Persona as a Gemini systemInstruction plus a token-budgeted rolling conversation window
+"""
+
+import os
+
+# ✅ Prompt budget configuration (tokens are estimated as characters / 4)
+PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", "1200"))
+PROMPT_SUMMARY_TOKENS = int(os.getenv("PROMPT_SUMMARY_TOKENS", "200"))
+PROMPT_TURN_TOKENS = int(os.getenv("PROMPT_TURN_TOKENS", "400"))
+SUMMARY_SNIPPET_WORDS = 12
+
+PERSONA = (
+    "You are Ykarb, a kind, multilingual, AI-powered digital companion that supports women and students. "
+    "You are emotionally intelligent, culturally aware, private and supportive with no judgments.\n"
+    "You provide help through three modules:\n"
+    "1. Sakhi Module - Menstrual and hormonal health tracking\n"
+    "2. EduCare Module - Voice-to-text notes and learning assistance\n"
+    "3. Mitra Module - Mental health support in regional languages\n"
+    "Respond as Ykarb with empathy, cultural sensitivity, and helpful guidance. If the user seems to be in "
+    "crisis or mentions self-harm, provide immediate support and crisis resources."
+)
+
+GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "topK": 40,
+    "topP": 0.95,
+    "maxOutputTokens": 1024,
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate; about four characters per token for Gemini"""
+    return (len(text) + 3) // 4
+
+
+def new_conversation() -> dict:
+    """Empty conversation state as stored in a user profile"""
+    return {'summary': [], 'turns': []}
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(' ', 1)[0] + " …"
+
+
+def _snippet(text: str) -> str:
+    words = text.split()
+    snippet = ' '.join(words[:SUMMARY_SNIPPET_WORDS])
+    return snippet + " …" if len(words) > SUMMARY_SNIPPET_WORDS else snippet
+
+
+def _compact(conversation: dict):
+    """Fold the oldest turns into the summary until the window fits its budget"""
+    turns = conversation['turns']
+    summary = conversation['summary']
+    used = sum(estimate_tokens(text) for _, text in turns)
+    while turns and (used > PROMPT_HISTORY_TOKENS or turns[0][0] != 'user'):
+        role, text = turns.pop(0)
+        used -= estimate_tokens(text)
+        # Only the user's side is summarised; the model's answers can be re-derived
+        if role == 'user':
+            summary.append(_snippet(text))
+
+    # The summary itself is bounded too: oldest topics fall off first
+    while summary and sum(estimate_tokens(s) for s in summary) > PROMPT_SUMMARY_TOKENS:
+        summary.pop(0)
+
+
+def remember_exchange(conversation: dict, prompt: str, reply: str) -> list:
+    """Append a user message and the model's reply, compacting older turns; returns the reply turn"""
+    turn = ['model', _clip(reply, PROMPT_TURN_TOKENS)]
+    conversation['turns'].append(['user', _clip(prompt, PROMPT_TURN_TOKENS)])
+    conversation['turns'].append(turn)
+    _compact(conversation)
+    return turn
+
+
+def replace_reply(turn: list, reply: str):
+    """Swap a later reply into a turn recorded earlier; no effect once it was folded into the summary"""
+    turn[1] = _clip(reply, PROMPT_TURN_TOKENS)
+
+
+def has_history(conversation) -> bool:
+    return bool(conversation and (conversation['turns'] or conversation['summary']))
+
+
+def build_payload(prompt: str, context: str = "", language_name: str = None, conversation: dict = None) -> tuple:
+    """Return (request body, estimated input tokens) for a Gemini call
+
+    The persona, language preference, per-request context and the summary of
+    compacted turns go into systemInstruction; the recent turns and the new
+    message go into contents as a proper user/model dialogue.
+    """
+    system = [PERSONA]
+    if language_name:
+        system.append(f"Please respond in {language_name} language when appropriate, while being culturally sensitive.")
+    if context:
+        system.append(f"Context: {context.strip()}")
+    if conversation and conversation['summary']:
+        system.append("Earlier in this conversation the user talked about: " + "; ".join(conversation['summary']))
+    system_text = "\n\n".join(system)
+
+    contents = []
+    if conversation:
+        contents = [{"role": role, "parts": [{"text": text}]} for role, text in conversation['turns']]
+    contents.append({"role": "user", "parts": [{"text": prompt}]})
+
+    tokens = estimate_tokens(system_text) + sum(estimate_tokens(c["parts"][0]["text"]) for c in contents)
+    payload = {
+        "systemInstruction": {"parts": [{"text": system_text}]},
+        "contents": contents,
+        "generationConfig": GENERATION_CONFIG,
+    }
+    return payload, tokens
@@ -0,0 +1,358 @@
+"""
+Admission control for Ykarb Telegram Bot
+Token-bucket rate limiting, retry backoff and a circuit breaker for upstream calls
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# ✅ Outgoing Telegram limits (Bot API allows roughly 30 messages/s overall and 1/s per chat)
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "28"))
+TELEGRAM_GLOBAL_BURST = float(os.getenv("TELEGRAM_GLOBAL_BURST", "30"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+BULK_SEND_RATE = float(os.getenv("BULK_SEND_RATE", "20"))  # Leaves the rest for interactive replies
+BULK_RESERVE_TOKENS = float(os.getenv("BULK_RESERVE_TOKENS", "5"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+INTERACTIVE_MAX_RETRY_AFTER = float(os.getenv("INTERACTIVE_MAX_RETRY_AFTER", "10"))
+# Fraction of the global and bulk limits this process may use; the workers of a sharded bot split them
+SEND_SHARE = 1.0
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+# Bot API calls that do not deliver messages and are not counted against Telegram's send limits
+UNLIMITED_ENDPOINTS = frozenset({
+    'getUpdates', 'getMe', 'setWebhook', 'deleteWebhook', 'getWebhookInfo',
+    'answerCallbackQuery', 'sendChatAction', 'close', 'logOut',
+})
+
+
+class AdmissionRejected(Exception):
+    """Raised when a call cannot be admitted before its deadline"""
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take tokens if they are available right now"""
+        self._refill(time.monotonic())
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def time_until(self, tokens: float = 1.0) -> float:
+        """Seconds until `tokens` will be available"""
+        self._refill(time.monotonic())
+        missing = tokens - self.tokens
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate if self.rate > 0 else float("inf")
+
+
+class AdmissionController:
+    """Global and per-user token buckets in front of an upstream service
+
+    Callers that find no token wait in a bounded queue until tokens become
+    available or their deadline passes; beyond max_waiters or the deadline
+    they are rejected immediately so the caller can fall back.
+    """
+
+    def __init__(self, global_rate: float, global_burst: float, user_rate: float, user_burst: float,
+                 max_waiters: int = 100, max_users: int = 10000):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_waiters = max_waiters
+        self.max_users = max_users
+        self._user_buckets = OrderedDict()
+        self.waiters = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def _user_bucket(self, user_id) -> TokenBucket:
+        bucket = self._user_buckets.pop(user_id, None)
+        if bucket is None:
+            bucket = TokenBucket(self.user_rate, self.user_burst)
+        self._user_buckets[user_id] = bucket
+        while len(self._user_buckets) > self.max_users:
+            self._user_buckets.popitem(last=False)
+        return bucket
+
+    def forget_user(self, user_id):
+        self._user_buckets.pop(user_id, None)
+
+    async def acquire(self, user_id=None, timeout: float = 5.0):
+        """Wait for a global (and per-user) token, or raise AdmissionRejected"""
+        deadline = time.monotonic() + timeout
+        user_bucket = self._user_bucket(user_id) if user_id is not None and self.user_rate > 0 else None
+
+        if self._try_take(user_bucket):
+            self.admitted += 1
+            return
+
+        if self.waiters >= self.max_waiters:
+            self.rejected += 1
+            raise AdmissionRejected("admission queue is full")
+
+        self.waiters += 1
+        try:
+            while True:
+                wait = self.global_bucket.time_until()
+                if user_bucket is not None:
+                    wait = max(wait, user_bucket.time_until())
+                remaining = deadline - time.monotonic()
+                if wait > remaining:
+                    self.rejected += 1
+                    raise AdmissionRejected(f"no capacity within {timeout:.1f}s")
+                await asyncio.sleep(wait)
+                if self._try_take(user_bucket):
+                    self.admitted += 1
+                    return
+        finally:
+            self.waiters -= 1
+
+    def _try_take(self, user_bucket) -> bool:
+        # Check both before taking either, so a refusal never burns a token
+        if user_bucket is not None and user_bucket.time_until() > 0:
+            return False
+        if not self.global_bucket.try_acquire():
+            return False
+        if user_bucket is not None:
+            user_bucket.try_acquire()
+        return True
+
+    def stats(self) -> dict:
+        return {
+            'waiters': self.waiters,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'global_tokens': round(self.global_bucket.tokens, 2),
+        }
+
+
+class CircuitBreaker:
+    """Stop calling an upstream that keeps failing, then probe it again later
+
+    closed: calls flow normally. After `failure_threshold` consecutive
+    failures the breaker opens and calls fail fast for `reset_timeout`
+    seconds. It then half-opens and lets a single probe through; success
+    closes it again, failure re-opens it. A caller that gets permission from
+    allow() must end with record_success(), record_failure() or
+    release_probe(), or the half-open breaker waits for its probe forever.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """Return True if a call may be attempted now"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def release_probe(self):
+        """Give back a probe that never reached the upstream (not admitted, or cancelled)"""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("Circuit breaker closed, upstream recovered")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit breaker opened after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """Throttles outgoing Bot API calls, always serving interactive replies first
+
+    Every message-delivering call takes a token from a global bucket;
+    polling, callback answers and chat actions pass straight through. Bulk calls (made with
+    rate_limit_args=PRIORITY_BULK, e.g. reminders) additionally need a token
+    from their own slower bucket and from the target chat's bucket, leave a
+    reserve in the global bucket, and wait while any interactive call is
+    waiting. Interactive calls are never delayed by per-chat limits; they only
+    draw the chat bucket down so that bulk sends keep away from busy chats.
+
+    A RetryAfter from Telegram pauses all sending for the requested time and
+    the call is retried, up to SEND_MAX_RETRIES times (interactive calls only
+    when the wait is short enough to still be useful).
+
+    Telegram's limits apply to the bot as a whole, so the global and bulk
+    rates are scaled by `share` (SEND_SHARE by default) when several worker
+    processes send for the same bot. Per-chat limits are not: each chat's
+    updates are handled by a single worker.
+    """
+
+    def __init__(self, global_rate: float = TELEGRAM_GLOBAL_RATE, global_burst: float = TELEGRAM_GLOBAL_BURST,
+                 chat_rate: float = TELEGRAM_CHAT_RATE, chat_burst: float = TELEGRAM_CHAT_BURST,
+                 bulk_rate: float = BULK_SEND_RATE, bulk_reserve: float = BULK_RESERVE_TOKENS,
+                 max_retries: int = SEND_MAX_RETRIES, max_chats: int = 10000, share: float = None):
+        share = SEND_SHARE if share is None else share
+        # A bucket holding less than one token would never admit a call
+        self.global_bucket = TokenBucket(global_rate * share, max(1.0, global_burst * share))
+        self.bulk_bucket = TokenBucket(bulk_rate * share, max(1.0, min(bulk_rate, global_burst) * share))
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.bulk_reserve = bulk_reserve * share
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._chat_buckets = OrderedDict()
+        self._paused_until = 0.0
+        self.interactive_waiting = 0
+        self.bulk_waiting = 0
+        self.retry_afters = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.pop(chat_id, None)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+        self._chat_buckets[chat_id] = bucket
+        while len(self._chat_buckets) > self.max_chats:
+            self._chat_buckets.popitem(last=False)
+        return bucket
+
+    async def _wait_interactive(self, chat_bucket):
+        self.interactive_waiting += 1
+        try:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause <= 0 and self.global_bucket.try_acquire():
+                    break
+                await asyncio.sleep(max(pause, self.global_bucket.time_until()))
+        finally:
+            self.interactive_waiting -= 1
+        if chat_bucket is not None:
+            chat_bucket.try_acquire()
+
+    async def _wait_bulk(self, chat_bucket):
+        self.bulk_waiting += 1
+        try:
+            while True:
+                wait = max(
+                    self._paused_until - time.monotonic(),
+                    self.global_bucket.time_until(1 + self.bulk_reserve),
+                    self.bulk_bucket.time_until(),
+                    chat_bucket.time_until() if chat_bucket is not None else 0.0,
+                )
+                if wait <= 0 and not self.interactive_waiting:
+                    self.global_bucket.try_acquire()
+                    self.bulk_bucket.try_acquire()
+                    if chat_bucket is not None:
+                        chat_bucket.try_acquire()
+                    return
+                # Yield to interactive callers for at least one token interval
+                await asyncio.sleep(max(wait, 1 / self.global_bucket.rate))
+        finally:
+            self.bulk_waiting -= 1
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if endpoint in UNLIMITED_ENDPOINTS:
+            return await callback(*args, **kwargs)
+        bulk = rate_limit_args == PRIORITY_BULK
+        chat_id = data.get('chat_id')
+        chat_bucket = self._chat_bucket(chat_id) if chat_id is not None else None
+
+        attempt = 0
+        while True:
+            if bulk:
+                await self._wait_bulk(chat_bucket)
+            else:
+                await self._wait_interactive(chat_bucket)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self.retry_afters += 1
+                retry_after = float(e.retry_after)
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                logger.warning(f"Telegram flood control on {endpoint}: pausing sends for {retry_after:.0f}s")
+                if attempt >= self.max_retries or (not bulk and retry_after > INTERACTIVE_MAX_RETRY_AFTER):
+                    raise
+                attempt += 1
+
+    def stats(self) -> dict:
+        return {
+            'interactive_waiting': self.interactive_waiting,
+            'bulk_waiting': self.bulk_waiting,
+            'retry_afters': self.retry_afters,
+            'global_tokens': round(self.global_bucket.tokens, 2),
+        }
+
+
+def parse_retry_after(value) -> float:
+    """Parse a Retry-After header (delta seconds or HTTP date) into seconds"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: float = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After"""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
@@ -0,0 +1,174 @@
+"""
+Daily check-in reminders for Ykarb Telegram Bot
+Minute-slot schedule of opted-in users and a batched, rate-limited fan-out
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# ✅ Reminder configuration
+REMINDERS_ENABLED = os.getenv("REMINDERS_ENABLED", "true").lower() in ("1", "true", "yes")
+REMINDER_UTC_OFFSET = int(os.getenv("REMINDER_UTC_OFFSET", "330"))  # Minutes east of UTC; IST by default
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "500"))
+REMINDER_CONCURRENCY = int(os.getenv("REMINDER_CONCURRENCY", "50"))
+REMINDER_TIMES = ('08:00', '13:00', '20:00', '22:00')  # Local times offered in the settings menu
+
+MINUTES_PER_DAY = 24 * 60
+
+# (worker index, worker count) when running sharded; each worker reminds only its own users
+SHARD = None
+
+
+def parse_time(value: str) -> int:
+    """'HH:MM' to minutes since midnight"""
+    hours, minutes = value.split(':')
+    return (int(hours) * 60 + int(minutes)) % MINUTES_PER_DAY
+
+
+def utc_minute(local_time: str, utc_offset: int) -> int:
+    """Minute of the UTC day at which a local 'HH:MM' falls"""
+    return (parse_time(local_time) - utc_offset) % MINUTES_PER_DAY
+
+
+class ReminderSchedule:
+    """Opted-in users bucketed by the UTC minute of the day they want a reminder
+
+    Finding who is due is a single dict lookup per minute, so the scheduler
+    never walks the whole user base. The language each reminder is written
+    in is kept alongside, since the profile is rarely in memory when it is sent.
+    """
+
+    def __init__(self):
+        self.slots = {}
+        self._user_slot = {}
+        self.languages = {}
+
+    def set(self, user_id: int, local_time: str, utc_offset: int = REMINDER_UTC_OFFSET, language: str = None):
+        self.remove(user_id)
+        minute = utc_minute(local_time, utc_offset)
+        self.slots.setdefault(minute, set()).add(user_id)
+        self._user_slot[user_id] = minute
+        if language is not None:
+            self.languages[user_id] = language
+
+    def remove(self, user_id: int):
+        self.languages.pop(user_id, None)
+        minute = self._user_slot.pop(user_id, None)
+        if minute is not None:
+            users = self.slots[minute]
+            users.discard(user_id)
+            if not users:
+                del self.slots[minute]
+
+    def due(self, minute: int) -> list:
+        return sorted(self.slots.get(minute, ()))
+
+    def __len__(self):
+        return len(self._user_slot)
+
+    def __contains__(self, user_id):
+        return user_id in self._user_slot
+
+    async def load(self, store, shard=None):
+        """Fill the schedule from every stored profile with reminders turned on"""
+        shard = SHARD if shard is None else shard
+        started = time.perf_counter()
+        async for user_id, reminder in store.scan_field('reminder'):
+            if not reminder:
+                continue
+            if shard is not None and user_id % shard[1] != shard[0]:
+                continue
+            self.set(user_id, reminder['time'], reminder.get('utc_offset', REMINDER_UTC_OFFSET), reminder.get('language'))
+        logger.info(f"Reminder schedule loaded: {len(self)} users in {time.perf_counter() - started:.2f}s")
+
+
+class ReminderScheduler:
+    """Wakes up every minute and sends the reminders that are due
+
+    `send` is a coroutine function taking a user id and returning True when a
+    reminder was delivered. Due users are processed in batches with bounded
+    concurrency; actual pacing comes from the bot's rate limiter, which
+    serves interactive replies first, so a large fan-out simply stretches
+    out instead of crowding out conversations.
+    """
+
+    def __init__(self, schedule: ReminderSchedule, send, batch_size: int = REMINDER_BATCH_SIZE,
+                 concurrency: int = REMINDER_CONCURRENCY, send_rate: float = None):
+        self.schedule = schedule
+        self.send = send
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.send_rate = send_rate
+        self.sent = 0
+        self.failed = 0
+        self.last_run = None
+        self._task = None
+        self._fanouts = set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        tasks = ([self._task] if self._task else []) + list(self._fanouts)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    async def _loop(self):
+        last_minute = int(time.time() // 60)
+        while True:
+            # Sleep to the start of the next minute
+            await asyncio.sleep(60 - time.time() % 60 + 0.05)
+            now_minute = int(time.time() // 60)
+            # Catch up on minutes skipped by a stalled loop, but never more than an hour
+            for minute in range(max(last_minute + 1, now_minute - 59), now_minute + 1):
+                users = self.schedule.due(minute % MINUTES_PER_DAY)
+                if users:
+                    # A slow fan-out must not delay the next minute's reminders
+                    task = asyncio.create_task(self.fan_out(users))
+                    self._fanouts.add(task)
+                    task.add_done_callback(self._fanouts.discard)
+            last_minute = now_minute
+
+    async def fan_out(self, users: list) -> dict:
+        """Send reminders to `users` in batches and return delivery statistics"""
+        started = time.monotonic()
+        if self.send_rate:
+            logger.info(
+                f"Sending {len(users)} reminders, expected to take ~{len(users) / self.send_rate:.0f}s"
+            )
+        semaphore = asyncio.Semaphore(self.concurrency)
+        sent = failed = 0
+
+        async def deliver(user_id):
+            nonlocal sent, failed
+            async with semaphore:
+                try:
+                    delivered = await self.send(user_id)
+                except Exception as e:
+                    logger.warning(f"Reminder to {user_id} failed: {e}")
+                    delivered = False
+            if delivered:
+                sent += 1
+            else:
+                failed += 1
+
+        for i in range(0, len(users), self.batch_size):
+            await asyncio.gather(*(deliver(user_id) for user_id in users[i:i + self.batch_size]))
+
+        self.sent += sent
+        self.failed += failed
+        self.last_run = {
+            'users': len(users),
+            'sent': sent,
+            'skipped_or_failed': failed,
+            'seconds': round(time.monotonic() - started, 2),
+        }
+        logger.info(f"Reminder fan-out finished: {self.last_run}")
+        return self.last_run
@@ -0,0 +1,95 @@
+"""
+Callback query routing for Ykarb Telegram Bot
+Maps inline-button callback data to handlers with O(1) exact and trie-based prefix lookup
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+_HANDLER = None  # Trie slot holding the handler registered for a prefix
+
+
+class CallbackRouter:
+    """Registry of callback handlers
+
+    Exact keys ('mitra', 'mood_checkin') resolve with a single dict lookup.
+    Parameterised keys ('mood_', 'intensity_') live in a character trie and
+    resolve to the longest registered prefix; the rest of the callback data
+    is passed to the handler as its argument. Exact keys always win over
+    prefixes, so 'mood_history' is never treated as a mood.
+
+    Each module (Sakhi, EduCare, Mitra) builds its own router and the
+    application combines them with include().
+    """
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._exact = {}
+        self._trie = {}
+        self._prefixes = {}
+
+    def add(self, key: str, handler):
+        if key in self._exact:
+            raise ValueError(f"Callback '{key}' is already registered")
+        self._exact[key] = handler
+
+    def add_prefix(self, prefix: str, handler):
+        if not prefix:
+            raise ValueError("Callback prefix must not be empty")
+        if prefix in self._prefixes:
+            raise ValueError(f"Callback prefix '{prefix}' is already registered")
+        node = self._trie
+        for ch in prefix:
+            node = node.setdefault(ch, {})
+        node[_HANDLER] = handler
+        self._prefixes[prefix] = handler
+
+    def route(self, key: str):
+        """Decorator registering a handler for an exact callback key"""
+        def decorator(handler):
+            self.add(key, handler)
+            return handler
+        return decorator
+
+    def prefix(self, prefix: str):
+        """Decorator registering a handler for every callback starting with prefix"""
+        def decorator(handler):
+            self.add_prefix(prefix, handler)
+            return handler
+        return decorator
+
+    def include(self, *routers):
+        """Merge the routes of other routers into this one"""
+        for router in routers:
+            for key, handler in router._exact.items():
+                self.add(key, handler)
+            for prefix, handler in router._prefixes.items():
+                self.add_prefix(prefix, handler)
+
+    def routes(self):
+        """Yield (key or prefix, handler) for every registered route"""
+        yield from self._exact.items()
+        yield from self._prefixes.items()
+
+    def resolve(self, data: str):
+        """Return (handler, argument, route) for callback data, or (None, None, None)"""
+        handler = self._exact.get(data)
+        if handler is not None:
+            return handler, None, data
+
+        match = None
+        node = self._trie
+        for i, ch in enumerate(data):
+            node = node.get(ch)
+            if node is None:
+                break
+            if _HANDLER in node:
+                match = (node[_HANDLER], data[i + 1:], data[:i + 1])
+        return match or (None, None, None)
+
+    def __contains__(self, data: str) -> bool:
+        return self.resolve(data)[0] is not None
+
+    def __len__(self):
+        return len(self._exact) + len(self._prefixes)
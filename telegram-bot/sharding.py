@@ -0,0 +1,449 @@
+"""
+Multi-process serving for Ykarb Telegram Bot
+One ingress (webhook or poller) routes each user's updates to a fixed worker process
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+# ✅ Worker pool configuration (BOT_WORKERS > 1 enables sharded serving)
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))
+WORKER_HEARTBEAT_INTERVAL = float(os.getenv("WORKER_HEARTBEAT_INTERVAL", "1"))
+WORKER_HEARTBEAT_TIMEOUT = float(os.getenv("WORKER_HEARTBEAT_TIMEOUT", "15"))
+WORKER_REPORT_INTERVAL = float(os.getenv("WORKER_REPORT_INTERVAL", "0.2"))  # Seconds between "updates done" reports
+WORKER_RESTART_DELAY = float(os.getenv("WORKER_RESTART_DELAY", "1"))
+WORKER_DRAIN_TIMEOUT = float(os.getenv("WORKER_DRAIN_TIMEOUT", "30"))
+POLL_TIMEOUT = int(os.getenv("POLL_TIMEOUT", "30"))
+
+_STOP = None  # Sentinel telling a worker to drain and exit
+
+
+def raw_user_key(data: dict):
+    """Return the sender (else chat) id of a raw update dict without building an Update"""
+    for field, value in data.items():
+        if field == 'update_id' or not isinstance(value, dict):
+            continue
+        for key in ('from', 'user'):
+            sender = value.get(key)
+            if isinstance(sender, dict) and 'id' in sender:
+                return sender['id']
+        chat = value.get('chat') or (value.get('message') or {}).get('chat')
+        if isinstance(chat, dict) and 'id' in chat:
+            return chat['id']
+    return None
+
+
+def shard_for(data: dict, workers: int) -> int:
+    """Worker index for an update; all updates from one user land on the same worker"""
+    key = raw_user_key(data)
+    if key is None:
+        key = data.get('update_id', 0)
+    return key % workers
+
+
+# ✅ Worker process
+class CompletionReporter:
+    """Takes the UpdateJournal's place in a worker: finished update ids go back to the ingress in batches
+
+    The ingress keeps the real journal and only moves its watermark past an
+    update once the worker that handled it has reported it here.
+    """
+
+    def __init__(self, outbox):
+        self.outbox = outbox
+        self.finished = []
+
+    def begin(self, update_id: int):
+        pass
+
+    def done(self, update_id: int):
+        self.finished.append(update_id)
+
+    def flush(self):
+        if self.finished:
+            batch, self.finished = self.finished, []
+            self.outbox.put(batch)
+
+
+def worker_main(index: int, inbox, outbox, heartbeat, workers: int = 1):
+    """Entry point of a worker process: run the regular application fed from `inbox`"""
+    import metrics
+    import ratelimit
+    import reminders
+    reminders.SHARD = (index, workers)
+    # Telegram's send limits are per bot, so every worker gets an equal slice of them
+    ratelimit.SEND_SHARE = 1 / workers
+    if metrics.METRICS_PORT > 0:
+        # Each worker exports its own metrics on the ports after the configured one
+        metrics.METRICS_PORT += 1 + index
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The supervisor decides when workers stop
+    try:
+        asyncio.run(_run_worker(index, inbox, outbox, heartbeat))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _run_worker(index: int, inbox, outbox, heartbeat):
+    from telegram import Update
+    import bot
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, stop_event.set)
+    except (NotImplementedError, RuntimeError):
+        pass
+
+    async def beat():
+        while True:
+            heartbeat.value = time.time()
+            await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+
+    async def report(reporter: CompletionReporter):
+        while True:
+            await asyncio.sleep(WORKER_REPORT_INTERVAL)
+            reporter.flush()
+
+    async def feed(app):
+        while not stop_event.is_set():
+            try:
+                data = await asyncio.to_thread(inbox.get, True, 0.5)
+            except queue.Empty:
+                continue
+            if data is _STOP:
+                break
+            await app.update_queue.put(Update.de_json(data, app.bot))
+        stop_event.set()
+
+    # Updates come from the ingress process, so the worker never polls
+    app = bot.build_application('webhook')
+    reporter = CompletionReporter(outbox)
+    app.update_processor.journal = reporter
+    async with app:
+        if app.post_init:
+            await app.post_init(app)
+        await app.start()
+        logger.info(f"Worker {index} (pid {os.getpid()}) ready")
+        tasks = [asyncio.create_task(beat()), asyncio.create_task(feed(app)), asyncio.create_task(report(reporter))]
+        try:
+            await stop_event.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            # app.stop() lets the updates already queued and in flight finish
+            logger.info(f"Worker {index} draining {app.update_queue.qsize()} queued updates")
+            await app.stop()
+            reporter.flush()
+            if app.post_stop:
+                await app.post_stop(app)
+    if app.post_shutdown:
+        await app.post_shutdown(app)
+    logger.info(f"Worker {index} stopped")
+
+
+# ✅ Supervisor and ingress
+class WorkerPool:
+    """Starts the worker processes, routes updates to them and restarts dead ones
+
+    Each worker reads from its own bounded inbox and moves updates straight
+    into its application queue, and reports the ids it has finished through
+    its outbox; those are passed to `on_done`. The pool keeps every routed
+    update until it is reported, so when a worker dies its replacement starts
+    with the updates it never finished. Replacements get fresh queues, since
+    a process killed mid-read can leave the old queue's lock held forever;
+    reports lost with the old outbox mean a few updates run twice.
+    """
+
+    def __init__(self, workers: int = BOT_WORKERS, queue_size: int = WORKER_QUEUE_SIZE, on_done=None):
+        self.size = max(1, workers)
+        self.queue_size = queue_size
+        self.on_done = on_done
+        self._ctx = multiprocessing.get_context("spawn")
+        self.inboxes = [self._ctx.Queue(maxsize=queue_size) for _ in range(self.size)]
+        self.outboxes = [self._ctx.Queue() for _ in range(self.size)]
+        self.unfinished = [{} for _ in range(self.size)]  # update_id -> raw update, until reported done
+        self.heartbeats = [self._ctx.Value('d', 0.0, lock=False) for _ in range(self.size)]
+        self.processes = [None] * self.size
+        self.restarts = [0] * self.size
+        self.routed = [0] * self.size
+        self._stopping = False
+
+    def _spawn(self, index: int, fresh_inbox: bool = False):
+        if fresh_inbox:
+            # Whatever the dead worker had not finished goes first, in the order it arrived
+            unfinished = [self.unfinished[index][update_id] for update_id in sorted(self.unfinished[index])]
+            self.inboxes[index] = self._ctx.Queue(maxsize=self.queue_size + len(unfinished))
+            self.outboxes[index] = self._ctx.Queue()
+            for data in unfinished:
+                self.inboxes[index].put_nowait(data)
+            if unfinished:
+                logger.warning(f"Worker {index}: handing {len(unfinished)} unfinished updates to its replacement")
+        self.heartbeats[index].value = time.time()
+        process = self._ctx.Process(
+            target=worker_main,
+            args=(index, self.inboxes[index], self.outboxes[index], self.heartbeats[index], self.size),
+            name=f"ykarb-worker-{index}", daemon=False
+        )
+        process.start()
+        self.processes[index] = process
+
+    def start(self):
+        for index in range(self.size):
+            self._spawn(index)
+        logger.info(f"Started {self.size} worker processes")
+
+    async def dispatch(self, data: dict, timeout: float = 2.0) -> bool:
+        """Route a raw update to its worker; False when that worker's inbox stays full"""
+        if self._stopping:
+            return False
+        index = shard_for(data, self.size)
+        inbox = self.inboxes[index]
+        # Tracked before the put, so a report can never arrive for an update we don't know yet
+        self.unfinished[index][data['update_id']] = data
+        try:
+            inbox.put_nowait(data)
+        except queue.Full:
+            try:
+                await asyncio.to_thread(inbox.put, data, True, timeout)
+            except queue.Full:
+                self.unfinished[index].pop(data['update_id'], None)
+                logger.warning(f"Worker {index} inbox full, asking Telegram to retry")
+                return False
+        self.routed[index] += 1
+        return True
+
+    def _collect_finished(self):
+        for index, outbox in enumerate(self.outboxes):
+            while True:
+                try:
+                    batch = outbox.get_nowait()
+                except queue.Empty:
+                    break
+                for update_id in batch:
+                    self.unfinished[index].pop(update_id, None)
+                    if self.on_done is not None:
+                        self.on_done(update_id)
+
+    async def collect(self):
+        """Pass the update ids workers report finished to on_done"""
+        while not self._stopping:
+            await asyncio.sleep(WORKER_REPORT_INTERVAL)
+            self._collect_finished()
+
+    async def supervise(self):
+        """Restart workers that exit or stop sending heartbeats"""
+        while not self._stopping:
+            await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+            now = time.time()
+            for index, process in enumerate(self.processes):
+                if self._stopping:
+                    return
+                stale = now - self.heartbeats[index].value > WORKER_HEARTBEAT_TIMEOUT
+                if process.is_alive() and not stale:
+                    continue
+                if process.is_alive():
+                    logger.error(f"Worker {index} missed heartbeats for {WORKER_HEARTBEAT_TIMEOUT}s, killing it")
+                    process.kill()
+                    await asyncio.to_thread(process.join, 5)
+                else:
+                    logger.error(f"Worker {index} exited with code {process.exitcode}")
+                self.restarts[index] += 1
+                # Back off a little more each time a worker keeps dying
+                await asyncio.sleep(min(30.0, WORKER_RESTART_DELAY * self.restarts[index]))
+                if not self._stopping:
+                    self._spawn(index, fresh_inbox=True)
+                    logger.info(f"Worker {index} restarted (restart #{self.restarts[index]})")
+
+    async def drain(self, timeout: float = WORKER_DRAIN_TIMEOUT):
+        """Ask every worker to finish its queued updates and exit, then reap them"""
+        self._stopping = True
+        for index, inbox in enumerate(self.inboxes):
+            try:
+                await asyncio.to_thread(inbox.put, _STOP, True, timeout)
+            except queue.Full:
+                logger.warning(f"Worker {index} inbox still full, it will be terminated")
+        deadline = time.monotonic() + timeout
+        for index, process in enumerate(self.processes):
+            await asyncio.to_thread(process.join, max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker {index} did not drain within {timeout}s, terminating")
+                process.terminate()
+                await asyncio.to_thread(process.join, 5)
+        self._collect_finished()
+        logger.info("All workers stopped")
+
+    def stats(self) -> dict:
+        workers = []
+        now = time.time()
+        for index, process in enumerate(self.processes):
+            try:
+                backlog = self.inboxes[index].qsize()
+            except NotImplementedError:  # macOS
+                backlog = None
+            workers.append({
+                'alive': bool(process and process.is_alive()),
+                'pid': process.pid if process else None,
+                'restarts': self.restarts[index],
+                'routed': self.routed[index],
+                'unfinished': len(self.unfinished[index]),
+                'backlog': backlog,
+                'heartbeat_age': round(now - self.heartbeats[index].value, 2),
+            })
+        return {'workers': workers}
+
+
+async def _route_backlog(telegram_bot, route, journal) -> tuple:
+    """Route updates that queued up while the bot was down; returns (stats, next offset)"""
+    started = time.monotonic()
+    offset = None  # From the oldest pending update, as in offsets.replay_backlog
+    routed = skipped_callbacks = 0
+    while True:
+        updates = await telegram_bot.get_updates(offset=offset, limit=100, timeout=0)
+        if not updates:
+            break
+        last_id = 0
+        for update in updates:
+            # Buttons on menus from before the restart can no longer be answered
+            if update.callback_query is not None:
+                skipped_callbacks += 1
+                continue
+            while not await route(update.to_dict()):
+                await asyncio.sleep(0.5)
+            last_id = update.update_id
+            routed += 1
+        # The next call confirms this batch, so the workers have to finish it first
+        if last_id:
+            await journal.wait_finished(last_id)
+        offset = updates[-1].update_id + 1
+    stats = {
+        'backlog': routed + skipped_callbacks,
+        'replayed': routed,
+        'skipped_callbacks': skipped_callbacks,
+        'drain_seconds': round(time.monotonic() - started, 3),
+    }
+    logger.info(
+        f"Backlog replay: {stats['backlog']} pending updates, {routed} routed to workers, "
+        f"{skipped_callbacks} stale callbacks skipped in {stats['drain_seconds']}s"
+    )
+    return stats, offset
+
+
+async def _poll(route, stop_event: asyncio.Event, telegram_bot, journal, offset: int = None):
+    """Long-poll getUpdates in the ingress process and route every update
+
+    Each batch is finished by the workers before the next call confirms it,
+    so the offset never passes the journal watermark + 1.
+    """
+    from telegram.error import NetworkError, RetryAfter
+
+    while not stop_event.is_set():
+        try:
+            updates = await telegram_bot.get_updates(offset=offset, timeout=POLL_TIMEOUT)
+        except RetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+            continue
+        except NetworkError as e:
+            logger.warning(f"getUpdates failed: {e}")
+            await asyncio.sleep(1)
+            continue
+        if not updates:
+            continue
+        for update in updates:
+            # Keep retrying the same update rather than skipping past it
+            while not await route(update.to_dict()):
+                if stop_event.is_set():
+                    return
+        if not await journal.wait_finished(updates[-1].update_id, stop_event):
+            return
+        offset = updates[-1].update_id + 1
+
+
+async def serve_sharded(mode: str, workers: int = BOT_WORKERS):
+    """Run the ingress in this process and the handlers in `workers` worker processes"""
+    from telegram import Bot, Update
+    from telegram.request import HTTPXRequest
+    from bot import TELEGRAM_API_BASE, TELEGRAM_TOKEN
+    from offsets import UpdateJournal
+    from webhook import WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN, WEBHOOK_URL, WebhookServer
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    # Updates count as done once the worker that handled them reports back
+    journal = UpdateJournal()
+    journal.start()
+    pool = WorkerPool(workers, on_done=journal.done)
+    pool.start()
+    supervisor = asyncio.create_task(pool.supervise())
+    collector = asyncio.create_task(pool.collect())
+
+    async def route(data: dict) -> bool:
+        update_id = data['update_id']
+        if journal.is_processed(update_id):
+            return True
+        # Begun even if the hand-off fails: the watermark must not pass an update that was never run
+        journal.begin(update_id)
+        return await pool.dispatch(data)
+
+    bot_kwargs = {}
+    if TELEGRAM_API_BASE:
+        bot_kwargs = {'base_url': f"{TELEGRAM_API_BASE}/bot", 'base_file_url': f"{TELEGRAM_API_BASE}/file/bot"}
+    telegram_bot = Bot(TELEGRAM_TOKEN, get_updates_request=HTTPXRequest(read_timeout=POLL_TIMEOUT + 10),
+                       **bot_kwargs)
+
+    webhook_server = None
+    poller = None
+    async with telegram_bot:
+        try:
+            backlog, offset = None, None
+            if mode == 'polling' or WEBHOOK_URL:
+                await telegram_bot.delete_webhook(drop_pending_updates=False)
+                backlog, offset = await _route_backlog(telegram_bot, route, journal)
+
+            if mode == 'webhook':
+                def health() -> dict:
+                    stats = pool.stats()
+                    stats['mode'] = 'webhook-sharded'
+                    stats['last_processed_update'] = journal.watermark
+                    stats['backlog'] = backlog
+                    if not all(worker['alive'] for worker in stats['workers']):
+                        stats['status'] = 'degraded'
+                    return stats
+
+                webhook_server = WebhookServer(route, health)
+                await webhook_server.start()
+                if WEBHOOK_URL:
+                    await telegram_bot.set_webhook(
+                        url=f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+                        secret_token=WEBHOOK_SECRET_TOKEN,
+                        allowed_updates=Update.ALL_TYPES
+                    )
+                    logger.info(f"Webhook set to: {WEBHOOK_URL}{WEBHOOK_PATH}")
+            else:
+                poller = asyncio.create_task(_poll(route, stop_event, telegram_bot, journal, offset))
+
+            logger.info(f"🤖 Ykarb Bot is running in {mode} mode with {pool.size} workers... Press Ctrl+C to stop.")
+            await stop_event.wait()
+        finally:
+            logger.info("🛑 Shutting down: stopping ingress, draining workers...")
+            if webhook_server is not None:
+                await webhook_server.stop()
+            if poller is not None:
+                poller.cancel()
+            supervisor.cancel()
+            collector.cancel()
+            await pool.drain()
+            await journal.close()
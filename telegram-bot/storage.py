@@ -0,0 +1,528 @@
+"""
+User state storage for Ykarb Telegram Bot
+Pluggable profile stores with lazy loading, write-behind batching and a bounded in-memory session set
+"""
+
+import asyncio
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import threading
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from cycles import new_cycle_data
+from mood_log import MoodLog
+from notes import NoteBook
+from prompts import new_conversation
+
+logger = logging.getLogger(__name__)
+
+# ✅ Storage configuration
+USER_STORE = os.getenv("USER_STORE", "memory")
+USER_STORE_PATH = os.getenv("USER_STORE_PATH", "ykarb_users.db")
+USER_STORE_FLUSH_INTERVAL = float(os.getenv("USER_STORE_FLUSH_INTERVAL", "2"))
+USER_STORE_BATCH_SIZE = int(os.getenv("USER_STORE_BATCH_SIZE", "500"))
+
+# ✅ Session budget: profiles kept in memory (0 disables a limit). Only the sqlite store can
+# reload an evicted profile, so the memory store keeps every session unless told otherwise.
+USER_SESSION_LIMIT = int(os.getenv("USER_SESSION_LIMIT", "50000" if USER_STORE == "sqlite" else "0"))
+USER_SESSION_MEMORY_MB = float(os.getenv("USER_SESSION_MEMORY_MB", "0"))  # Measured as serialized size
+USER_SESSION_IDLE = float(os.getenv("USER_SESSION_IDLE", "1800"))  # Seconds; durable stores only
+USER_SESSION_SWEEP_INTERVAL = float(os.getenv("USER_SESSION_SWEEP_INTERVAL", "60"))
+
+# A profile touched more recently than this may still be held by a running
+# handler (Gemini retries included), so it is never evicted
+EVICTION_GRACE = 300
+
+
+def default_profile() -> dict:
+    """Return a fresh profile for a user we have not seen before"""
+    return {
+        'active_module': None,
+        'language': 'english',
+        'cycle_data': new_cycle_data(),
+        'mood_history': MoodLog(),
+        'wellness_streak': 0,
+        'activity_log': [],
+        'pending_note': None,  # Tag for the next message to be saved as a note, '' for none
+        'notes_query': '',
+        'crisis_support_shown': False,
+        'conversation': new_conversation(),
+        'reminder': None
+    }
+
+
+def _encode_value(value):
+    if isinstance(value, MoodLog):
+        return value.to_dict()
+    raise TypeError(f"Cannot store {type(value).__name__} in a user profile")
+
+
+def encode_profile(profile: dict) -> str:
+    """Serialize a profile for durable storage"""
+    return json.dumps(profile, ensure_ascii=False, separators=(',', ':'), default=_encode_value)
+
+
+def decode_profile(raw: str) -> dict:
+    """Deserialize a stored profile, filling in fields added since it was written
+
+    Profiles written before notes got their own storage still carry them
+    under 'notes'; the store moves them out (see legacy_notebook).
+    """
+    profile = default_profile()
+    profile.update(json.loads(raw))
+    history = profile['mood_history']
+    if isinstance(history, list):
+        profile['mood_history'] = MoodLog.from_entries(history)
+    elif isinstance(history, dict):
+        profile['mood_history'] = MoodLog.from_dict(history)
+    return profile
+
+
+def legacy_notebook(notes) -> NoteBook:
+    """Notebook for notes stored inside an old profile; all of them still need writing"""
+    if isinstance(notes, dict):
+        return NoteBook.from_dict(notes)
+    return NoteBook.from_list(notes)
+
+
+class UserStore(ABC):
+    """Base class for profile stores
+
+    Profiles are loaded lazily on first access and kept in memory. Handlers
+    mutate the returned dict in place and call mark_dirty(); dirty profiles
+    are coalesced and written in batches by a background task, so disk I/O
+    never runs on the event loop.
+
+    The in-memory set is bounded: profiles are kept in least-recently-used
+    order, and a second background task evicts the oldest ones whenever
+    there are more than `session_limit` of them or their serialized size
+    exceeds `memory_budget` bytes. Durable stores also evict profiles idle
+    for `idle_timeout` seconds, after writing them out; they are reloaded on
+    the user's next update.
+
+    Notes live outside the profile, one row per note, and are loaded on
+    first use with notes(). A flush writes only the notes added since the
+    last one, so its cost does not grow with the size of the notebook.
+    """
+
+    durable = True  # Whether an evicted profile can be loaded again
+
+    def __init__(self, flush_interval: float = USER_STORE_FLUSH_INTERVAL, batch_size: int = USER_STORE_BATCH_SIZE,
+                 session_limit: int = USER_SESSION_LIMIT, memory_budget: float = USER_SESSION_MEMORY_MB * 2 ** 20,
+                 idle_timeout: float = USER_SESSION_IDLE, sweep_interval: float = USER_SESSION_SWEEP_INTERVAL):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.session_limit = session_limit
+        self.memory_budget = memory_budget
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self._profiles = OrderedDict()  # Least recently used first
+        self._notebooks = {}  # Loaded on first use; dropped along with the profile
+        self._last_used = {}
+        self._sizes = {}  # Serialized size of each profile as last loaded or written
+        self._total_size = 0
+        self._loading = {}
+        self._dirty = set()
+        self._dirty_event = None
+        self._flush_task = None
+        self._flush_lock = None
+        self._evict_event = None
+        self._evict_task = None
+        self._eviction_hooks = []
+        self.evicted = {'idle': 0, 'budget': 0}
+
+    # Backend hooks, always called from a worker thread
+    @abstractmethod
+    def _load(self, user_id: int):
+        """Return the stored profile string for user_id, or None"""
+
+    @abstractmethod
+    def _save_many(self, rows: list, notes: list = ()):
+        """Persist a batch of (user_id, encoded_profile) rows and note changes
+
+        `notes` holds (user_id, note rows, prune_below) entries as returned
+        by NoteBook.unsaved_changes().
+        """
+
+    def _load_notes(self, user_id: int) -> NoteBook:
+        """Return the stored notebook for user_id, index included"""
+        return NoteBook()
+
+    def _close(self):
+        """Release backend resources"""
+
+    def _scan_page(self, after_id, limit: int) -> list:
+        """Return up to `limit` stored (user_id, encoded_profile) rows with user_id > after_id"""
+        return []
+
+    async def get(self, user_id: int) -> dict:
+        """Return the profile for user_id, loading or creating it on first access"""
+        profile = self._profiles.get(user_id)
+        if profile is not None:
+            self._profiles.move_to_end(user_id)
+            self._last_used[user_id] = time.monotonic()
+            return profile
+
+        # Coalesce concurrent first accesses for the same user into one load
+        pending = self._loading.get(user_id)
+        if pending is None:
+            pending = asyncio.ensure_future(self._load_profile(user_id))
+            self._loading[user_id] = pending
+            pending.add_done_callback(lambda _: self._loading.pop(user_id, None))
+        return await asyncio.shield(pending)
+
+    async def _load_profile(self, user_id: int) -> dict:
+        raw = await asyncio.to_thread(self._load, user_id)
+        if user_id in self._profiles:
+            return self._profiles[user_id]
+
+        if raw is None:
+            profile = default_profile()
+            self._profiles[user_id] = profile
+            self.mark_dirty(user_id)
+        else:
+            profile = decode_profile(raw)
+            legacy_notes = profile.pop('notes', None)
+            self._profiles[user_id] = profile
+            self._set_size(user_id, len(raw))
+            if legacy_notes:
+                # Moved to note rows by the next flush
+                self._notebooks[user_id] = await asyncio.to_thread(legacy_notebook, legacy_notes)
+                self.mark_dirty(user_id)
+        self._last_used[user_id] = time.monotonic()
+        if self.session_limit and len(self._profiles) > self.session_limit and self._evict_event is not None:
+            self._evict_event.set()
+        return profile
+
+    async def notes(self, user_id: int) -> NoteBook:
+        """Return the notebook for user_id, loading it and building its index in a worker thread on first use"""
+        await self.get(user_id)
+        book = self._notebooks.get(user_id)
+        if book is None:
+            book = await asyncio.to_thread(self._load_notes, user_id)
+            # Another load may have finished first, or the profile been evicted meanwhile
+            if user_id in self._profiles:
+                book = self._notebooks.setdefault(user_id, book)
+        return book
+
+    def _set_size(self, user_id: int, size: int):
+        self._total_size += size - self._sizes.get(user_id, 0)
+        self._sizes[user_id] = size
+        if self.memory_budget and self._total_size > self.memory_budget and self._evict_event is not None:
+            self._evict_event.set()
+
+    def peek(self, user_id: int):
+        """Return the in-memory profile for user_id without loading it"""
+        return self._profiles.get(user_id)
+
+    def mark_dirty(self, user_id: int):
+        """Schedule the profile for user_id to be written in the next batch"""
+        self._dirty.add(user_id)
+        if user_id in self._profiles:
+            self._last_used[user_id] = time.monotonic()
+        if self._dirty_event is not None and len(self._dirty) >= self.batch_size:
+            self._dirty_event.set()
+
+    async def scan_field(self, field: str, page_size: int = USER_STORE_BATCH_SIZE):
+        """Yield (user_id, value of `field`) for every known user without loading profiles
+
+        Profiles in memory are authoritative; stored ones are read page by page
+        and only partially decoded, in a worker thread.
+        """
+        for user_id, profile in list(self._profiles.items()):
+            yield user_id, profile.get(field)
+
+        after_id = None
+        while True:
+            rows = await asyncio.to_thread(self._read_field_page, field, after_id, page_size)
+            if not rows:
+                return
+            for user_id, value in rows:
+                if user_id not in self._profiles:
+                    yield user_id, value
+            after_id = rows[-1][0]
+
+    def _read_field_page(self, field: str, after_id, limit: int) -> list:
+        return [(user_id, json.loads(raw).get(field)) for user_id, raw in self._scan_page(after_id, limit)]
+
+    def add_eviction_hook(self, hook):
+        """Call hook(user_id) whenever a profile is dropped from memory"""
+        self._eviction_hooks.append(hook)
+
+    def sample(self, size: int) -> list:
+        """Up to `size` random (user_id, profile) pairs from memory"""
+        items = list(self._profiles.items())
+        return items if len(items) <= size else random.sample(items, size)
+
+    def largest(self, count: int) -> list:
+        """The `count` biggest (user_id, serialized size) pairs in memory"""
+        return heapq.nlargest(count, self._sizes.items(), key=lambda item: item[1])
+
+    def session_stats(self) -> dict:
+        return {
+            'resident': len(self._profiles),
+            'limit': self.session_limit,
+            'serialized_bytes': self._total_size,
+            'memory_budget': self.memory_budget,
+            'idle_timeout': self.idle_timeout if self.durable else 0,
+            'dirty': len(self._dirty),
+            'evicted_idle': self.evicted['idle'],
+            'evicted_budget': self.evicted['budget'],
+        }
+
+    def _eviction_candidates(self) -> list:
+        """(user_id, reason) pairs to drop, oldest first"""
+        now = time.monotonic()
+        idle_cutoff = now - self.idle_timeout if self.durable and self.idle_timeout > 0 else None
+        grace_cutoff = now - EVICTION_GRACE
+        count, size = len(self._profiles), self._total_size
+        candidates = []
+        for user_id in self._profiles:
+            last_used = self._last_used.get(user_id, 0)
+            if idle_cutoff is not None and last_used < idle_cutoff:
+                reason = 'idle'
+            elif (self.session_limit and count > self.session_limit) or (self.memory_budget and size > self.memory_budget):
+                reason = 'budget'
+            else:
+                break
+            # Later entries were used even more recently
+            if last_used > grace_cutoff:
+                break
+            if user_id in self._loading:
+                continue
+            candidates.append((user_id, reason))
+            count -= 1
+            size -= self._sizes.get(user_id, 0)
+        return candidates
+
+    async def evict(self) -> int:
+        """Drop idle and over-budget profiles from memory; returns how many were dropped
+
+        Durable stores write dirty profiles out first and keep any that
+        changed again meanwhile. The memory store has nowhere to write them,
+        so what it evicts is gone and only the size budget applies to it.
+        """
+        candidates = self._eviction_candidates()
+        if not candidates:
+            return 0
+        if self.durable and any(user_id in self._dirty for user_id, _ in candidates):
+            await self.flush()
+
+        grace_cutoff = time.monotonic() - EVICTION_GRACE
+        evicted = 0
+        for user_id, reason in candidates:
+            if self.durable and (user_id in self._dirty or self._last_used.get(user_id, 0) > grace_cutoff):
+                continue
+            if self._profiles.pop(user_id, None) is None:
+                continue
+            self._dirty.discard(user_id)
+            self._notebooks.pop(user_id, None)
+            self._last_used.pop(user_id, None)
+            self._total_size -= self._sizes.pop(user_id, 0)
+            self.evicted[reason] += 1
+            evicted += 1
+            for hook in self._eviction_hooks:
+                hook(user_id)
+        if evicted and not self.durable:
+            logger.warning(f"Discarded {evicted} user sessions for good (profiles, notes and history); "
+                           f"{len(self._profiles)} remain in memory")
+        elif evicted:
+            logger.info(f"Evicted {evicted} user sessions; {len(self._profiles)} remain in memory")
+        return evicted
+
+    async def _evict_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._evict_event.wait(), timeout=self.sweep_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._evict_event.clear()
+            try:
+                await self.evict()
+            except Exception as e:
+                logger.error(f"User session eviction failed: {e}")
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def __contains__(self, user_id):
+        return user_id in self._profiles
+
+    async def start(self):
+        """Start the background write-behind task"""
+        if self._flush_task is not None:
+            return
+        self._dirty_event = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        self._evict_event = asyncio.Event()
+        self._evict_task = asyncio.create_task(self._evict_loop())
+        logger.info(f"{type(self).__name__} started (flush every {self.flush_interval}s, batch {self.batch_size}, "
+                    f"up to {self.session_limit or 'unlimited'} sessions in memory)")
+        if not self.durable and (self.session_limit or self.memory_budget):
+            logger.warning("The in-memory user store cannot reload evicted sessions: users over the session "
+                           "budget lose their profile, notes and history. Use USER_STORE=sqlite to evict safely")
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._dirty_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._dirty_event.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"User store flush failed: {e}")
+
+    async def flush(self):
+        """Write every dirty profile to the backend in batches"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            while self._dirty:
+                batch, notes = [], []
+                while self._dirty and len(batch) < self.batch_size:
+                    user_id = self._dirty.pop()
+                    profile = self._profiles.get(user_id)
+                    if profile is not None:
+                        data = encode_profile(profile)
+                        self._set_size(user_id, len(data))
+                        batch.append((user_id, data))
+                        book = self._notebooks.get(user_id)
+                        if book is not None:
+                            rows, prune_below = book.unsaved_changes()
+                            if rows or prune_below is not None:
+                                notes.append((user_id, rows, prune_below))
+                if not batch:
+                    continue
+
+                started = time.perf_counter()
+                try:
+                    await asyncio.to_thread(self._save_many, batch, notes)
+                except Exception:
+                    # Keep the users dirty so the next flush retries them
+                    self._dirty.update(user_id for user_id, _ in batch)
+                    raise
+                for user_id, rows, prune_below in notes:
+                    book = self._notebooks.get(user_id)
+                    if book is not None:
+                        book.mark_saved(rows, prune_below)
+                logger.debug(f"Flushed {len(batch)} profiles in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    async def close(self):
+        """Stop the background tasks, flush outstanding writes and close the backend"""
+        for task in (self._evict_task, self._flush_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._evict_task = self._flush_task = None
+        await self.flush()
+        await asyncio.to_thread(self._close)
+        logger.info(f"{type(self).__name__} closed")
+
+
+class MemoryUserStore(UserStore):
+    """Process-local store; state is lost when the process exits"""
+
+    durable = False
+
+    def _load(self, user_id: int):
+        return None
+
+    def _save_many(self, rows: list, notes: list = ()):
+        pass
+
+
+class SQLiteUserStore(UserStore):
+    """SQLite store in WAL mode, safe to share between processes on one host"""
+
+    def __init__(self, path: str = USER_STORE_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            "user_id INTEGER PRIMARY KEY, "
+            "data TEXT NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS notes ("
+            "user_id INTEGER NOT NULL, "
+            "note_id INTEGER NOT NULL, "
+            "text TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "tag TEXT, "
+            "PRIMARY KEY (user_id, note_id)) WITHOUT ROWID"
+        )
+
+    def _load(self, user_id: int):
+        with self._db_lock:
+            row = self._conn.execute("SELECT data FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def _load_notes(self, user_id: int) -> NoteBook:
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT note_id, text, created_at, tag FROM notes WHERE user_id = ? ORDER BY note_id", (user_id,)
+            ).fetchall()
+        return NoteBook.from_rows(rows)
+
+    def _save_many(self, rows: list, notes: list = ()):
+        now = time.time()
+        with self._db_lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO users (user_id, data, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                    [(user_id, data, now) for user_id, data in rows]
+                )
+                for user_id, note_rows, prune_below in notes:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO notes (user_id, note_id, text, created_at, tag) VALUES (?, ?, ?, ?, ?)",
+                        [(user_id, *row) for row in note_rows]
+                    )
+                    if prune_below is not None:
+                        self._conn.execute(
+                            "DELETE FROM notes WHERE user_id = ? AND note_id < ?", (user_id, prune_below)
+                        )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _scan_page(self, after_id, limit: int) -> list:
+        with self._db_lock:
+            return self._conn.execute(
+                "SELECT user_id, data FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?",
+                (after_id if after_id is not None else -2 ** 63, limit)
+            ).fetchall()
+
+    def _close(self):
+        with self._db_lock:
+            self._conn.close()
+
+
+def create_user_store() -> UserStore:
+    """Build the user store selected by the USER_STORE environment variable"""
+    if USER_STORE == "sqlite":
+        return SQLiteUserStore(USER_STORE_PATH)
+    if USER_STORE != "memory":
+        logger.warning(f"Unknown USER_STORE '{USER_STORE}', using in-memory storage")
+    return MemoryUserStore()
@@ -0,0 +1,76 @@
+"""
+Progressive message delivery for Ykarb Telegram Bot
+Shows a streamed reply by editing one Telegram message as chunks arrive
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from telegram.error import BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# ✅ Streaming configuration
+GEMINI_STREAMING = os.getenv("GEMINI_STREAMING", "true").lower() in ("1", "true", "yes")
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))  # Telegram allows ~1 edit/s per chat
+STREAM_PLACEHOLDER = "💭 ..."
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+class ProgressiveReply:
+    """Edit a placeholder message with the text received so far
+
+    Intermediate edits are throttled to one per STREAM_EDIT_INTERVAL; the first
+    chunk is shown immediately. A RetryAfter from Telegram postpones the next
+    intermediate edit instead of failing the reply.
+    """
+
+    def __init__(self, message, min_interval: float = STREAM_EDIT_INTERVAL):
+        self.message = message
+        self.min_interval = min_interval
+        self.shown_text = message.text or ""
+        self.edits = 0
+        self._next_edit_at = 0.0
+
+    async def update(self, text: str):
+        """Show text if the throttle allows it; otherwise keep it for a later edit"""
+        now = time.monotonic()
+        if now < self._next_edit_at:
+            return
+        preview = text[:TELEGRAM_MESSAGE_LIMIT - 2].rstrip() + " ▌"
+        await self._edit(preview, retry=False)
+
+    async def finish(self, text: str, reply_markup=None, parse_mode: str = None):
+        """Show the final text with its keyboard, splitting it if it is too long"""
+        text = text.strip() or "I'm having trouble processing your request right now. Please try again."
+        head, rest = text[:TELEGRAM_MESSAGE_LIMIT], text[TELEGRAM_MESSAGE_LIMIT:]
+        if rest:
+            await self._edit(head, retry=True, parse_mode=parse_mode)
+            while rest:
+                chunk, rest = rest[:TELEGRAM_MESSAGE_LIMIT], rest[TELEGRAM_MESSAGE_LIMIT:]
+                await self.message.reply_text(chunk, reply_markup=None if rest else reply_markup, parse_mode=parse_mode)
+        else:
+            await self._edit(head, reply_markup=reply_markup, retry=True, parse_mode=parse_mode)
+
+    async def _edit(self, text: str, reply_markup=None, retry: bool = False, parse_mode: str = None):
+        if text == self.shown_text and reply_markup is None:
+            return
+        while True:
+            try:
+                await self.message.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+                self.shown_text = text
+                self.edits += 1
+                self._next_edit_at = time.monotonic() + self.min_interval
+                return
+            except RetryAfter as e:
+                self._next_edit_at = time.monotonic() + e.retry_after
+                if not retry:
+                    return
+                await asyncio.sleep(e.retry_after)
+            except BadRequest as e:
+                if "not modified" in str(e).lower():
+                    return
+                raise
@@ -0,0 +1,59 @@
+"""
+Circuit breaker probes for Ykarb Telegram Bot
+A half-open breaker must get its probe back when the call never reaches Gemini
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+from ratelimit import AdmissionController, AdmissionRejected, CircuitBreaker  # noqa: E402
+
+
+class HangingClient:
+    """Stands in for httpx.AsyncClient: requests never get an answer"""
+
+    def build_request(self, method, url, json=None):
+        return None
+
+    async def send(self, request, stream=False):
+        await asyncio.Event().wait()
+
+
+def half_open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    return breaker
+
+
+class HalfOpenProbeTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.gemini = bot.YkarbBot()
+        self.gemini.http_client = HangingClient()
+        self.gemini.breaker = half_open_breaker()
+
+    async def test_rejected_probe_is_released(self):
+        # No tokens at all: every call is refused by admission control
+        self.gemini.admission = AdmissionController(0, 0, 0, 0)
+        with self.assertRaises(AdmissionRejected):
+            await self.gemini._request("http://gemini.invalid", {}, user_id=1)
+        self.assertEqual(self.gemini.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.gemini.breaker.allow())
+
+    async def test_cancelled_probe_is_released(self):
+        task = asyncio.create_task(self.gemini._request("http://gemini.invalid", {}, user_id=1))
+        await asyncio.sleep(0.01)
+        self.assertFalse(self.gemini.breaker.allow())  # The probe is in flight
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertTrue(self.gemini.breaker.allow())
+
+
+if __name__ == "__main__":
+    unittest.main()
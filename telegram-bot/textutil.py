@@ -0,0 +1,52 @@
+"""
+Text normalization helpers for Ykarb Telegram Bot
+Shared by crisis detection and search so Indic and transliterated input match consistently
+"""
+
+import re
+import unicodedata
+
+# Word characters: \w plus Indic combining marks (matras, virama, anusvara),
+# which Python's \w does not cover and would otherwise split words apart
+INDIC_RANGES = "\u0900-\u0963\u0966-\u0DFF"  # Indic blocks minus the danda punctuation marks
+WORD_CHARS = r"\w" + INDIC_RANGES
+
+# Zero-width joiners and similar invisible code points common in Indic typing are
+# dropped; curly apostrophes and word separators are unified
+_TRANSLATION = str.maketrans({
+    **dict.fromkeys("\u200b\u200c\u200d\u2060\ufeff"),
+    "\u2019": "'", "\u2018": "'", "\u02bc": "'", "`": "'",
+    "-": " ", "_": " ",
+})
+_NEEDS_TRANSLATION = re.compile("[\u200b\u200c\u200d\u2060\ufeff\u2019\u2018\u02bc`_-]")
+
+# Romanized Hindi/Indic spelling varies a lot ("jeena"/"jina", "khud"/"kud");
+# fold the common variants so keyword lists only need one spelling
+LATIN_FOLDS = [("ee", "i"), ("oo", "u"), ("kh", "k"), ("w", "v"), ("z", "j")]
+_REPEATS = re.compile(r"([a-z])\1+")
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form: NFC, casefolded, invisible characters removed, single spaces"""
+    if not unicodedata.is_normalized("NFC", text):
+        text = unicodedata.normalize("NFC", text)
+    if _NEEDS_TRANSLATION.search(text):
+        text = text.translate(_TRANSLATION)
+    return " ".join(text.casefold().split())
+
+
+def fold_latin(text: str) -> str:
+    """Fold spelling variants of romanized Indic words in already-normalized text"""
+    for variant, replacement in LATIN_FOLDS:
+        if variant in text:
+            text = text.replace(variant, replacement)
+    return text
+
+
+def collapse_repeats(text: str) -> str:
+    """Collapse repeated Latin letters ("maarna" -> "marna", "sooo" -> "so")"""
+    return _REPEATS.sub(r"\1", text)
+
+
+def is_latin(text: str) -> bool:
+    return all(ord(ch) < 0x250 for ch in text)
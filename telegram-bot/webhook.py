@@ -0,0 +1,105 @@
+"""
+Webhook server for Ykarb Telegram Bot
+Receives Telegram updates over HTTPS and hands them to a bounded ingestion queue
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import os
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# ✅ Webhook configuration
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Public base URL, e.g. https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("PORT", 8443))
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
+HEALTH_PATH = os.getenv("HEALTH_PATH", "/healthz")
+WEBHOOK_ENQUEUE_TIMEOUT = float(os.getenv("WEBHOOK_ENQUEUE_TIMEOUT", "2"))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """Minimal aiohttp server exposing the Telegram webhook and a health endpoint
+
+    dispatch is a coroutine function taking the decoded update dict and
+    returning False when the update could not be accepted (e.g. the ingestion
+    queue stayed full). Telegram retries any non-2xx delivery, so rejected
+    updates are not lost.
+    """
+
+    def __init__(self, dispatch, health=None, listen: str = WEBHOOK_LISTEN, port: int = WEBHOOK_PORT,
+                 path: str = WEBHOOK_PATH, secret_token: str = WEBHOOK_SECRET_TOKEN):
+        self.dispatch = dispatch
+        self.health = health
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self.received = 0
+        self.rejected = 0
+        self._runner = None
+
+        self.web_app = web.Application(client_max_size=1024 * 1024)
+        self.web_app.router.add_post(self.path, self._handle_update)
+        self.web_app.router.add_get(HEALTH_PATH, self._handle_health)
+
+    async def _handle_update(self, request: web.Request) -> web.Response:
+        if self.secret_token:
+            provided = request.headers.get(SECRET_HEADER, "")
+            if not hmac.compare_digest(provided, self.secret_token):
+                logger.warning(f"Rejected webhook call with invalid secret token from {request.remote}")
+                return web.Response(status=403)
+
+        try:
+            data = await request.json(loads=json.loads)
+        except (ValueError, UnicodeDecodeError):
+            return web.Response(status=400)
+        if not isinstance(data, dict) or 'update_id' not in data:
+            return web.Response(status=400)
+
+        self.received += 1
+        if not await self.dispatch(data):
+            self.rejected += 1
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        return web.Response()
+
+    async def _handle_health(self, request: web.Request) -> web.Response:
+        status = {'status': 'ok', 'received': self.received, 'rejected': self.rejected}
+        if self.health is not None:
+            status.update(self.health())
+        return web.json_response(status, status=200 if status['status'] == 'ok' else 503)
+
+    async def start(self):
+        self._runner = web.AppRunner(self.web_app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.listen, self.port)
+        await site.start()
+        logger.info(f"🌐 Webhook server listening on {self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+            logger.info("Webhook server stopped")
+
+
+async def enqueue_with_timeout(queue: asyncio.Queue, item, timeout: float = WEBHOOK_ENQUEUE_TIMEOUT) -> bool:
+    """Put item on a bounded queue, waiting up to timeout for space to free up"""
+    try:
+        queue.put_nowait(item)
+        return True
+    except asyncio.QueueFull:
+        pass
+    try:
+        await asyncio.wait_for(queue.put(item), timeout=timeout)
+        return True
+    except asyncio.TimeoutError:
+        logger.warning(f"Update queue full ({queue.qsize()} pending), asking Telegram to retry")
+        return False